@@ -11,9 +11,50 @@ ADMIN_ID = int(os.environ.get("ADMIN_ID", "7703672187"))
 # تنظیمات دیتابیس - پشتیبانی از Railway
 DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./konkour_bot.db")
 
+# کش عضویت در کانال‌های اجباری (ثانیه) - عضو بودن طولانی‌تر و عضو نبودن کوتاه‌تر کش می‌شود
+MEMBERSHIP_CACHE_TTL = int(os.environ.get("MEMBERSHIP_CACHE_TTL", 1800))
+MEMBERSHIP_NEGATIVE_TTL = int(os.environ.get("MEMBERSHIP_NEGATIVE_TTL", 60))
+
+# اعتبار لیست کانال‌های اجباری در حافظه (ثانیه) - تغییرات ادمین روی instanceهای دیگر بعد از این مدت دیده می‌شوند
+CHANNEL_CACHE_TTL = int(os.environ.get("CHANNEL_CACHE_TTL", 30))
+
 # تنظیمات پورت برای Railway
 PORT = int(os.environ.get("PORT", 8000))
 
+# حالت دریافت آپدیت‌ها: polling یا webhook (سرور aiohttp روی PORT)
+BOT_MODE = os.environ.get("BOT_MODE", "polling").lower()
+
+# آدرس عمومی وب‌هوک - اگر خالی باشد وب‌هوک در تلگرام ثبت نمی‌شود (تست محلی)
+WEBHOOK_BASE_URL = os.environ.get("WEBHOOK_BASE_URL") or (
+    f"https://{os.environ['RAILWAY_PUBLIC_DOMAIN']}" if os.environ.get("RAILWAY_PUBLIC_DOMAIN") else ""
+)
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET", "")
+
+# در حالت polling سرور وضعیت (/health، /ready، /metrics) روی این پورت اجرا می‌شود (0 = غیرفعال)
+# در حالت وب‌هوک همین مسیرها روی PORT سرور وب‌هوک هستند
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 0))
+
+# اجرای چند instance: فقط دارنده lease زمان‌بندها را اجرا می‌کند (ثانیه)
+LEADER_LEASE_TTL = int(os.environ.get("LEADER_LEASE_TTL", 30))
+LEADER_HEARTBEAT_INTERVAL = int(os.environ.get("LEADER_HEARTBEAT_INTERVAL", 10))
+
+# وضعیت FSM (ویزاردهای چندمرحله‌ای): انقضای جلسه رهاشده و اعتبار کش حافظه (ثانیه)
+FSM_STATE_TTL = int(os.environ.get("FSM_STATE_TTL", 86400))
+FSM_CACHE_TTL = int(os.environ.get("FSM_CACHE_TTL", 5))
+
+# حالت خلاصه: پیام‌های هم‌زمان یک کاربر در صف ارسال یک پیام می‌شوند
+# (پنجره انتظار برای رسیدن بقیه ریمایندرهای همان لحظه، ثانیه)
+DIGEST_MODE = os.environ.get("DIGEST_MODE", "true").lower() == "true"
+DIGEST_WINDOW_SECONDS = float(os.environ.get("DIGEST_WINDOW_SECONDS", 2))
+
+# پخش ریمایندرهای ساعت‌های رند: هر کاربر با یک جابه‌جایی ثابت در بازه ±N دقیقه
+# ارسال می‌شود تا همه در یک دقیقه به محدودیت تلگرام نخورند (0 = غیرفعال)
+PEAK_SMOOTHING_MINUTES = float(os.environ.get("PEAK_SMOOTHING_MINUTES", 0))
+
+# مخاطبان بیشتر از این تعداد (شناسه) به جای حافظه در فایل موقت mmap نگه داشته می‌شوند
+AUDIENCE_SPILL_THRESHOLD = int(os.environ.get("AUDIENCE_SPILL_THRESHOLD", 1_000_000))
+
 # شناسایی محیط
 ENVIRONMENT = os.environ.get("RAILWAY_ENVIRONMENT", "development")
 IS_PRODUCTION = ENVIRONMENT == "production"
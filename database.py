@@ -4,11 +4,69 @@
 import os
 import sqlite3
 import logging
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from typing import Optional, List, Dict, Any
 
+from utils.db_connection import get_connection_manager
+from utils.write_behind import get_write_behind
+from utils.study_utils import calculate_streak
+from utils.channel_registry import channel_registry
+
 logger = logging.getLogger(__name__)
 
+# نگهداری تجمعی study_stats (یک ردیف برای هر کاربر/روز) هم‌زمان با تغییر study_plans
+# {row} در تریگرها NEW یا OLD است؛ فقط جلسات کامل‌شده در آمار حساب می‌شوند
+_STUDY_STATS_ADD = '''
+    INSERT INTO study_stats (user_id, study_date, total_minutes, sessions_count, subjects)
+    SELECT {row}.user_id, {row}.study_date, COALESCE({row}.duration_minutes, 0), 1, {row}.subject
+    WHERE {row}.completed AND {row}.study_date IS NOT NULL
+    ON CONFLICT(user_id, study_date) DO UPDATE SET
+        total_minutes = total_minutes + excluded.total_minutes,
+        sessions_count = sessions_count + 1,
+        subjects = CASE
+            WHEN subjects IS NULL OR subjects = '' THEN excluded.subjects
+            WHEN excluded.subjects IS NULL
+                 OR instr(',' || subjects || ',', ',' || excluded.subjects || ',') > 0 THEN subjects
+            ELSE subjects || ',' || excluded.subjects
+        END;
+'''
+
+_STUDY_STATS_REMOVE = '''
+    UPDATE study_stats SET
+        total_minutes = total_minutes - COALESCE({row}.duration_minutes, 0),
+        sessions_count = sessions_count - 1,
+        subjects = (
+            SELECT GROUP_CONCAT(DISTINCT subject) FROM study_plans
+            WHERE user_id = {row}.user_id AND study_date = {row}.study_date AND completed = TRUE
+        )
+    WHERE user_id = {row}.user_id AND study_date = {row}.study_date AND {row}.completed;
+    DELETE FROM study_stats
+    WHERE user_id = {row}.user_id AND study_date = {row}.study_date AND sessions_count <= 0;
+'''
+
+STUDY_STATS_TRIGGERS = {
+    'trg_study_stats_insert': f'''
+        CREATE TRIGGER IF NOT EXISTS trg_study_stats_insert AFTER INSERT ON study_plans
+        BEGIN
+            {_STUDY_STATS_ADD.format(row='NEW')}
+        END
+    ''',
+    'trg_study_stats_update': f'''
+        CREATE TRIGGER IF NOT EXISTS trg_study_stats_update
+        AFTER UPDATE OF completed, duration_minutes, study_date, subject, user_id ON study_plans
+        BEGIN
+            {_STUDY_STATS_REMOVE.format(row='OLD')}
+            {_STUDY_STATS_ADD.format(row='NEW')}
+        END
+    ''',
+    'trg_study_stats_delete': f'''
+        CREATE TRIGGER IF NOT EXISTS trg_study_stats_delete AFTER DELETE ON study_plans
+        BEGIN
+            {_STUDY_STATS_REMOVE.format(row='OLD')}
+        END
+    ''',
+}
+
 class Database:
     def __init__(self, db_path=None):
         """مقداردهی دیتابیس با پشتیبانی از Environment Variables"""
@@ -21,18 +79,37 @@ class Database:
             db_path = db_path.replace('sqlite:///', '')
         
         self.db_path = db_path
+        self.connections = get_connection_manager(db_path)
         logger.info(f"📁 دیتابیس در مسیر: {self.db_path}")
         self.init_db()
+        self._register_write_behind()
+    
+    def _register_write_behind(self):
+        """کانال‌های بافر write-behind برای نوشتن‌های پرتکرار کاربران"""
+        self.write_behind = get_write_behind(self.connections)
+        # upsert به جای INSERT OR REPLACE تا joined_date و ردیف‌های وابسته حذف نشوند
+        self.write_behind.register('users', '''
+            INSERT INTO users (user_id, username, first_name, last_name, is_active, last_active)
+            VALUES (?, ?, ?, ?, TRUE, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                username = excluded.username,
+                first_name = excluded.first_name,
+                last_name = excluded.last_name,
+                is_active = TRUE,
+                last_active = MAX(COALESCE(users.last_active, ''), excluded.last_active)
+        ''', keyed=True)
+        self.write_behind.register('user_activity', '''
+            UPDATE users SET last_active = MAX(COALESCE(last_active, ''), ?) WHERE user_id = ?
+        ''', keyed=True)
+    
+    def flush_user_writes(self):
+        """ثبت فوری کاربران بافرشده (قبل از نوشتن‌هایی که به ردیف users وابسته‌اند)"""
+        self.write_behind.flush(['users', 'user_activity'])
     
     def get_connection(self):
-        """اتصال به دیتابیس با هندلینگ خطا"""
+        """اتصال مستقل جدید به دیتابیس (برای سازگاری) - متدهای کلاس از self.connections استفاده می‌کنند"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            # فعال کردن foreign keys و بهبود عملکرد
-            conn.execute("PRAGMA foreign_keys = ON")
-            conn.execute("PRAGMA journal_mode = WAL")  # بهبود کارایی
-            conn.execute("PRAGMA synchronous = NORMAL")
-            return conn
+            return self.connections.connect()
         except Exception as e:
             logger.error(f"❌ خطا در اتصال به دیتابیس {self.db_path}: {e}")
             raise
@@ -42,7 +119,7 @@ class Database:
         logger.info("🔧 در حال راه‌اندازی دیتابیس...")
         
         try:
-            with self.get_connection() as conn:
+            with self.connections.write() as conn:
                 # جدول کاربران - با ستون is_active
                 conn.execute('''
                     CREATE TABLE IF NOT EXISTS users (
@@ -140,11 +217,27 @@ class Database:
                 # ایجاد ایندکس برای بهبود عملکرد
                 conn.execute('CREATE INDEX IF NOT EXISTS idx_study_plans_user_date ON study_plans(user_id, study_date)')
                 conn.execute('CREATE INDEX IF NOT EXISTS idx_study_plans_completed ON study_plans(completed)')
+                # آمار از study_stats خوانده می‌شود و تریگرها با idx_study_plans_user_date کار می‌کنند؛
+                # ایندکس پوشای قبلی آمار فقط هزینه نوشتن داشت
+                conn.execute('DROP INDEX IF EXISTS idx_study_plans_user_completed_date')
                 conn.execute('CREATE INDEX IF NOT EXISTS idx_users_active ON users(last_active)')
+                # مخاطبان ارسال همگانی: فقط کاربران قابل‌تحویل، بازه‌ای روی last_active
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_users_deliverable ON users(is_active, last_active)')
                 conn.execute('CREATE INDEX IF NOT EXISTS idx_advanced_reminders_user ON advanced_reminders(user_id)')
                 conn.execute('CREATE INDEX IF NOT EXISTS idx_advanced_reminders_date ON advanced_reminders(scheduled_date)')
                 conn.execute('CREATE INDEX IF NOT EXISTS idx_advanced_reminders_active ON advanced_reminders(is_active)')
                 
+                # 📊 آمار روزانه تجمعی (study_stats) با تریگر روی study_plans
+                self._ensure_column(conn, 'study_stats', 'sessions_count', 'INTEGER DEFAULT 0')
+                existing_triggers = {
+                    row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+                }
+                for name, sql in STUDY_STATS_TRIGGERS.items():
+                    conn.execute(sql)
+                if not set(STUDY_STATS_TRIGGERS) <= existing_triggers:
+                    # اولین اجرا با تریگرها: آمار جلسات قبلی ساخته می‌شود
+                    self._rebuild_study_stats(conn)
+                
                 conn.commit()
             logger.info("✅ دیتابیس راه‌اندازی شد")
             
@@ -152,20 +245,51 @@ class Database:
             logger.error(f"❌ خطا در راه‌اندازی دیتابیس: {e}")
             raise
     
+    def _ensure_column(self, conn, table: str, column: str, definition: str):
+        """افزودن ستون به جدول موجود در صورت نبود (مهاجرت ساده)"""
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            logger.info(f"🛠️ ستون {column} به جدول {table} اضافه شد")
+
+    def _rebuild_study_stats(self, conn) -> int:
+        """ساخت دوباره study_stats از روی study_plans (داخل تراکنش فراخواننده)"""
+        conn.execute('DELETE FROM study_stats')
+        cursor = conn.execute('''
+            INSERT INTO study_stats (user_id, study_date, total_minutes, sessions_count, subjects)
+            SELECT user_id, study_date, SUM(COALESCE(duration_minutes, 0)), COUNT(*), GROUP_CONCAT(DISTINCT subject)
+            FROM study_plans
+            WHERE completed = TRUE AND study_date IS NOT NULL
+            GROUP BY user_id, study_date
+        ''')
+        logger.info(f"📊 جدول study_stats با {cursor.rowcount} ردیف روزانه بازسازی شد")
+        return cursor.rowcount
+
+    def backfill_study_stats(self) -> int:
+        """بازسازی کامل آمار روزانه از جلسات موجود (دستور ادمین /backfill_stats)"""
+        try:
+            with self.connections.write() as conn:
+                return self._rebuild_study_stats(conn)
+        except Exception as e:
+            logger.error(f"❌ خطا در بازسازی study_stats: {e}")
+            return -1
+
     def add_user(self, user_id: int, username: str, first_name: str, last_name: str = ""):
-        """افزودن کاربر جدید"""
+        """افزودن/آپدیت کاربر (از طریق بافر write-behind؛ چند /start پشت سر هم یک نوشتن می‌شوند)"""
         try:
-            with self.get_connection() as conn:
-                conn.execute('''
-                    INSERT OR REPLACE INTO users (user_id, username, first_name, last_name, is_active, last_active)
-                    VALUES (?, ?, ?, ?, TRUE, CURRENT_TIMESTAMP)
-                ''', (user_id, username, first_name, last_name))
-                conn.commit()
-            logger.debug(f"✅ کاربر {user_id} افزوده/آپدیت شد")
+            self.write_behind.put('users', user_id, (
+                user_id, username, first_name, last_name, self._utc_timestamp()
+            ))
+            logger.debug(f"✅ کاربر {user_id} برای افزودن/آپدیت در صف قرار گرفت")
         except Exception as e:
             logger.error(f"❌ خطا در افزودن کاربر {user_id}: {e}")
             self.log_error(user_id, "add_user", str(e))
 
+    @staticmethod
+    def _utc_timestamp() -> str:
+        """زمان فعلی به فرمت CURRENT_TIMESTAMP در SQLite (UTC)"""
+        return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
     # بقیه متدها بدون تغییر...
 
     def get_active_users(self):
@@ -178,14 +302,41 @@ class Database:
         """
         return self.execute_query(query, fetch_all=True)
 
-    def update_user_activity(self, user_id: int):
-        """بروزرسانی زمان فعالیت کاربر"""
+    # --- کاربران غیرقابل‌تحویل (چت‌های مرده) ---
+
+    def mark_users_undeliverable(self, user_ids: List[int]) -> int:
+        """علامت زدن کاربرانی که ربات را بلاک کرده‌اند یا حسابشان حذف شده (با /start بعدی برمی‌گردند)"""
+        if not user_ids:
+            return 0
         try:
-            with self.get_connection() as conn:
-                conn.execute('''
-                    UPDATE users SET last_active = CURRENT_TIMESTAMP WHERE user_id = ?
-                ''', (user_id,))
+            with self.connections.write() as conn:
+                cursor = conn.cursor()
+                cursor.executemany(
+                    'UPDATE users SET is_active = FALSE WHERE user_id = ? AND is_active = TRUE',
+                    [(user_id,) for user_id in user_ids]
+                )
                 conn.commit()
+                return cursor.rowcount
+        except Exception as e:
+            logger.error(f"❌ خطا در علامت زدن کاربران غیرقابل‌تحویل: {e}")
+            return 0
+
+    def get_undeliverable_user_ids(self) -> List[int]:
+        """شناسه کاربران غیرقابل‌تحویل (از ایندکس idx_users_deliverable)"""
+        with self.connections.read() as conn:
+            cursor = conn.execute('SELECT user_id FROM users WHERE is_active = FALSE')
+            return [row[0] for row in cursor.fetchall()]
+
+    def is_user_undeliverable(self, user_id: int) -> bool:
+        """آیا کاربر هنوز غیرقابل‌تحویل علامت خورده است؟ (lookup کلید اصلی)"""
+        with self.connections.read() as conn:
+            row = conn.execute('SELECT is_active FROM users WHERE user_id = ?', (user_id,)).fetchone()
+            return row is not None and not row[0]
+
+    def update_user_activity(self, user_id: int):
+        """بروزرسانی زمان فعالیت کاربر (بافرشده - فقط آخرین مقدار هر کاربر ثبت می‌شود)"""
+        try:
+            self.write_behind.put('user_activity', user_id, (self._utc_timestamp(), user_id))
         except Exception as e:
             logger.error(f"❌ خطا در آپدیت فعالیت کاربر {user_id}: {e}")
     
@@ -195,7 +346,9 @@ class Database:
             study_date = date.today().isoformat()
         
         try:
-            with self.get_connection() as conn:
+            # ردیف کاربر ممکن است هنوز در بافر باشد (FOREIGN KEY)
+            self.flush_user_writes()
+            with self.connections.write() as conn:
                 conn.execute('''
                     INSERT INTO study_plans (user_id, subject, topic, duration_minutes, study_date)
                     VALUES (?, ?, ?, ?, ?)
@@ -209,7 +362,7 @@ class Database:
     def mark_session_completed(self, session_id: int, user_id: int):
         """علامت‌گذاری جلسه به عنوان کامل شده"""
         try:
-            with self.get_connection() as conn:
+            with self.connections.write() as conn:
                 conn.execute('''
                     UPDATE study_plans SET completed = TRUE 
                     WHERE id = ? AND user_id = ?
@@ -220,19 +373,16 @@ class Database:
             logger.error(f"❌ خطا در کامل کردن جلسه: {e}")
     
     def get_today_study_stats(self, user_id: int) -> Dict[str, Any]:
-        """دریافت آمار مطالعه امروز"""
+        """دریافت آمار مطالعه امروز (یک ردیف از study_stats)"""
         try:
-            with self.get_connection() as conn:
+            with self.connections.read() as conn:
                 cursor = conn.execute('''
-                    SELECT 
-                        SUM(duration_minutes) as total_minutes,
-                        COUNT(*) as sessions_count,
-                        GROUP_CONCAT(DISTINCT subject) as subjects
-                    FROM study_plans 
-                    WHERE user_id = ? AND study_date = DATE('now') AND completed = TRUE
-                ''', (user_id,))
+                    SELECT total_minutes, sessions_count, subjects
+                    FROM study_stats 
+                    WHERE user_id = ? AND study_date = ?
+                ''', (user_id, date.today().isoformat()))
                 
-                result = cursor.fetchone()
+                result = cursor.fetchone() or (0, 0, None)
                 return {
                     'total_minutes': result[0] or 0,
                     'sessions_count': result[1] or 0,
@@ -242,48 +392,56 @@ class Database:
             logger.error(f"❌ خطا در دریافت آمار امروز: {e}")
             return {'total_minutes': 0, 'sessions_count': 0, 'subjects': 'خطا'}
     
+    def _get_daily_stats(self, user_id: int, days: int) -> List[Dict[str, Any]]:
+        """ردیف‌های روزانه study_stats برای days روز اخیر (شامل امروز)"""
+        since = (date.today() - timedelta(days=days - 1)).isoformat()
+        with self.connections.read() as conn:
+            cursor = conn.execute('''
+                SELECT study_date, total_minutes, sessions_count
+                FROM study_stats 
+                WHERE user_id = ? AND study_date >= ?
+                ORDER BY study_date
+            ''', (user_id, since))
+            
+            return [
+                {'date': row[0], 'total_minutes': row[1] or 0, 'sessions_count': row[2] or 0}
+                for row in cursor.fetchall()
+            ]
+    
     def get_weekly_stats(self, user_id: int) -> List[Dict[str, Any]]:
         """دریافت آمار مطالعه هفته جاری"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.execute('''
-                    SELECT 
-                        study_date,
-                        SUM(duration_minutes) as total_minutes,
-                        COUNT(*) as sessions_count
-                    FROM study_plans 
-                    WHERE user_id = ? 
-                    AND study_date >= DATE('now', '-6 days')
-                    AND completed = TRUE
-                    GROUP BY study_date
-                    ORDER BY study_date
-                ''', (user_id,))
-                
-                return [
-                    {'date': row[0], 'total_minutes': row[1] or 0, 'sessions_count': row[2] or 0}
-                    for row in cursor.fetchall()
-                ]
+            return self._get_daily_stats(user_id, 7)
         except Exception as e:
             logger.error(f"❌ خطا در دریافت آمار هفتگی: {e}")
             return []
     
+    def get_monthly_stats(self, user_id: int) -> List[Dict[str, Any]]:
+        """دریافت آمار مطالعه ماه جاری (۳۰ روز اخیر)"""
+        try:
+            return self._get_daily_stats(user_id, 30)
+        except Exception as e:
+            logger.error(f"❌ خطا در دریافت آمار ماهانه: {e}")
+            return []
+    
     def add_mandatory_channel(self, channel_id: int, channel_username: str, channel_title: str, admin_id: int):
         """افزودن کانال اجباری"""
         try:
-            with self.get_connection() as conn:
+            with self.connections.write() as conn:
                 conn.execute('''
                     INSERT OR REPLACE INTO mandatory_channels (channel_id, channel_username, channel_title, added_by)
                     VALUES (?, ?, ?, ?)
                 ''', (channel_id, channel_username, channel_title, admin_id))
                 conn.commit()
+            channel_registry.invalidate()
             logger.info(f"✅ کانال {channel_username} افزوده شد")
         except Exception as e:
             logger.error(f"❌ خطا در افزودن کانال: {e}")
     
     def get_mandatory_channels(self) -> List[Dict[str, Any]]:
-        """دریافت لیست کانال‌های اجباری"""
+        """دریافت لیست کانال‌های اجباری از دیتابیس (مسیرهای پرتکرار از channel_registry استفاده می‌کنند)"""
         try:
-            with self.get_connection() as conn:
+            with self.connections.read() as conn:
                 cursor = conn.execute('''
                     SELECT channel_id, channel_username, channel_title 
                     FROM mandatory_channels
@@ -300,7 +458,7 @@ class Database:
     def check_channel_membership(self, user_id: int, channel_id: int) -> bool:
         """بررسی عضویت کاربر در کانال"""
         try:
-            with self.get_connection() as conn:
+            with self.connections.read() as conn:
                 cursor = conn.execute('''
                     SELECT is_member FROM channel_memberships 
                     WHERE user_id = ? AND channel_id = ?
@@ -315,7 +473,8 @@ class Database:
     def update_channel_membership(self, user_id: int, channel_id: int, is_member: bool):
         """بروزرسانی وضعیت عضویت کاربر"""
         try:
-            with self.get_connection() as conn:
+            self.flush_user_writes()
+            with self.connections.write() as conn:
                 conn.execute('''
                     INSERT OR REPLACE INTO channel_memberships (user_id, channel_id, is_member, last_checked)
                     VALUES (?, ?, ?, CURRENT_TIMESTAMP)
@@ -324,50 +483,116 @@ class Database:
         except Exception as e:
             logger.error(f"❌ خطا در آپدیت عضویت: {e}")
     
-    def get_user_progress(self, user_id: int) -> Dict[str, Any]:
-        """دریافت پیشرفت کلی کاربر"""
+    def get_user_channel_memberships(self, user_id: int) -> Dict[int, Dict[str, Any]]:
+        """وضعیت ذخیره‌شده عضویت کاربر در همه کانال‌ها (برای کش عضویت)"""
         try:
-            with self.get_connection() as conn:
-                # کل زمان مطالعه
+            with self.connections.read() as conn:
                 cursor = conn.execute('''
-                    SELECT SUM(duration_minutes) FROM study_plans 
-                    WHERE user_id = ? AND completed = TRUE
+                    SELECT channel_id, is_member, last_checked FROM channel_memberships 
+                    WHERE user_id = ?
                 ''', (user_id,))
-                total_minutes = cursor.fetchone()[0] or 0
                 
-                # تعداد جلسات
+                return {
+                    row[0]: {'is_member': bool(row[1]), 'last_checked': row[2]}
+                    for row in cursor.fetchall()
+                }
+        except Exception as e:
+            logger.error(f"❌ خطا در دریافت عضویت‌های کاربر {user_id}: {e}")
+            return {}
+    
+    def update_channel_memberships(self, user_id: int, statuses: Dict[int, bool]):
+        """بروزرسانی وضعیت عضویت کاربر در چند کانال در یک تراکنش"""
+        if not statuses:
+            return
+        try:
+            self.flush_user_writes()
+            with self.connections.write() as conn:
+                conn.executemany('''
+                    INSERT OR REPLACE INTO channel_memberships (user_id, channel_id, is_member, last_checked)
+                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ''', [(user_id, channel_id, is_member) for channel_id, is_member in statuses.items()])
+        except Exception as e:
+            logger.error(f"❌ خطا در آپدیت عضویت‌ها: {e}")
+    
+    def get_user_progress(self, user_id: int) -> Dict[str, Any]:
+        """دریافت پیشرفت کلی کاربر (جمع ردیف‌های روزانه study_stats)"""
+        try:
+            with self.connections.read() as conn:
                 cursor = conn.execute('''
-                    SELECT COUNT(*) FROM study_plans 
-                    WHERE user_id = ? AND completed = TRUE
+                    SELECT 
+                        COALESCE(SUM(total_minutes), 0),
+                        COALESCE(SUM(sessions_count), 0),
+                        COUNT(*)
+                    FROM study_stats 
+                    WHERE user_id = ?
                 ''', (user_id,))
-                total_sessions = cursor.fetchone()[0] or 0
-                
-                # روزهای فعال
+                total_minutes, total_sessions, active_days = cursor.fetchone()
+                return self._progress_dict(total_minutes, total_sessions, active_days)
+        except Exception as e:
+            logger.error(f"❌ خطا در دریافت پیشرفت کاربر: {e}")
+            return self._progress_dict(0, 0, 0)
+
+    @staticmethod
+    def _progress_dict(total_minutes: int, total_sessions: int, active_days: int) -> Dict[str, Any]:
+        """ساخت خروجی get_user_progress"""
+        return {
+            'total_minutes': total_minutes,
+            'total_hours': round(total_minutes / 60, 1),
+            'total_sessions': total_sessions,
+            'active_days': active_days,
+            'avg_daily_minutes': round(total_minutes / max(active_days, 1), 1)
+        }
+
+    def get_study_overview(self, user_id: int) -> Dict[str, Any]:
+        """
+        همه آمار صفحه‌های آمار در یک کوئری:
+        progress (مثل get_user_progress)، today (مثل get_today_study_stats)،
+        weekly (مثل get_weekly_stats)، weekly_total و streak
+        """
+        today = date.today()
+        week_start = (today - timedelta(days=6)).isoformat()
+        try:
+            with self.connections.read() as conn:
                 cursor = conn.execute('''
-                    SELECT COUNT(DISTINCT study_date) FROM study_plans 
-                    WHERE user_id = ? AND completed = TRUE
+                    SELECT study_date, total_minutes, sessions_count, subjects
+                    FROM study_stats 
+                    WHERE user_id = ?
+                    ORDER BY study_date
                 ''', (user_id,))
-                active_days = cursor.fetchone()[0] or 0
-                
-                # میانگین روزانه
-                avg_daily = round(total_minutes / max(active_days, 1), 1)
-                
-                return {
-                    'total_minutes': total_minutes,
-                    'total_hours': round(total_minutes / 60, 1),
-                    'total_sessions': total_sessions,
-                    'active_days': active_days,
-                    'avg_daily_minutes': avg_daily
-                }
+                days = cursor.fetchall()
         except Exception as e:
-            logger.error(f"❌ خطا در دریافت پیشرفت کاربر: {e}")
-            return {'total_minutes': 0, 'total_hours': 0, 'total_sessions': 0, 'active_days': 0, 'avg_daily_minutes': 0}
+            logger.error(f"❌ خطا در دریافت آمار کاربر {user_id}: {e}")
+            days = []
+
+        return self._build_overview(days, today, week_start)
+
+    def _build_overview(self, days: List[tuple], today: date, week_start: str) -> Dict[str, Any]:
+        """محاسبه آمار از ردیف‌های روزانه (study_date, total_minutes, sessions_count, subjects)"""
+        total_minutes = sum(row[1] or 0 for row in days)
+        total_sessions = sum(row[2] or 0 for row in days)
+        today_row = next((row for row in days if row[0] == today.isoformat()), None)
+        weekly = [
+            {'date': row[0], 'total_minutes': row[1] or 0, 'sessions_count': row[2] or 0}
+            for row in days if row[0] >= week_start
+        ]
+
+        return {
+            'progress': self._progress_dict(total_minutes, total_sessions, len(days)),
+            'today': {
+                'total_minutes': (today_row[1] or 0) if today_row else 0,
+                'sessions_count': (today_row[2] or 0) if today_row else 0,
+                'subjects': (today_row[3] if today_row else None) or 'هیچ'
+            },
+            'weekly': weekly,
+            'weekly_total': sum(day['total_minutes'] for day in weekly),
+            'streak': calculate_streak([row[0] for row in days if (row[1] or 0) > 0])
+        }
 
     def get_active_users(self, days_active: int = 30) -> List[Dict[str, Any]]:
         """دریافت کاربران فعال (اختیاری - برای ریمایندرهای عمومی)"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self.connections.read() as conn:
             cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
             
             cursor.execute('''
 SELECT DISTINCT user_id 
@@ -381,7 +606,7 @@ OR created_at >= datetime('now', ?)
     def log_error(self, user_id: int, error_type: str, error_message: str):
         """لاگ کردن خطاها برای عیب‌یابی"""
         try:
-            with self.get_connection() as conn:
+            with self.connections.write() as conn:
                 conn.execute('''
                     INSERT INTO error_logs (user_id, error_type, error_message)
                     VALUES (?, ?, ?)
@@ -393,7 +618,7 @@ OR created_at >= datetime('now', ?)
     def get_database_info(self) -> Dict[str, Any]:
         """دریافت اطلاعات کلی دیتابیس"""
         try:
-            with self.get_connection() as conn:
+            with self.connections.read() as conn:
                 # تعداد کاربران
                 cursor = conn.execute('SELECT COUNT(*) FROM users')
                 user_count = cursor.fetchone()[0]
@@ -418,12 +643,13 @@ OR created_at >= datetime('now', ?)
     # 🔥 اضافه کردن متدهای ضروری برای ریمایندر پیشرفته
     def execute_query(self, query: str, params: tuple = (), fetch_all: bool = False):
         """اجرای کوئری و بازگرداندن نتایج - برای سازگاری با کدهای موجود"""
+        is_select = query.strip().upper().startswith('SELECT')
         try:
-            with self.get_connection() as conn:
+            with (self.connections.read() if is_select else self.connections.write()) as conn:
                 cursor = conn.cursor()
                 cursor.execute(query, params)
                 
-                if query.strip().upper().startswith('SELECT'):
+                if is_select:
                     if fetch_all:
                         result = cursor.fetchall()
                     else:
@@ -440,7 +666,7 @@ OR created_at >= datetime('now', ?)
     def execute_many(self, query: str, params_list: list):
         """اجرای دستورات bulk"""
         try:
-            with self.get_connection() as conn:
+            with self.connections.write() as conn:
                 cursor = conn.cursor()
                 cursor.executemany(query, params_list)
                 conn.commit()
@@ -453,7 +679,8 @@ OR created_at >= datetime('now', ?)
                             repeat_count: int = 1, repeat_interval: int = 1):
         """افزودن ریمایندر پیشرفته جدید"""
         try:
-            with self.get_connection() as conn:
+            self.flush_user_writes()
+            with self.connections.write() as conn:
                 conn.execute('''
                     INSERT INTO advanced_reminders 
                     (user_id, title, message_text, scheduled_date, scheduled_time, repeat_count, repeat_interval)
@@ -469,7 +696,7 @@ OR created_at >= datetime('now', ?)
     def get_user_advanced_reminders(self, user_id: int):
         """دریافت ریمایندرهای پیشرفته کاربر"""
         try:
-            with self.get_connection() as conn:
+            with self.connections.read() as conn:
                 cursor = conn.execute('''
                     SELECT id, title, message_text, scheduled_date, scheduled_time, 
                            repeat_count, repeat_interval, is_active, created_at
@@ -499,7 +726,7 @@ OR created_at >= datetime('now', ?)
     def get_today_advanced_reminders(self):
         """دریافت ریمایندرهای پیشرفته امروز"""
         try:
-            with self.get_connection() as conn:
+            with self.connections.read() as conn:
                 cursor = conn.execute('''
                     SELECT id, user_id, title, message_text, scheduled_time, repeat_count
                     FROM advanced_reminders 
@@ -526,7 +753,7 @@ OR created_at >= datetime('now', ?)
     def deactivate_reminder(self, reminder_id: int):
         """غیرفعال کردن ریمایندر"""
         try:
-            with self.get_connection() as conn:
+            with self.connections.write() as conn:
                 conn.execute('''
                     UPDATE advanced_reminders 
                     SET is_active = FALSE 
@@ -542,7 +769,7 @@ OR created_at >= datetime('now', ?)
     def delete_reminder(self, reminder_id: int):
         """حذف ریمایندر"""
         try:
-            with self.get_connection() as conn:
+            with self.connections.write() as conn:
                 conn.execute('''
                     DELETE FROM advanced_reminders 
                     WHERE id = ?
@@ -0,0 +1,219 @@
+"""
+کاتالوگ کنکورها - تاریخ‌های برگزاری یک‌بار هنگام ایمپورت از EXAMS_1405 ساخته می‌شوند
+(datetime با تایم‌زون تهران، مرتب‌شده برای پیدا کردن کنکور بعدی با جستجوی دودویی)
+"""
+import logging
+import time
+from bisect import bisect_right
+from datetime import datetime
+from types import MappingProxyType
+from typing import Dict, List, Mapping, NamedTuple, Optional, Tuple
+import pytz
+
+from exam_data import EXAMS_1405
+
+logger = logging.getLogger(__name__)
+
+# تنظیم تایم‌زون تهران
+TEHRAN_TIMEZONE = pytz.timezone('Asia/Tehran')
+
+
+class ExamInfo(NamedTuple):
+    """اطلاعات ثابت یک کنکور"""
+    key: str
+    name: str
+    time: str
+    persian_date: str
+    dates: Tuple[datetime, ...]          # تاریخ‌های برگزاری (aware، مرتب)
+    timestamps: Tuple[float, ...]        # همان تاریخ‌ها به صورت epoch برای مقایسه سریع
+
+
+class Countdown(NamedTuple):
+    """زمان باقی‌مانده تا یک تاریخ (همه صفرها یعنی برگزار شده)"""
+    target: Optional[datetime]
+    total_seconds: int
+    total_days: int
+    weeks: int
+    days: int
+    hours: int
+    minutes: int
+    seconds: int
+
+    @property
+    def is_past(self) -> bool:
+        return self.total_seconds <= 0
+
+    @property
+    def short_text(self) -> str:
+        """متن کوتاه مثل «۱۲ روز و ۳ ساعت» (مطابق format_time_remaining)"""
+        if self.total_days > 30:
+            return f"{self.total_days} روز"
+        if self.total_days > 0:
+            return f"{self.total_days} روز و {self.hours} ساعت"
+        if self.hours > 0:
+            return f"{self.hours} ساعت و {self.minutes} دقیقه"
+        return f"{self.minutes} دقیقه"
+
+    @property
+    def text(self) -> str:
+        """متن کامل وضعیت برای نمایش"""
+        if self.is_past:
+            return "✅ برگزار شده"
+        return f"⏳ {self.short_text} باقی مانده"
+
+    def as_dict(self) -> Dict[str, int]:
+        """خروجی هم‌شکل format_time_remaining_detailed"""
+        return {
+            'total_days': self.total_days,
+            'weeks': self.weeks,
+            'days': self.days,
+            'hours': self.hours,
+            'minutes': self.minutes,
+            'seconds': self.seconds,
+            'total_seconds': self.total_seconds
+        }
+
+
+PAST_COUNTDOWN = Countdown(None, 0, 0, 0, 0, 0, 0, 0)
+
+
+def _countdown(target: Optional[datetime], target_ts: float, now_ts: float) -> Countdown:
+    total_seconds = int(target_ts - now_ts)
+    if target is None or total_seconds <= 0:
+        return PAST_COUNTDOWN
+    total_days = total_seconds // 86400
+    return Countdown(
+        target,
+        total_seconds,
+        total_days,
+        total_days // 7,
+        total_days % 7,
+        (total_seconds % 86400) // 3600,
+        (total_seconds % 3600) // 60,
+        total_seconds % 60
+    )
+
+
+class ExamCatalog:
+    """
+    کاتالوگ تغییرناپذیر کنکورها:
+    - get(key): اطلاعات کنکور با تاریخ‌های aware
+    - next_exam(): نزدیک‌ترین کنکور آینده با bisect روی timeline مرتب
+    - countdowns(): زمان باقی‌مانده همه کنکورها در یک محاسبه (کش برای همان ثانیه)
+    """
+
+    def __init__(self, exams_data: Dict[str, dict]):
+        exams = {}
+        timeline: List[Tuple[float, str, datetime]] = []
+        for key, exam in exams_data.items():
+            dates = self._build_dates(exam)
+            exams[key] = ExamInfo(
+                key=key,
+                name=exam['name'],
+                time=exam['time'],
+                persian_date=exam['persian_date'],
+                dates=tuple(dates),
+                timestamps=tuple(date.timestamp() for date in dates)
+            )
+            timeline.extend((date.timestamp(), key, date) for date in dates)
+
+        timeline.sort(key=lambda item: item[0])
+        self.exams: Mapping[str, ExamInfo] = MappingProxyType(exams)
+        self._timeline = tuple(timeline)
+        self._timeline_ts = tuple(item[0] for item in timeline)
+        self._countdowns: Tuple[int, Mapping[str, Countdown]] = (-1, MappingProxyType({}))
+
+    @staticmethod
+    def _build_dates(exam: dict) -> List[datetime]:
+        """تبدیل تاپل‌های تاریخ به datetime تهران (ساعت از فیلد time)"""
+        time_parts = exam['time'].split(':')
+        hour = int(time_parts[0])
+        minute = int(time_parts[1]) if len(time_parts) > 1 else 0
+
+        raw_dates = exam['date'] if isinstance(exam['date'], list) else [exam['date']]
+        dates = []
+        for date_tuple in raw_dates:
+            if len(date_tuple) == 3:  # (year, month, day)
+                naive = datetime(date_tuple[0], date_tuple[1], date_tuple[2], hour, minute, 0)
+            else:  # اگر ساعت هم در تاریخ باشد
+                naive = datetime(*date_tuple)
+            dates.append(TEHRAN_TIMEZONE.localize(naive))
+        return sorted(dates)
+
+    # --- جستجو ---
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.exams
+
+    def get(self, key: str) -> Optional[ExamInfo]:
+        return self.exams.get(key)
+
+    @staticmethod
+    def _now_ts(now: Optional[datetime]) -> float:
+        return now.timestamp() if now is not None else time.time()
+
+    def next_date(self, key: str, now: Optional[datetime] = None) -> Optional[datetime]:
+        """اولین تاریخ آینده یک کنکور (None اگر همه برگزار شده باشند)"""
+        exam = self.exams.get(key)
+        if exam is None:
+            return None
+        index = bisect_right(exam.timestamps, self._now_ts(now))
+        return exam.dates[index] if index < len(exam.dates) else None
+
+    def next_exam(self, now: Optional[datetime] = None) -> Optional[Tuple[ExamInfo, datetime]]:
+        """نزدیک‌ترین کنکور آینده و تاریخ آن - O(log n)"""
+        index = bisect_right(self._timeline_ts, self._now_ts(now))
+        if index >= len(self._timeline):
+            return None
+        _, key, date = self._timeline[index]
+        return self.exams[key], date
+
+    # --- زمان باقی‌مانده ---
+
+    def countdowns(self, now: Optional[datetime] = None) -> Mapping[str, Countdown]:
+        """
+        زمان باقی‌مانده تا تاریخ آینده بعدی همه کنکورها در یک پیمایش.
+        نتیجه برای هر ثانیه یک‌بار ساخته و بین همه صفحه‌ها و ریمایندرها مشترک است.
+        """
+        now_ts = self._now_ts(now)
+        second = int(now_ts)
+        cached_second, cached = self._countdowns
+        if now is None and cached_second == second:
+            return cached
+
+        result = {}
+        for key, exam in self.exams.items():
+            index = bisect_right(exam.timestamps, now_ts)
+            if index < len(exam.dates):
+                result[key] = _countdown(exam.dates[index], exam.timestamps[index], now_ts)
+            else:
+                result[key] = PAST_COUNTDOWN
+
+        result = MappingProxyType(result)
+        if now is None:
+            self._countdowns = (second, result)
+        return result
+
+    def countdown(self, key: str, now: Optional[datetime] = None) -> Countdown:
+        """زمان باقی‌مانده تا تاریخ آینده بعدی یک کنکور"""
+        return self.countdowns(now).get(key, PAST_COUNTDOWN)
+
+    def date_countdowns(self, key: str, now: Optional[datetime] = None) -> List[Countdown]:
+        """زمان باقی‌مانده تا هر یک از تاریخ‌های یک کنکور چندروزه"""
+        exam = self.exams.get(key)
+        if exam is None:
+            return []
+        now_ts = self._now_ts(now)
+        return [_countdown(date, ts, now_ts) for date, ts in zip(exam.dates, exam.timestamps)]
+
+    @staticmethod
+    def countdown_to(target: datetime, now: Optional[datetime] = None) -> Countdown:
+        """زمان باقی‌مانده تا یک datetime دلخواه (naive به وقت تهران فرض می‌شود)"""
+        if target.tzinfo is None:
+            target = TEHRAN_TIMEZONE.localize(target)
+        now_ts = now.timestamp() if now is not None else time.time()
+        return _countdown(target, target.timestamp(), now_ts)
+
+
+# ایجاد instance اصلی
+exam_catalog = ExamCatalog(EXAMS_1405)
@@ -5,16 +5,17 @@ import logging
 from aiogram import types, F
 from aiogram.fsm.context import FSMContext
 
+from config import ADMIN_ID
+
 from keyboards import admin_menu, back_button_menu
-from database import Database
+from utils.async_db import async_db
+from utils.channel_registry import channel_registry
 
 logger = logging.getLogger(__name__)
-db = Database()
+db = async_db  # فراخوانی‌های دیتابیس روی thread اختصاصی اجرا و await می‌شوند
 
 async def admin_menu_handler(message: types.Message):
     """هندلر منوی مدیریت"""
-    from config import ADMIN_ID
-    
     if message.from_user.id != ADMIN_ID:
         await message.answer("❌ دسترسی denied!")
         return
@@ -45,7 +46,7 @@ async def admin_callback_handler(callback: types.CallbackQuery, state: FSMContex
 
 async def admin_channels_handler(callback: types.CallbackQuery):
     """مدیریت کانال‌های اجباری"""
-    channels = db.get_mandatory_channels()
+    channels = await channel_registry.get()
     
     if not channels:
         message = "👑 <b>مدیریت کانال‌های اجباری</b>\n\n❌ هیچ کانال اجباری تعریف نشده است."
@@ -83,8 +84,6 @@ async def admin_add_channel_handler(callback: types.CallbackQuery, state: FSMCon
 
 async def admin_panel_handler(message: types.Message):
     """هندلر پنل مدیریت - فقط برای ادمین"""
-    from config import ADMIN_ID
-    
     if message.from_user.id != ADMIN_ID:
         await message.answer("❌ دسترسی denied!")
         return
@@ -98,8 +97,6 @@ async def admin_panel_handler(message: types.Message):
 
 async def reminder_management_handler(message: types.Message):
     """هندلر مدیریت یادآوری‌ها - فقط برای ادمین"""
-    from config import ADMIN_ID
-    
     if message.from_user.id != ADMIN_ID:
         await message.answer("❌ دسترسی denied!")
         return
@@ -142,7 +139,7 @@ async def process_channel_info(message: types.Message, state: FSMContext, bot):
             return
         
         # ذخیره کانال در دیتابیس
-        db.add_mandatory_channel(
+        await db.add_mandatory_channel(
             channel_id=channel_id,
             channel_username=channel_username,
             channel_title=channel_title,
@@ -5,6 +5,7 @@ import logging
 from aiogram import types, F
 
 from keyboards import main_menu
+from handlers.menu_handlers import stats_handler, study_plan_handler, admin_handler
 
 logger = logging.getLogger(__name__)
 
@@ -25,18 +26,15 @@ async def back_to_main_handler(callback: types.CallbackQuery):
 
 async def back_to_stats_handler(callback: types.CallbackQuery):
     """بازگشت به آمار"""
-    from handlers.menu_handlers import stats_handler
     await callback.message.delete()
     await stats_handler(callback.message)
 
 async def back_to_study_handler(callback: types.CallbackQuery):
     """بازگشت به برنامه مطالعاتی"""
-    from handlers.menu_handlers import study_plan_handler
     await callback.message.delete()
     await study_plan_handler(callback.message)
 
 async def back_to_admin_handler(callback: types.CallbackQuery):
     """بازگشت به مدیریت"""
-    from handlers.menu_handlers import admin_handler
     await callback.message.delete()
     await admin_handler(callback.message)
@@ -7,8 +7,12 @@ from aiogram.filters import Command, CommandStart
 
 from config import MOTIVATIONAL_MESSAGES, ADMIN_ID
 from keyboards import main_menu, admin_main_menu, create_reminder_management_menu, admin_panel_menu
-from utils import check_user_membership, create_membership_keyboard
-from database import Database
+from utils import check_user_membership, create_membership_keyboard, calculate_study_progress
+from utils.async_db import async_db
+from utils.channel_registry import channel_registry
+from utils.dead_chats import dead_chats
+from handlers.admin_handlers import admin_panel_handler, reminder_management_handler
+from handlers.menu_handlers import exams_menu_handler, study_plan_handler, stats_handler
 
 # ایمپورت ماژول‌های ریمایندر
 from reminder.reminder_keyboards import create_reminder_main_menu
@@ -17,21 +21,22 @@ from reminder.auto_reminder_handlers import user_auto_reminders_list
 from reminder.advanced_reminder_handlers import advanced_reminders_admin_handler
 
 logger = logging.getLogger(__name__)
-db = Database()
+db = async_db  # فراخوانی‌های دیتابیس روی thread اختصاصی اجرا و await می‌شوند
 
 async def start_handler(message: types.Message, bot: Bot):
     """هندلر دستور /start - نسخه بهبود یافته"""
     user = message.from_user
     logger.info(f"🎯 دریافت /start از {user.first_name} ({user.id})")
     
-    # ثبت کاربر در دیتابیس
-    db.add_user(user.id, user.username or "", user.first_name, user.last_name or "")
+    # ثبت کاربر در دیتابیس (کاربری که قبلاً ربات را بلاک کرده بود دوباره قابل‌تحویل می‌شود)
+    await db.add_user(user.id, user.username or "", user.first_name, user.last_name or "")
+    dead_chats.revive(user.id)
     
     # بررسی عضویت
     is_member = await check_user_membership(bot, user.id)
     
     if not is_member:
-        channels = db.get_mandatory_channels()
+        channels = await channel_registry.get()
         if channels:
             channel_list = "\n".join([f"• {ch['channel_title']}" for ch in channels])
             
@@ -40,7 +45,7 @@ async def start_handler(message: types.Message, bot: Bot):
                 f"🚫 <b>برای استفاده از ربات باید در کانال‌های زیر عضو باشید:</b>\n\n"
                 f"{channel_list}\n\n"
                 f"پس از عضویت، دکمه '✅ بررسی عضویت' را بزنید.",
-                reply_markup=create_membership_keyboard(),
+                reply_markup=await create_membership_keyboard(),
                 parse_mode="HTML"
             )
             return
@@ -69,11 +74,14 @@ async def start_handler(message: types.Message, bot: Bot):
 """
     await message.answer(welcome, reply_markup=welcome_menu, parse_mode="HTML")
 
+async def test_handler(message: types.Message):
+    """دستور /test - بررسی سریع فعال بودن ربات"""
+    await message.answer("✅ ربات فعال است و پیام‌ها را دریافت می‌کند!")
+
 # بقیه فانکشن‌ها بدون تغییر...
 async def stats_command_handler(message: types.Message):
     """دستور سریع برای مشاهده آمار"""
-    from utils import calculate_study_progress
-    user_stats = db.get_user_progress(message.from_user.id)
+    user_stats = await db.get_user_progress(message.from_user.id)
     progress = calculate_study_progress(user_stats['total_minutes'])
     
     await message.answer(
@@ -89,24 +97,18 @@ async def stats_command_handler(message: types.Message):
 
 async def handle_admin_panel(message: types.Message):
     """هندلر پنل مدیریت - فقط برای ادمین"""
-    from config import ADMIN_ID
-    
     if message.from_user.id != ADMIN_ID:
         await message.answer("❌ دسترسی denied!")
         return
     
-    from handlers.admin_handlers import admin_panel_handler
     await admin_panel_handler(message)
 
 async def handle_reminder_management(message: types.Message):
     """هندلر مدیریت یادآوری‌ها - فقط برای ادمین"""
-    from config import ADMIN_ID
-    
     if message.from_user.id != ADMIN_ID:
         await message.answer("❌ دسترسی denied!")
         return
     
-    from handlers.admin_handlers import reminder_management_handler
     await reminder_management_handler(message)
 
 async def handle_auto_reminders(message: types.Message):
@@ -127,18 +129,15 @@ async def handle_advanced_reminders(message: types.Message):
 
 async def handle_exam_timing(message: types.Message):
     """هندلر منوی زمان‌سنجی کنکورها"""
-    from handlers.exam_handlers import exam_menu_handler
-    await exam_menu_handler(message)
+    await exams_menu_handler(message)
 
 async def handle_study_plan(message: types.Message):
     """هندلر منوی برنامه مطالعاتی"""
-    from handlers.study_handlers import study_plan_menu_handler
-    await study_plan_menu_handler(message)
+    await study_plan_handler(message)
 
 async def handle_study_stats(message: types.Message):
     """هندلر منوی آمار مطالعه"""
-    from handlers.stats_handlers import stats_menu_handler
-    await stats_menu_handler(message)
+    await stats_handler(message)
 
 
 async def unknown_handler(message: types.Message):
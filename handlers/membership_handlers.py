@@ -13,7 +13,8 @@ logger = logging.getLogger(__name__)
 async def check_membership_handler(callback: types.CallbackQuery, bot):
     """بررسی عضویت کاربر"""
     user_id = callback.from_user.id
-    is_member = await check_user_membership(bot, user_id)
+    # کاربر می‌گوید عضو شده است؛ نتیجه منفی کش‌شده دوباره بررسی می‌شود
+    is_member = await check_user_membership(bot, user_id, force=True)
     
     if is_member:
         await callback.message.edit_text(
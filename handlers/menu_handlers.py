@@ -4,6 +4,8 @@
 import logging
 from aiogram import types, F
 
+from config import ADMIN_ID
+
 from keyboards import (
     exams_menu, study_plan_menu, stats_menu, admin_menu,
     create_study_plan_keyboard, create_stats_keyboard
@@ -11,12 +13,13 @@ from keyboards import (
 # جدید:
 from utils import (
     get_study_tips, calculate_study_progress, format_study_time,
-    calculate_streak, get_motivational_quote
+    get_motivational_quote
 )
-from database import Database
+from utils.async_db import async_db
+from utils.channel_registry import channel_registry
 
 logger = logging.getLogger(__name__)
-db = Database()
+db = async_db  # فراخوانی‌های دیتابیس روی thread اختصاصی اجرا و await می‌شوند
 
 async def exams_menu_handler(message: types.Message):
     """هندلر منوی زمان‌سنجی کنکورها"""
@@ -27,7 +30,7 @@ async def study_plan_handler(message: types.Message):
     """هندلر منوی برنامه مطالعاتی"""
     logger.info(f"📅 کاربر {message.from_user.id} منوی برنامه مطالعاتی را انتخاب کرد")
     
-    user_stats = db.get_user_progress(message.from_user.id)
+    user_stats = await db.get_user_progress(message.from_user.id)
     progress = calculate_study_progress(user_stats['total_minutes'])
     
     await message.answer(
@@ -48,13 +51,14 @@ async def stats_handler(message: types.Message):
     """هندلر منوی آمار مطالعه"""
     logger.info(f"📊 کاربر {message.from_user.id} منوی آمار مطالعه را انتخاب کرد")
     
-    today_stats = db.get_today_study_stats(message.from_user.id)
-    weekly_stats = db.get_weekly_stats(message.from_user.id)
-    user_stats = db.get_user_progress(message.from_user.id)
+    # همه آمار این صفحه در یک کوئری
+    overview = await db.get_study_overview(message.from_user.id)
+    today_stats = overview['today']
+    weekly_stats = overview['weekly']
+    user_stats = overview['progress']
     
-    total_weekly = sum(day['total_minutes'] for day in weekly_stats)
-    study_days = [day['date'] for day in weekly_stats if day['total_minutes'] > 0]
-    current_streak = calculate_streak(study_days)
+    total_weekly = overview['weekly_total']
+    current_streak = overview['streak']
     
     await message.answer(
         f"📊 <b>آمار مطالعه حرفه‌ای</b>\n\n"
@@ -76,8 +80,6 @@ async def stats_handler(message: types.Message):
 
 async def main_menu_handler(message: types.Message):
     """هندلر منوی اصلی"""
-    from config import ADMIN_ID
-    
     user_id = message.from_user.id
     is_admin = (user_id == ADMIN_ID)
     
@@ -90,8 +92,6 @@ async def main_menu_handler(message: types.Message):
 
 async def admin_handler(message: types.Message):
     """هندلر منوی مدیریت"""
-    from config import ADMIN_ID
-    
     user = message.from_user
     logger.info(f"👑 کاربر {user.first_name} منوی مدیریت را انتخاب کرد")
     
@@ -99,7 +99,7 @@ async def admin_handler(message: types.Message):
         await message.answer("❌ دسترسی denied!")
         return
         
-    channels = db.get_mandatory_channels()
+    channels = await channel_registry.get()
     channel_count = len(channels)
     
     await message.answer(
@@ -6,11 +6,13 @@ from aiogram import types, F
 from aiogram.fsm.context import FSMContext
 
 from keyboards import create_stats_keyboard, back_button_menu
-from utils import get_motivational_quote, format_study_time, calculate_streak
-from database import Database
+from utils import get_motivational_quote, format_study_time
+from utils.async_db import async_db
+from handlers import study_handlers
+from handlers.menu_handlers import stats_handler
 
 logger = logging.getLogger(__name__)
-db = Database()
+db = async_db  # فراخوانی‌های دیتابیس روی thread اختصاصی اجرا و await می‌شوند
 
 async def stats_callback_handler(callback: types.CallbackQuery):
     """هندلر اصلی برای callback_dataهای stats"""
@@ -33,17 +35,15 @@ async def stats_callback_handler(callback: types.CallbackQuery):
 
 async def today_stats_handler(callback: types.CallbackQuery):
     """نمایش آمار امروز"""
-    from handlers.study_handlers import today_stats_handler
-    await today_stats_handler(callback)
+    await study_handlers.today_stats_handler(callback)
 
 async def weekly_stats_handler(callback: types.CallbackQuery):
     """نمایش آمار هفته جاری"""
-    from handlers.study_handlers import weekly_stats_handler
-    await weekly_stats_handler(callback)
+    await study_handlers.weekly_stats_handler(callback)
 
 async def monthly_stats_handler(callback: types.CallbackQuery):
     """نمایش آمار ماه جاری"""
-    monthly_stats = db.get_monthly_stats(callback.from_user.id)
+    monthly_stats = await db.get_monthly_stats(callback.from_user.id)
     total_monthly = sum(day['total_minutes'] for day in monthly_stats)
     
     await callback.message.edit_text(
@@ -58,13 +58,14 @@ async def monthly_stats_handler(callback: types.CallbackQuery):
 
 async def full_stats_handler(callback: types.CallbackQuery):
     """نمایش آمار کامل"""
-    user_stats = db.get_user_progress(callback.from_user.id)
-    today_stats = db.get_today_study_stats(callback.from_user.id)
-    weekly_stats = db.get_weekly_stats(callback.from_user.id)
+    # همه آمار این صفحه در یک کوئری
+    overview = await db.get_study_overview(callback.from_user.id)
+    user_stats = overview['progress']
+    today_stats = overview['today']
+    weekly_stats = overview['weekly']
     
-    total_weekly = sum(day['total_minutes'] for day in weekly_stats)
-    study_days = [day['date'] for day in weekly_stats if day['total_minutes'] > 0]
-    current_streak = calculate_streak(study_days)
+    total_weekly = overview['weekly_total']
+    current_streak = overview['streak']
     
     await callback.message.edit_text(
         f"📊 <b>گزارش کامل آمار مطالعه</b>\n\n"
@@ -91,5 +92,4 @@ async def refresh_stats_handler(callback: types.CallbackQuery):
 
 async def back_to_stats_handler(callback: types.CallbackQuery):
     """بازگشت به منوی آمار"""
-    from handlers.menu_handlers import stats_handler
     await stats_handler(callback.message)
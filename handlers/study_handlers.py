@@ -7,11 +7,11 @@ from aiogram import types, F
 from aiogram.fsm.context import FSMContext
 
 from keyboards import study_subjects_menu, create_stats_keyboard, back_button_menu
-from utils import get_motivational_quote, format_study_time
-from database import Database
+from utils import get_motivational_quote, format_study_time, calculate_streak
+from utils.async_db import async_db
 
 logger = logging.getLogger(__name__)
-db = Database()
+db = async_db  # فراخوانی‌های دیتابیس روی thread اختصاصی اجرا و await می‌شوند
 
 async def study_callback_handler(callback: types.CallbackQuery, state: FSMContext):
     """هندلر اصلی برای callback_dataهای study"""
@@ -28,7 +28,7 @@ async def study_callback_handler(callback: types.CallbackQuery, state: FSMContex
 
 async def today_stats_handler(callback: types.CallbackQuery):
     """نمایش آمار امروز"""
-    today_stats = db.get_today_study_stats(callback.from_user.id)
+    today_stats = await db.get_today_study_stats(callback.from_user.id)
     
     await callback.message.edit_text(
         f"📊 <b>آمار مطالعه امروز</b>\n\n"
@@ -43,9 +43,7 @@ async def today_stats_handler(callback: types.CallbackQuery):
 
 async def weekly_stats_handler(callback: types.CallbackQuery):
     """نمایش آمار هفته جاری"""
-    from utils import calculate_streak
-    
-    weekly_stats = db.get_weekly_stats(callback.from_user.id)
+    weekly_stats = await db.get_weekly_stats(callback.from_user.id)
     total_weekly = sum(day['total_minutes'] for day in weekly_stats)
     
     stats_text = "📅 <b>آمار مطالعه هفته جاری</b>\n\n"
@@ -112,7 +110,7 @@ async def process_study_duration(message: types.Message, state: FSMContext):
         subject_name = data.get('subject_name')
         
         # ذخیره در دیتابیس
-        db.add_study_session(
+        await db.add_study_session(
             user_id=message.from_user.id,
             subject=subject,
             topic=f"جلسه مطالعه {subject_name}",
@@ -122,7 +120,7 @@ async def process_study_duration(message: types.Message, state: FSMContext):
         await state.clear()
         
         # نمایش نتیجه
-        user_stats = db.get_today_study_stats(message.from_user.id)
+        user_stats = await db.get_today_study_stats(message.from_user.id)
         
         await message.answer(
             f"✅ <b>جلسه مطالعه ثبت شد!</b>\n\n"
@@ -6,15 +6,22 @@ from aiogram.types import (
     ReplyKeyboardRemove
 )
 from exam_data import EXAMS_1405
+from utils.keyboard_registry import cached_keyboard
 
 # منوی اصلی با کیبورد معمولی
-def main_menu(user_id: int = None):
+def main_menu(user_id: int = None, is_admin: bool = None):
     """منوی اصلی"""
     from config import ADMIN_ID
     
     # بررسی آیا کاربر ادمین هست
-    is_admin_user = (user_id == ADMIN_ID)
+    if is_admin is None:
+        is_admin = (user_id == ADMIN_ID)
     
+    # فقط دو نسخه وجود دارد (ادمین/کاربر) - کش بر اساس نقش نه user_id
+    return _main_menu(is_admin)
+
+@cached_keyboard
+def _main_menu(is_admin_user: bool):
     keyboard = [
         [KeyboardButton(text="⏳ زمان‌سنجی کنکورها")],
         [KeyboardButton(text="📅 برنامه مطالعاتی پیشرفته")],
@@ -28,6 +35,7 @@ def main_menu(user_id: int = None):
     
     return ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True)
 
+@cached_keyboard
 def admin_main_menu():
     """منوی اصلی برای ادمین"""
     return ReplyKeyboardMarkup(
@@ -47,8 +55,10 @@ def reminders_submenu(user_id: int = None):
     from config import ADMIN_ID
     
     # بررسی آیا کاربر ادمین هست
-    is_admin_user = (user_id == ADMIN_ID)
-    
+    return _reminders_submenu(user_id == ADMIN_ID)
+
+@cached_keyboard
+def _reminders_submenu(is_admin_user: bool):
     keyboard = [
         [KeyboardButton(text="⏰ یادآوری کنکورها")],
         [KeyboardButton(text="📝 یادآوری شخصی")],
@@ -70,6 +80,7 @@ def reminders_submenu(user_id: int = None):
 
 # بقیه توابع بدون تغییر...
 
+@cached_keyboard
 def advanced_reminders_submenu():
     """منوی ریمایندرهای پیشرفته - فقط برای ادمین"""
     return ReplyKeyboardMarkup(
@@ -85,6 +96,7 @@ def advanced_reminders_submenu():
         input_field_placeholder="گزینه مورد نظر را انتخاب کنید..."
     )
 
+@cached_keyboard
 def admin_menu():
     """منوی مدیریت ادمین"""
     keyboard = [
@@ -98,6 +110,7 @@ def admin_menu():
     return ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True)
 
 # بقیه توابع بدون تغییر...
+@cached_keyboard
 def reminder_management_menu():
     """منوی مدیریت یادآوری‌ها"""
     keyboard = [
@@ -107,10 +120,12 @@ def reminder_management_menu():
     return ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True)
 
 # حذف منو
+@cached_keyboard
 def remove_menu():
     return ReplyKeyboardRemove()
 
 # منوی مدیریت یادآوری‌ها - نسخه بهبود یافته
+@cached_keyboard
 def create_reminder_management_menu(is_admin=False):
     """منوی مدیریت یادآوری‌ها"""
     if is_admin:
@@ -141,6 +156,7 @@ def create_reminder_management_menu(is_admin=False):
         )
 
 # منوی پنل مدیریت - نسخه بهبود یافته
+@cached_keyboard
 def admin_panel_menu():
     """منوی پنل مدیریت با قابلیت‌های کامل"""
     return ReplyKeyboardMarkup(
@@ -155,6 +171,7 @@ def admin_panel_menu():
     )
 
 # بقیه توابع بدون تغییر می‌مونن...
+@cached_keyboard
 def exams_menu():
     keyboard = []
     keys = list(EXAMS_1405.keys())
@@ -182,6 +199,7 @@ def exams_menu():
     
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
+@cached_keyboard
 def exam_actions_menu(exam_key=None):
     keyboard = []
     
@@ -204,6 +222,7 @@ def exam_actions_menu(exam_key=None):
     
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
+@cached_keyboard
 def study_plan_menu():
     keyboard = [
         [
@@ -228,6 +247,7 @@ def study_plan_menu():
     ]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
+@cached_keyboard
 def stats_menu():
     keyboard = [
         [
@@ -254,6 +274,7 @@ def stats_menu():
     ]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
+@cached_keyboard
 def admin_menu():
     keyboard = [
         [
@@ -275,6 +296,7 @@ def admin_menu():
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 # دکمه بازگشت
+@cached_keyboard
 def back_button_menu(text="🔙 بازگشت", callback_data="main:back"):
     keyboard = [[
         InlineKeyboardButton(text=text, callback_data=callback_data)
@@ -282,6 +304,7 @@ def back_button_menu(text="🔙 بازگشت", callback_data="main:back"):
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 # منوی تأیید/لغو
+@cached_keyboard
 def confirm_cancel_menu(confirm_data="confirm", cancel_data="cancel"):
     keyboard = [
         [
@@ -292,6 +315,7 @@ def confirm_cancel_menu(confirm_data="confirm", cancel_data="cancel"):
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 # کیبورد برای ثبت مطالعه
+@cached_keyboard
 def study_subjects_menu():
     subjects = [
         ("ریاضی", "math"),
@@ -332,10 +356,9 @@ def create_membership_keyboard():
     """
     ایجاد کیبورد برای عضویت در کانال‌های اجباری
     """
-    from database import Database
-    db = Database()
+    from utils.channel_registry import channel_registry
     
-    channels = db.get_mandatory_channels()
+    channels = channel_registry.get_sync()
     keyboard = []
     
     for channel in channels:
@@ -353,6 +376,7 @@ def create_membership_keyboard():
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 # کیبوردهای پیشرفته برای برنامه مطالعاتی
+@cached_keyboard
 def create_study_plan_keyboard():
     """
     ایجاد کیبورد پیشرفته برای برنامه مطالعاتی
@@ -381,6 +405,7 @@ def create_study_plan_keyboard():
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 # کیبوردهای پیشرفته برای آمار مطالعه
+@cached_keyboard
 def create_stats_keyboard():
     """
     ایجاد کیبورد پیشرفته برای آمار مطالعه
@@ -410,6 +435,7 @@ def create_stats_keyboard():
     ]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
+@cached_keyboard
 def create_reminder_main_menu():
     """منوی اصلی ریمایندر"""
     return ReplyKeyboardMarkup(
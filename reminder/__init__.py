@@ -11,6 +11,9 @@ from .reminder_scheduler import reminder_scheduler, ReminderScheduler, init_remi
 from .auto_reminder_system import auto_reminder_system
 from .auto_reminder_scheduler import auto_reminder_scheduler
 from .advanced_reminder_scheduler import advanced_reminder_scheduler
+from .timer_engine import timer_engine, TimerEngine, TimerSource
+from .outbox_dispatcher import outbox_dispatcher, OutboxDispatcher
+from .leader_lease import scheduler_lease, LeaderLease
 
 # =============================================================================
 # ایمپورت هندلرهای ریمایندر
@@ -132,6 +135,7 @@ from .reminder_utils import (
     validator,
     formatter,
     time_converter,
+    recurrence,
     analyzer
 )
 
@@ -159,6 +163,13 @@ __all__ = [
     'auto_reminder_system',
     'auto_reminder_scheduler', 
     'advanced_reminder_scheduler',
+    'timer_engine',
+    'TimerEngine',
+    'TimerSource',
+    'outbox_dispatcher',
+    'OutboxDispatcher',
+    'scheduler_lease',
+    'LeaderLease',
     
     # هندلرهای اصلی ریمایندر
     'reminder_main_handler',
@@ -253,6 +264,7 @@ __all__ = [
     'validator',
     'formatter',
     'time_converter',
+    'recurrence',
     'analyzer',
     'setup_reminder_system'
 ]
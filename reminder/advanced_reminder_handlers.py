@@ -8,7 +8,7 @@ from aiogram import types, F
 from aiogram.fsm.context import FSMContext
 
 from config import ADMIN_ID
-from reminder.reminder_database import reminder_db
+from utils.async_db import async_reminder_db
 from reminder.advanced_reminder_states import AdvancedReminderStates
 from reminder.advanced_reminder_keyboards import (
     create_advanced_reminder_admin_menu,
@@ -38,13 +38,11 @@ logger = logging.getLogger(__name__)
 
 async def advanced_reminders_admin_handler(message: types.Message):
     """منوی اصلی ریمایندرهای پیشرفته برای ادمین"""
-    from config import ADMIN_ID
-    
     if message.from_user.id != ADMIN_ID:
         await message.answer("❌ دسترسی denied!")
         return
     
-    reminders = reminder_db.get_admin_advanced_reminders()
+    reminders = await async_reminder_db.get_admin_advanced_reminders()
     active_count = len([r for r in reminders if r['is_active']])
     
     # محاسبه آمار پیشرفته
@@ -775,7 +773,7 @@ async def process_advanced_confirmation(message: types.Message, state: FSMContex
 
             # 💾 ذخیره در دیتابیس با مدیریت تراکنش
             try:
-                reminder_id = reminder_db.add_admin_advanced_reminder(
+                reminder_id = await async_reminder_db.add_admin_advanced_reminder(
                     admin_id=message.from_user.id,
                     title=state_data['title'],
                     message=state_data['message'],
@@ -1096,7 +1094,7 @@ async def list_advanced_reminders_admin(message: types.Message):
         await message.answer("❌ دسترسی denied!")
         return
         
-    reminders = reminder_db.get_admin_advanced_reminders()
+    reminders = await async_reminder_db.get_admin_advanced_reminders()
     
     if not reminders:
         await message.answer(
@@ -1166,7 +1164,7 @@ async def edit_advanced_reminder_handler(message: types.Message):
         await message.answer("❌ دسترسی denied!")
         return
         
-    reminders = reminder_db.get_admin_advanced_reminders()
+    reminders = await async_reminder_db.get_admin_advanced_reminders()
     
     if not reminders:
         await message.answer(
@@ -1193,7 +1191,7 @@ async def delete_advanced_reminder_handler(message: types.Message):
         await message.answer("❌ دسترسی denied!")
         return
         
-    reminders = reminder_db.get_admin_advanced_reminders()
+    reminders = await async_reminder_db.get_admin_advanced_reminders()
     
     if not reminders:
         await message.answer(
@@ -1220,7 +1218,7 @@ async def toggle_advanced_reminder_handler(message: types.Message):
         await message.answer("❌ دسترسی denied!")
         return
         
-    reminders = reminder_db.get_admin_advanced_reminders()
+    reminders = await async_reminder_db.get_admin_advanced_reminders()
     
     if not reminders:
         await message.answer(
@@ -1289,7 +1287,7 @@ async def handle_advanced_reminder_callback(callback: types.CallbackQuery):
 
 async def show_advanced_reminder_details(callback: types.CallbackQuery, reminder_id: int):
     """نمایش جزئیات ریمایندر پیشرفته"""
-    reminders = reminder_db.get_admin_advanced_reminders()
+    reminders = await async_reminder_db.get_admin_advanced_reminders()
     reminder = next((r for r in reminders if r['id'] == reminder_id), None)
     
     if not reminder:
@@ -1351,14 +1349,14 @@ async def edit_advanced_reminder(callback: types.CallbackQuery, reminder_id: int
 async def delete_advanced_reminder(callback: types.CallbackQuery, reminder_id: int):
     """حذف ریمایندر پیشرفته"""
     # دریافت اطلاعات ریمایندر قبل از حذف
-    reminders = reminder_db.get_admin_advanced_reminders()
+    reminders = await async_reminder_db.get_admin_advanced_reminders()
     reminder = next((r for r in reminders if r['id'] == reminder_id), None)
     
     if not reminder:
         await callback.answer("❌ ریمایندر پیدا نشد")
         return
     
-    success = reminder_db.delete_admin_advanced_reminder(reminder_id)
+    success = await async_reminder_db.delete_admin_advanced_reminder(reminder_id)
     
     if success:
         await callback.answer("✅ ریمایندر حذف شد")
@@ -1375,11 +1373,11 @@ async def delete_advanced_reminder(callback: types.CallbackQuery, reminder_id: i
 
 async def toggle_advanced_reminder(callback: types.CallbackQuery, reminder_id: int):
     """تغییر وضعیت فعال/غیرفعال ریمایندر پیشرفته"""
-    success = reminder_db.toggle_admin_advanced_reminder(reminder_id)
+    success = await async_reminder_db.toggle_admin_advanced_reminder(reminder_id)
     
     if success:
         # دریافت وضعیت جدید
-        reminders = reminder_db.get_admin_advanced_reminders()
+        reminders = await async_reminder_db.get_admin_advanced_reminders()
         current_reminder = next((r for r in reminders if r['id'] == reminder_id), None)
         
         if current_reminder:
@@ -1393,7 +1391,7 @@ async def toggle_advanced_reminder(callback: types.CallbackQuery, reminder_id: i
 
 async def list_advanced_reminders_action(callback: types.CallbackQuery, action: str):
     """بازگشت به لیست با action مشخص"""
-    reminders = reminder_db.get_admin_advanced_reminders()
+    reminders = await async_reminder_db.get_admin_advanced_reminders()
     
     action_texts = {
         "edit": "ویرایش",
@@ -1413,7 +1411,7 @@ async def list_advanced_reminders_action(callback: types.CallbackQuery, action:
     
 async def show_advanced_reminder_stats(callback: types.CallbackQuery, reminder_id: int):
     """نمایش آمار ریمایندر پیشرفته"""
-    reminders = reminder_db.get_admin_advanced_reminders()
+    reminders = await async_reminder_db.get_admin_advanced_reminders()
     reminder = next((r for r in reminders if r['id'] == reminder_id), None)
     
     if not reminder:
@@ -8,7 +8,9 @@ from aiogram.types import (
     InlineKeyboardButton,
     ReplyKeyboardRemove
 )
+from utils.keyboard_registry import cached_keyboard
 
+@cached_keyboard
 def create_advanced_reminder_admin_menu():
     """منوی مدیریت ریمایندرهای پیشرفته برای ادمین"""
     return ReplyKeyboardMarkup(
@@ -24,6 +26,7 @@ def create_advanced_reminder_admin_menu():
         input_field_placeholder="گزینه مورد نظر را انتخاب کنید..."
     )
 
+@cached_keyboard
 def create_start_time_menu():
     """منوی انتخاب ساعت شروع"""
     return ReplyKeyboardMarkup(
@@ -34,6 +37,7 @@ def create_start_time_menu():
         resize_keyboard=True
     )
 
+@cached_keyboard
 def create_start_date_menu():
     """منوی انتخاب تاریخ شروع"""
     return ReplyKeyboardMarkup(
@@ -44,6 +48,7 @@ def create_start_date_menu():
         resize_keyboard=True
     )
 
+@cached_keyboard
 def create_end_time_menu():
     """منوی انتخاب ساعت پایان"""
     return ReplyKeyboardMarkup(
@@ -54,6 +59,7 @@ def create_end_time_menu():
         resize_keyboard=True
     )
 
+@cached_keyboard
 def create_end_date_menu():
     """منوی انتخاب تاریخ پایان"""
     return ReplyKeyboardMarkup(
@@ -66,9 +72,11 @@ def create_end_date_menu():
 
 def create_days_of_week_menu(selected_days=None):
     """منوی انتخاب روزهای هفته"""
-    if selected_days is None:
-        selected_days = []
-    
+    # ۱۲۸ حالت ممکن - هر ترکیب روزها یک‌بار ساخته می‌شود
+    return _days_of_week_menu(frozenset(selected_days or ()))
+
+@cached_keyboard
+def _days_of_week_menu(selected_days: frozenset):
     days = [
         ("شنبه", 0), ("یکشنبه", 1), ("دوشنبه", 2),
         ("سه‌شنبه", 3), ("چهارشنبه", 4), ("پنجشنبه", 5), ("جمعه", 6)
@@ -95,6 +103,7 @@ def create_days_of_week_menu(selected_days=None):
     
     return ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True)
 
+@cached_keyboard
 def create_repeat_count_menu():
     """منوی انتخاب تعداد تکرار"""
     return ReplyKeyboardMarkup(
@@ -108,6 +117,7 @@ def create_repeat_count_menu():
         resize_keyboard=True
     )
 
+@cached_keyboard
 def create_repeat_interval_menu():
     """منوی انتخاب فاصله زمانی"""
     return ReplyKeyboardMarkup(
@@ -119,6 +129,7 @@ def create_repeat_interval_menu():
         resize_keyboard=True
     )
 
+@cached_keyboard
 def create_confirmation_menu():
     """منوی تأیید نهایی"""
     return ReplyKeyboardMarkup(
@@ -150,6 +161,7 @@ def create_advanced_reminder_list_keyboard(reminders):
     
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
+@cached_keyboard
 def create_advanced_reminder_actions_keyboard(reminder_id):
     """کیبورد اینلاین برای اقدامات روی ریمایندر"""
     keyboard = [
@@ -168,6 +180,7 @@ def create_advanced_reminder_actions_keyboard(reminder_id):
     
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
+@cached_keyboard
 def create_back_only_menu():
     """فقط دکمه بازگشت"""
     return ReplyKeyboardMarkup(
@@ -177,6 +190,7 @@ def create_back_only_menu():
         resize_keyboard=True
     )
 
+@cached_keyboard
 def remove_menu():
     """حذف منو"""
     return ReplyKeyboardRemove()
@@ -1,14 +1,18 @@
 """
 سیستم زمان‌بندی پیشرفته برای ریمایندرهای ادمین
 """
-import asyncio
 import logging
 from datetime import datetime, timedelta
 from typing import List, Dict, Any
 import pytz
 
 from reminder.reminder_database import reminder_db
+from utils.async_db import async_db, run_in_db_thread
+from utils.audience import AudienceSnapshot, load_audience
+from reminder.reminder_utils import recurrence
+from reminder.timer_engine import timer_engine, TimerSource
 from utils.time_utils import get_current_persian_datetime
+from reminder.outbox_dispatcher import outbox_dispatcher
 
 logger = logging.getLogger(__name__)
 TEHRAN_TIMEZONE = pytz.timezone('Asia/Tehran')
@@ -17,71 +21,39 @@ class AdvancedReminderScheduler:
     def __init__(self, bot):
         self.bot = bot
         self.is_running = False
-        self.check_interval = 60  # چک هر ۱ دقیقه برای دقت بیشتر
+        self.check_interval = 60  # فقط برای چک دستی؛ زمان‌بندی توسط timer_engine انجام می‌شود
         
     async def start_scheduler(self):
-        """شروع سیستم زمان‌بندی ریمایندرهای پیشرفته"""
+        """شروع سیستم زمان‌بندی ریمایندرهای پیشرفته - ثبت در موتور یکپارچه"""
         if self.is_running:
             return
             
         self.is_running = True
         logger.info("🚀 سیستم ریمایندرهای پیشرفته شروع به کار کرد")
         
-        while self.is_running:
-            try:
-                await self.check_and_send_advanced_reminders()
-                await asyncio.sleep(self.check_interval)
-            except Exception as e:
-                logger.error(f"خطا در سیستم ریمایندرهای پیشرفته: {e}")
-                await asyncio.sleep(30)
+        timer_engine.register_source(TimerSource(
+            'admin_advanced', self.load_active_advanced_reminders,
+            recurrence.next_advanced_fire, self.send_advanced_reminder_with_repeats,
+            persist=lambda reminder, next_fire_at: reminder_db.set_next_fire_at('admin_advanced', reminder['id'], next_fire_at),
+            changes=reminder_db.changes,
+            load_one=lambda reminder_id: reminder_db.get_active_reminder('admin_advanced', reminder_id)
+        ))
                 
     async def stop_scheduler(self):
         """توقف سیستم زمان‌بندی"""
         self.is_running = False
+        timer_engine.unregister_source('admin_advanced')
         logger.info("🛑 سیستم ریمایندرهای پیشرفته متوقف شد")
-        
-    async def check_and_send_advanced_reminders(self):
-        """چک و ارسال ریمایندرهای پیشرفته"""
-        try:
-            now = datetime.now(TEHRAN_TIMEZONE)
-            current_time = now.strftime("%H:%M")
-            current_date = now.strftime("%Y-%m-%d")
-            current_weekday = now.weekday()  # 0=شنبه, 6=جمعه
-            
-            # دریافت ریمایندرهای پیشرفته فعال
-            advanced_reminders = reminder_db.get_admin_advanced_reminders()
-            active_reminders = [r for r in advanced_reminders if r['is_active']]
-            
-            for reminder in active_reminders:
-                await self.check_advanced_reminder_for_now(reminder, now, current_time, current_date, current_weekday)
-                
-        except Exception as e:
-            logger.error(f"خطا در چک ریمایندرهای پیشرفته: {e}")
-
-    async def check_advanced_reminder_for_now(self, reminder: Dict[str, Any], now: datetime, 
-                                            current_time: str, current_date: str, current_weekday: int):
-        """بررسی آیا این ریمایندر پیشرفته باید الان ارسال شود"""
-        try:
-            # بررسی تاریخ
-            if not (reminder['start_date'] <= current_date <= reminder['end_date']):
-                return
-                
-            # بررسی روز هفته
-            if current_weekday not in reminder['days_of_week']:
-                return
-                
-            # بررسی زمان
-            if not (reminder['start_time'] <= current_time <= reminder['end_time']):
-                return
-            
-            # اگر همه شرایط برقرار بود، ریمایندر رو ارسال کن
-            await self.send_advanced_reminder_with_repeats(reminder, now)
-            
-        except Exception as e:
-            logger.error(f"خطا در بررسی ریمایندر پیشرفته {reminder['id']}: {e}")
 
+    def load_active_advanced_reminders(self) -> List[Dict[str, Any]]:
+        """دریافت ریمایندرهای پیشرفته فعال برای موتور زمان‌بندی"""
+        return reminder_db.get_active_admin_advanced_reminders()
+        
     async def send_advanced_reminder_with_repeats(self, reminder: Dict[str, Any], start_time: datetime):
-        """ارسال ریمایندر پیشرفته با قابلیت تکرار"""
+        """ثبت ریمایندر پیشرفته و همه تکرارهایش در صف پایدار ارسال
+        
+        هر تکرار با زمان ارسال خودش ثبت می‌شود تا بعد از ری‌استارت تکرارهای باقی‌مانده از دست نروند.
+        """
         try:
             repeat_count = reminder['repeat_count']
             repeat_interval = reminder['repeat_interval']
@@ -89,110 +61,47 @@ class AdvancedReminderScheduler:
             if repeat_count == 0:
                 logger.info(f"📝 ریمایندر پیشرفته {reminder['id']} فقط ثبت شده (بدون ارسال)")
                 return
+            
+            # یک snapshot مخاطبان برای همه تکرارهای این نوبت
+            with await self.get_advanced_reminder_audience() as user_ids:
+                if not user_ids:
+                    logger.info(f"⚠️ هیچ کاربر فعالی برای ریمایندر پیشرفته {reminder['id']} پیدا نشد")
+                    return
                 
-            elif repeat_count == 1:
-                # ارسال یکبار
-                await self.send_single_advanced_reminder(reminder, start_time)
-                
-            else:
-                # ارسال با تکرار
+                parts = []
                 for i in range(repeat_count):
                     send_time = start_time + timedelta(seconds=repeat_interval * i)
-                    
-                    if i > 0:
-                        # محاسبه زمان باقی‌مانده تا ارسال بعدی
-                        wait_time = (send_time - datetime.now(TEHRAN_TIMEZONE)).total_seconds()
-                        if wait_time > 0:
-                            await asyncio.sleep(wait_time)
-                    
-                    await self.send_single_advanced_reminder(reminder, send_time, i + 1, repeat_count)
-            
-            logger.info(f"✅ ریمایندر پیشرفته {reminder['id']} با {repeat_count} تکرار ارسال شد")
+                    message = await self.create_advanced_reminder_message(reminder, i + 1, repeat_count, send_time)
+                    parts.append((i, message, send_time))
+                
+                queued = await outbox_dispatcher.enqueue('admin_advanced', reminder['id'], start_time, parts, user_ids)
+            logger.info(f"✅ ریمایندر پیشرفته {reminder['id']} با {repeat_count} تکرار ({queued} پیام) در صف ارسال ثبت شد")
             
         except Exception as e:
             logger.error(f"خطا در ارسال ریمایندر پیشرفته {reminder['id']}: {e}")
 
-    async def send_single_advanced_reminder(self, reminder: Dict[str, Any], send_time: datetime, 
-                                          current_repeat: int = 1, total_repeats: int = 1):
-        """ارسال یک نمونه از ریمایندر پیشرفته"""
+    async def get_advanced_reminder_audience(self) -> AudienceSnapshot:
+        """snapshot شناسه کاربران فعال ربات (فعال در ۳۰ روز اخیر و قابل‌تحویل)"""
         try:
-            # دریافت همه کاربران فعال ربات - با کوئری مستقیم
-            from database import Database
-            db = Database()
-            
-            # استفاده از کوئری مستقیم به جای تابع get_active_users
-            active_users_result = db.execute_query("""
-                SELECT user_id, username, first_name, last_name 
+            return await run_in_db_thread(load_audience, async_db.sync.connections, """
+                SELECT user_id 
                 FROM users 
-                WHERE last_active >= datetime('now', '-30 days')
-            """, fetch_all=True)
-            
-            if not active_users_result:
-                logger.info(f"⚠️ هیچ کاربر فعالی برای ریمایندر پیشرفته {reminder['id']} پیدا نشد")
-                return
-            
-            # تبدیل نتیجه به لیست دیکشنری
-            active_users = []
-            for row in active_users_result:
-                active_users.append({
-                    'user_id': row[0],
-                    'username': row[1],
-                    'first_name': row[2], 
-                    'last_name': row[3]
-                })
-            
-            message = await self.create_advanced_reminder_message(reminder, current_repeat, total_repeats)
-            successful_sends = 0
-            
-            for user in active_users:
-                try:
-                    await self.bot.send_message(
-                        chat_id=user['user_id'],
-                        text=message,
-                        parse_mode="HTML"
-                    )
-                    successful_sends += 1
-                    
-                    # وقفه کوتاه برای جلوگیری از محدودیت تلگرام
-                    await asyncio.sleep(0.1)
-                    
-                except Exception as e:
-                    logger.error(f"❌ خطا در ارسال ریمایندر پیشرفته به کاربر {user['user_id']}: {e}")
-            
-            # ثبت لاگ
-            reminder_db.log_reminder_sent(
-                user_id=0,  # 0 برای ریمایندرهای عمومی ادمین
-                reminder_id=reminder['id'],
-                reminder_type='admin_advanced',
-                status='sent',
-                delivery_time_ms=int((datetime.now(TEHRAN_TIMEZONE) - send_time).total_seconds() * 1000)
-            )
-            
-            # به‌روزرسانی تعداد ارسال‌ها
-            reminder_db.update_advanced_reminder_sent_count(reminder['id'])
-            
-            logger.info(f"✅ ریمایندر پیشرفته {reminder['id']} (تکرار {current_repeat}/{total_repeats}) به {successful_sends} کاربر ارسال شد")
+                WHERE is_active = TRUE
+                AND last_active >= datetime('now', '-30 days')
+            """)
             
         except Exception as e:
-            logger.error(f"خطا در ارسال تکی ریمایندر پیشرفته: {e}")
-
-    def update_advanced_reminder_sent_count(self, reminder_id: int):
-        """به‌روزرسانی تعداد ارسال‌های ریمایندر پیشرفته"""
-        try:
-            query = """
-            UPDATE advanced_reminders 
-            SET total_sent = total_sent + 1, 
-                updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-            """
-            reminder_db.execute_query(query, (reminder_id,))
-        except Exception as e:
-            logger.error(f"خطا در به‌روزرسانی تعداد ارسال‌های ریمایندر {reminder_id}: {e}")
+            logger.error(f"خطا در دریافت کاربران فعال: {e}")
+            return AudienceSnapshot([])
 
     async def create_advanced_reminder_message(self, reminder: Dict[str, Any], 
-                                             current_repeat: int = 1, total_repeats: int = 1) -> str:
+                                             current_repeat: int = 1, total_repeats: int = 1,
+                                             send_time: datetime = None) -> str:
         """ایجاد پیام ریمایندر پیشرفته"""
-        current_time = get_current_persian_datetime()
+        if send_time is not None:
+            sent_at = send_time.astimezone(TEHRAN_TIMEZONE).strftime("%H:%M:%S")
+        else:
+            sent_at = get_current_persian_datetime()['full_time']
         
         repeat_info = ""
         if total_repeats > 1:
@@ -202,7 +111,7 @@ class AdvancedReminderScheduler:
             f"🤖 <b>یادآوری پیشرفته</b>\n\n"
             f"📝 <b>{reminder['title']}</b>\n\n"
             f"{reminder['message']}\n\n"
-            f"⏰ <b>زمان ارسال:</b> {current_time['full_time']}"
+            f"⏰ <b>زمان ارسال:</b> {sent_at}"
             f"{repeat_info}\n\n"
             f"💪 <b>موفق باشید!</b>"
         )
@@ -7,7 +7,8 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
-from reminder.auto_reminder_system import auto_reminder_system
+from config import ADMIN_ID
+from utils.async_db import async_auto_reminder_system
 from reminder.reminder_keyboards import create_auto_reminders_admin_menu, create_back_only_menu
 from exam_data import EXAMS_1405
 
@@ -25,13 +26,11 @@ class AutoReminderAdminStates(StatesGroup):
 
 async def auto_reminders_admin_handler(message: types.Message):
     """منوی مدیریت ریمایندرهای خودکار برای ادمین"""
-    from config import ADMIN_ID
-    
     if message.from_user.id != ADMIN_ID:
         await message.answer("❌ دسترسی denied!")
         return
         
-    auto_reminders = auto_reminder_system.get_all_auto_reminders()
+    auto_reminders = await async_auto_reminder_system.get_all_auto_reminders()
     active_count = len([r for r in auto_reminders if r['is_active']])
     
     await message.answer(
@@ -47,7 +46,7 @@ async def auto_reminders_admin_handler(message: types.Message):
 
 async def list_auto_reminders_admin(message: types.Message):
     """نمایش لیست ریمایندرهای خودکار برای ادمین"""
-    auto_reminders = auto_reminder_system.get_all_auto_reminders()
+    auto_reminders = await async_auto_reminder_system.get_all_auto_reminders()
     
     if not auto_reminders:
         await message.answer(
@@ -79,8 +78,6 @@ async def list_auto_reminders_admin(message: types.Message):
 
 async def start_add_auto_reminder(message: types.Message, state: FSMContext):
     """شروع افزودن ریمایندر خودکار جدید"""
-    from config import ADMIN_ID
-    
     if message.from_user.id != ADMIN_ID:
         await message.answer("❌ دسترسی denied!")
         return
@@ -243,7 +240,7 @@ async def process_admin_confirmation(message: types.Message, state: FSMContext):
         
         try:
             # ذخیره در دیتابیس
-            reminder_id = auto_reminder_system.add_auto_reminder(
+            reminder_id = await async_auto_reminder_system.add_auto_reminder(
                 title=state_data['title'],
                 message=state_data['message'],
                 days_before_exam=state_data['days_before_exam'],
@@ -292,13 +289,11 @@ async def process_admin_confirmation(message: types.Message, state: FSMContext):
 
 async def delete_auto_reminder_handler(message: types.Message):
     """حذف ریمایندر خودکار"""
-    from config import ADMIN_ID
-    
     if message.from_user.id != ADMIN_ID:
         await message.answer("❌ دسترسی denied!")
         return
         
-    auto_reminders = auto_reminder_system.get_all_auto_reminders()
+    auto_reminders = await async_auto_reminder_system.get_all_auto_reminders()
     
     if not auto_reminders:
         await message.answer(
@@ -332,13 +327,11 @@ async def delete_auto_reminder_handler(message: types.Message):
 
 async def toggle_auto_reminder_status(message: types.Message):
     """تغییر وضعیت فعال/غیرفعال ریمایندر خودکار"""
-    from config import ADMIN_ID
-    
     if message.from_user.id != ADMIN_ID:
         await message.answer("❌ دسترسی denied!")
         return
         
-    auto_reminders = auto_reminder_system.get_all_auto_reminders()
+    auto_reminders = await async_auto_reminder_system.get_all_auto_reminders()
     
     if not auto_reminders:
         await message.answer(
@@ -372,8 +365,6 @@ async def toggle_auto_reminder_status(message: types.Message):
 
 async def handle_auto_reminder_admin_callback(callback: types.CallbackQuery):
     """پردازش کلیک‌های مدیریت ریمایندر خودکار برای ادمین"""
-    from config import ADMIN_ID
-    
     if callback.from_user.id != ADMIN_ID:
         await callback.answer("❌ دسترسی denied!")
         return
@@ -388,7 +379,7 @@ async def handle_auto_reminder_admin_callback(callback: types.CallbackQuery):
     if data.startswith("auto_admin_delete:"):
         reminder_id = int(data.split(":")[1])
         
-        success = auto_reminder_system.delete_auto_reminder(reminder_id)
+        success = await async_auto_reminder_system.delete_auto_reminder(reminder_id)
         
         if success:
             await callback.answer("✅ ریمایندر حذف شد")
@@ -408,7 +399,7 @@ async def handle_auto_reminder_admin_callback(callback: types.CallbackQuery):
         reminder_id = int(data.split(":")[1])
         
         # دریافت وضعیت فعلی
-        auto_reminders = auto_reminder_system.get_all_auto_reminders()
+        auto_reminders = await async_auto_reminder_system.get_all_auto_reminders()
         current_reminder = next((r for r in auto_reminders if r['id'] == reminder_id), None)
         
         if not current_reminder:
@@ -416,7 +407,7 @@ async def handle_auto_reminder_admin_callback(callback: types.CallbackQuery):
             return
         
         new_status = not current_reminder['is_active']
-        success = auto_reminder_system.update_auto_reminder(reminder_id, is_active=new_status)
+        success = await async_auto_reminder_system.update_auto_reminder(reminder_id, is_active=new_status)
         
         if success:
             status_text = "فعال" if new_status else "غیرفعال"
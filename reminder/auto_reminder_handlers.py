@@ -6,7 +6,7 @@ from aiogram import types, F
 from aiogram.fsm.context import FSMContext
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
-from reminder.auto_reminder_system import auto_reminder_system
+from utils.async_db import async_auto_reminder_system
 from reminder.reminder_keyboards import create_auto_reminders_user_menu, create_back_only_menu
 from exam_data import EXAMS_1405
 
@@ -14,7 +14,7 @@ logger = logging.getLogger(__name__)
 
 async def user_auto_reminders_list(message: types.Message):
     """لیست ریمایندرهای خودکار برای کاربران عادی"""
-    auto_reminders = auto_reminder_system.get_active_auto_reminders()
+    auto_reminders = await async_auto_reminder_system.get_active_auto_reminders()
     
     if not auto_reminders:
         await message.answer(
@@ -29,7 +29,7 @@ async def user_auto_reminders_list(message: types.Message):
     
     for reminder in auto_reminders:
         # 🔥 تغییر: همیشه وضعیت "فعال" نمایش داده می‌شه مگر کاربر صراحتاً غیرفعال کرده باشه
-        user_reminders = auto_reminder_system.get_user_auto_reminders(message.from_user.id)
+        user_reminders = await async_auto_reminder_system.get_user_auto_reminders(message.from_user.id)
         user_status = not any(ur['auto_reminder_id'] == reminder['id'] and not ur['is_active'] for ur in user_reminders)
         
         status_icon = "✅" if user_status else "❌"
@@ -56,7 +56,7 @@ async def user_auto_reminders_list(message: types.Message):
 
 async def toggle_user_auto_reminder(message: types.Message):
     """تغییر وضعیت ریمایندر خودکار برای کاربر"""
-    auto_reminders = auto_reminder_system.get_active_auto_reminders()
+    auto_reminders = await async_auto_reminder_system.get_active_auto_reminders()
     
     if not auto_reminders:
         await message.answer(
@@ -68,7 +68,7 @@ async def toggle_user_auto_reminder(message: types.Message):
     # ایجاد کیبورد برای انتخاب ریمایندر
     keyboard = []
     for reminder in auto_reminders:
-        user_reminders = auto_reminder_system.get_user_auto_reminders(message.from_user.id)
+        user_reminders = await async_auto_reminder_system.get_user_auto_reminders(message.from_user.id)
         user_status = any(ur['auto_reminder_id'] == reminder['id'] and ur['is_active'] for ur in user_reminders)
         status_text = "🔔 غیرفعال کن" if user_status else "✅ فعال کن"
         
@@ -102,11 +102,11 @@ async def handle_auto_reminder_user_callback(callback: types.CallbackQuery):
     if data.startswith("auto_toggle:"):
         reminder_id = int(data.split(":")[1])
         
-        success = auto_reminder_system.toggle_user_auto_reminder(callback.from_user.id, reminder_id)
+        success = await async_auto_reminder_system.toggle_user_auto_reminder(callback.from_user.id, reminder_id)
         
         if success:
             # دریافت وضعیت جدید
-            user_reminders = auto_reminder_system.get_user_auto_reminders(callback.from_user.id)
+            user_reminders = await async_auto_reminder_system.get_user_auto_reminders(callback.from_user.id)
             user_status = any(ur['auto_reminder_id'] == reminder_id and ur['is_active'] for ur in user_reminders)
             status_text = "فعال" if user_status else "غیرفعال"
             
@@ -121,8 +121,8 @@ async def handle_auto_reminder_user_callback(callback: types.CallbackQuery):
 
 async def create_auto_reminders_user_keyboard(user_id: int):
     """ایجاد کیبورد ریمایندرهای خودکار برای کاربر"""
-    auto_reminders = auto_reminder_system.get_active_auto_reminders()
-    user_reminders = auto_reminder_system.get_user_auto_reminders(user_id)
+    auto_reminders = await async_auto_reminder_system.get_active_auto_reminders()
+    user_reminders = await async_auto_reminder_system.get_user_auto_reminders(user_id)
     user_reminders_map = {ur['auto_reminder_id']: ur['is_active'] for ur in user_reminders}
     
     keyboard = []
@@ -1,15 +1,18 @@
 """
 سیستم زمان‌بندی برای ارسال ریمایندرهای خودکار
 """
-import asyncio
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import List, Dict, Any
 import pytz
 
 from reminder.auto_reminder_system import auto_reminder_system
+from utils.async_db import async_auto_reminder_system
+from reminder.reminder_utils import recurrence, AUTO_REMINDER_SEND_TIME
+from reminder.timer_engine import timer_engine, TimerSource
 from exam_data import EXAMS_1405
 from utils.time_utils import get_current_persian_datetime
+from reminder.outbox_dispatcher import outbox_dispatcher
 
 logger = logging.getLogger(__name__)
 TEHRAN_TIMEZONE = pytz.timezone('Asia/Tehran')
@@ -18,110 +21,67 @@ class AutoReminderScheduler:
     def __init__(self, bot):
         self.bot = bot
         self.is_running = False
-        self.check_interval = 3600  # چک هر ۱ ساعت
+        self.check_interval = 3600  # فقط برای چک دستی؛ زمان‌بندی توسط timer_engine انجام می‌شود
+        self.send_time = AUTO_REMINDER_SEND_TIME  # ساعت ارسال در روز هدف (یک‌بار برای هر کنکور)
         
     async def start_scheduler(self):
-        """شروع سیستم زمان‌بندی ریمایندرهای خودکار"""
+        """شروع سیستم زمان‌بندی ریمایندرهای خودکار - ثبت در موتور یکپارچه"""
         if self.is_running:
             return
             
         self.is_running = True
         logger.info("🚀 سیستم ریمایندرهای خودکار شروع به کار کرد")
         
-        while self.is_running:
-            try:
-                await self.check_and_send_auto_reminders()
-                await asyncio.sleep(self.check_interval)
-            except Exception as e:
-                logger.error(f"خطا در سیستم ریمایندرهای خودکار: {e}")
-                await asyncio.sleep(60)
+        timer_engine.register_source(TimerSource(
+            'auto', auto_reminder_system.get_active_auto_reminders,
+            self.next_fire_time, self.fire_timer_reminder,
+            persist=lambda reminder, next_fire_at: auto_reminder_system.set_next_fire_at(reminder['id'], next_fire_at),
+            changes=auto_reminder_system.changes,
+            load_one=auto_reminder_system.get_active_auto_reminder
+        ))
                 
     async def stop_scheduler(self):
         """توقف سیستم زمان‌بندی"""
         self.is_running = False
+        timer_engine.unregister_source('auto')
         logger.info("🛑 سیستم ریمایندرهای خودکار متوقف شد")
-        
-    async def check_and_send_auto_reminders(self):
-        """چک و ارسال ریمایندرهای خودکار"""
-        try:
-            now = datetime.now(TEHRAN_TIMEZONE)
-            current_date = now.strftime("%Y-%m-%d")
-            
-            logger.info(f"🔍 چک ریمایندرهای خودکار - تاریخ: {current_date}")
-            
-            # دریافت ریمایندرهای خودکار فعال
-            auto_reminders = auto_reminder_system.get_active_auto_reminders()
-            
-            for reminder in auto_reminders:
-                await self.check_reminder_for_today(reminder, now)
-                
-        except Exception as e:
-            logger.error(f"خطا در چک ریمایندرهای خودکار: {e}")
 
-    async def check_reminder_for_today(self, reminder: Dict[str, Any], now: datetime):
-        """بررسی آیا این ریمایندر باید امروز ارسال شود"""
-        try:
-            # محاسبه تاریخ هدف برای هر کنکور
-            for exam_key in reminder['exam_keys']:
-                if exam_key in EXAMS_1405:
-                    exam = EXAMS_1405[exam_key]
-                    target_date = await self.calculate_target_date(exam, reminder['days_before_exam'])
-                    
-                    if target_date and target_date.strftime("%Y-%m-%d") == now.strftime("%Y-%m-%d"):
-                        # امروز روز ارساله
-                        await self.send_auto_reminder_to_users(reminder, exam)
-                        
-        except Exception as e:
-            logger.error(f"خطا در بررسی ریمایندر {reminder['id']}: {e}")
+    def next_fire_time(self, reminder: Dict[str, Any], after: datetime):
+        """زمان اجرای بعدی ریمایندر خودکار"""
+        return recurrence.next_auto_fire(reminder, after, EXAMS_1405, self.send_time)
 
-    async def calculate_target_date(self, exam: Dict[str, Any], days_before: int) -> datetime:
-        """محاسبه تاریخ هدف برای ارسال ریمایندر"""
-        try:
-            dates = exam["date"] if isinstance(exam["date"], list) else [exam["date"]]
-            
-            for date_tuple in dates:
-                if len(date_tuple) == 3:
-                    exam_date = datetime(date_tuple[0], date_tuple[1], date_tuple[2])
-                    exam_date = TEHRAN_TIMEZONE.localize(exam_date)
-                    
-                    # تاریخ هدف = تاریخ کنکور - days_before
-                    target_date = exam_date - timedelta(days=days_before)
-                    return target_date
-                    
-        except Exception as e:
-            logger.error(f"خطا در محاسبه تاریخ هدف: {e}")
-        
-        return None
+    async def fire_timer_reminder(self, reminder: Dict[str, Any], fire_at: datetime):
+        """ثبت ریمایندر خودکار برای کنکورهایی که زمان ارسالشان رسیده در صف ارسال"""
+        await self.send_auto_reminder_to_users(reminder, self.exams_firing_at(reminder, fire_at), fire_at)
 
-    async def send_auto_reminder_to_users(self, reminder: Dict[str, Any], exam: Dict[str, Any]):
-        """ارسال ریمایندر خودکار به کاربران"""
+    def exams_firing_at(self, reminder: Dict[str, Any], fire_at: datetime) -> List[tuple]:
+        """کنکورهای ریمایندر که نوبت ارسالشان fire_at است - (جایگاه کنکور، اطلاعات کنکور)"""
+        fire_times = recurrence.auto_fire_times(reminder, EXAMS_1405, self.send_time)
+        return [
+            (position, EXAMS_1405[exam_key])
+            for position, exam_key in enumerate(reminder['exam_keys'])
+            if fire_times.get(exam_key) == fire_at
+        ]
+        
+    async def send_auto_reminder_to_users(self, reminder: Dict[str, Any], exams: List[tuple], fire_at: datetime):
+        """ثبت ریمایندر خودکار برای کاربران در صف پایدار ارسال (یک بخش برای هر کنکور)"""
         try:
-            # دریافت کاربرانی که این ریمایندر برایشان فعال است
-            user_ids = auto_reminder_system.get_users_for_auto_reminder(reminder['id'])
-            
-            if not user_ids:
-                logger.info(f"⚠️ هیچ کاربر فعالی برای ریمایندر {reminder['id']} پیدا نشد")
+            if not exams:
                 return
             
-            message = await self.create_auto_reminder_message(reminder, exam)
-            successful_sends = 0
-            
-            for user_id in user_ids:
-                try:
-                    await self.bot.send_message(
-                        chat_id=user_id,
-                        text=message,
-                        parse_mode="HTML"
-                    )
-                    successful_sends += 1
-                    
-                    # وقفه کوتاه برای جلوگیری از محدودیت تلگرام
-                    await asyncio.sleep(0.1)
-                    
-                except Exception as e:
-                    logger.error(f"❌ خطا در ارسال ریمایندر به کاربر {user_id}: {e}")
-            
-            logger.info(f"✅ ریمایندر خودکار {reminder['id']} به {successful_sends} کاربر ارسال شد")
+            # دریافت کاربرانی که این ریمایندر برایشان فعال است (یک snapshot برای همه کنکورها)
+            with await async_auto_reminder_system.get_users_for_auto_reminder(reminder['id']) as user_ids:
+                if not user_ids:
+                    logger.info(f"⚠️ هیچ کاربر فعالی برای ریمایندر {reminder['id']} پیدا نشد")
+                    return
+                
+                parts = []
+                for position, exam in exams:
+                    message = await self.create_auto_reminder_message(reminder, exam)
+                    parts.append((position, message, None))
+                
+                queued = await outbox_dispatcher.enqueue('auto', reminder['id'], fire_at, parts, user_ids)
+            logger.info(f"✅ ریمایندر خودکار {reminder['id']} ({queued} پیام) در صف ارسال ثبت شد")
             
         except Exception as e:
             logger.error(f"خطا در ارسال ریمایندر خودکار: {e}")
@@ -5,11 +5,15 @@ import logging
 import sqlite3
 import json
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import pytz
 
 from exam_data import EXAMS_1405
 from utils.time_utils import get_current_persian_datetime, format_time_remaining
+from reminder.change_log import ChangeLog
+from reminder.reminder_utils import recurrence
+from utils.db_connection import get_connection_manager
+from utils.audience import AudienceSnapshot, load_audience
 
 logger = logging.getLogger(__name__)
 TEHRAN_TIMEZONE = pytz.timezone('Asia/Tehran')
@@ -17,18 +21,35 @@ TEHRAN_TIMEZONE = pytz.timezone('Asia/Tehran')
 class AutoReminderSystem:
     def __init__(self, db_path="konkour_bot.db"):
         self.db_path = db_path
+        self.connections = get_connection_manager(db_path)
+        self._change_listeners = []
+        self.changes = ChangeLog(self.connections)
         self.init_database()
 
+    def add_change_listener(self, listener):
+        """ثبت تابعی که بعد از هر تغییر در ریمایندرهای خودکار فراخوانی می‌شود"""
+        if listener not in self._change_listeners:
+            self._change_listeners.append(listener)
+
+    def _notify_change(self, reminder_id: int = None, deleted: bool = False):
+        """محاسبه مجدد next_fire_at و اطلاع‌رسانی تغییر ریمایندر خودکار به شنونده‌ها"""
+        if not deleted and reminder_id is not None:
+            self.refresh_next_fire_at(reminder_id)
+        # برای رهبری که در instance دیگری اجرا می‌شود
+        self.changes.record('auto', reminder_id)
+        
+        for listener in self._change_listeners:
+            try:
+                listener('auto', reminder_id)
+            except Exception as e:
+                logger.error(f"❌ خطا در اطلاع‌رسانی تغییر ریمایندر خودکار: {e}")
+
     def init_database(self):
         """ایجاد جداول ریمایندرهای خودکار"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connections.write() as conn:
             cursor = conn.cursor()
             
-            # ابتدا جدول رو حذف کن (اگر وجود داره)
-            cursor.execute('DROP TABLE IF EXISTS auto_reminders')
-            cursor.execute('DROP TABLE IF EXISTS user_auto_reminders')
-            
-            # حالا جدول رو با ساختار جدید ایجاد کن
+            # جدول‌ها حذف نمی‌شوند: instance دیگری ممکن است هم‌زمان در حال اجرا باشد
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS auto_reminders (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -39,6 +60,7 @@ class AutoReminderSystem:
                     is_active BOOLEAN DEFAULT TRUE,
                     is_global BOOLEAN DEFAULT TRUE,
                     created_by_admin INTEGER NOT NULL,
+                    next_fire_at TIMESTAMP,    -- زمان اجرای بعدی به UTC
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             ''')
@@ -55,8 +77,34 @@ class AutoReminderSystem:
                 )
             ''')
             
+            # مهاجرت جدول‌های ساخته‌شده با ساختار قدیمی
+            self._ensure_column(cursor, 'auto_reminders', 'exam_keys', "TEXT NOT NULL DEFAULT '[]'")
+            self._ensure_column(cursor, 'auto_reminders', 'is_active', 'BOOLEAN DEFAULT TRUE')
+            self._ensure_column(cursor, 'auto_reminders', 'is_global', 'BOOLEAN DEFAULT TRUE')
+            self._ensure_column(cursor, 'auto_reminders', 'created_by_admin', 'INTEGER NOT NULL DEFAULT 1')
+            self._ensure_column(cursor, 'auto_reminders', 'next_fire_at', 'TIMESTAMP')
+            self._ensure_column(cursor, 'auto_reminders', 'created_at', 'TIMESTAMP')
+            self._ensure_column(cursor, 'user_auto_reminders', 'is_active', 'BOOLEAN DEFAULT TRUE')
+            
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_auto_reminders_next_fire 
+                ON auto_reminders(next_fire_at)
+            ''')
+
+            # تغییرات ریمایندرها - رهبر با poll این جدول تغییرات instanceهای دیگر را می‌بیند
+            ChangeLog.create_table(cursor)
+            
             # ایجاد ریمایندرهای پیش‌فرض
             self.create_default_reminders()
+        
+        self.refresh_all_next_fire_at()
+
+    def _ensure_column(self, cursor, table: str, column: str, definition: str):
+        """افزودن ستون به جدول موجود در صورت نبود (مهاجرت ساده)"""
+        cursor.execute(f"PRAGMA table_info({table})")
+        if column not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            logger.info(f"🛠️ ستون {column} به جدول {table} اضافه شد")
 
     def create_default_reminders(self):
         """ایجاد ریمایندرهای خودکار پیش‌فرض"""
@@ -99,7 +147,7 @@ class AutoReminderSystem:
             }
         ]
         
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connections.write() as conn:
             cursor = conn.cursor()
             
             for reminder in default_reminders:
@@ -126,44 +174,59 @@ class AutoReminderSystem:
     def add_auto_reminder(self, title: str, message: str, days_before_exam: int, 
                          exam_keys: List[str], admin_id: int, is_global: bool = True) -> int:
         """افزودن ریمایندر خودکار جدید"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connections.write() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT INTO auto_reminders (title, message, days_before_exam, exam_keys, created_by_admin, is_global)
                 VALUES (?, ?, ?, ?, ?, ?)
             ''', (title, message, days_before_exam, json.dumps(exam_keys), admin_id, is_global))
-            return cursor.lastrowid
+            reminder_id = cursor.lastrowid
+
+        self._notify_change(reminder_id)
+        return reminder_id
 
     def get_all_auto_reminders(self) -> List[Dict[str, Any]]:
         """دریافت همه ریمایندرهای خودکار"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self.connections.read() as conn:
             cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
             cursor.execute('SELECT * FROM auto_reminders ORDER BY days_before_exam DESC')
             
-            reminders = []
-            for row in cursor.fetchall():
-                reminders.append({
-                    'id': row['id'],
-                    'title': row['title'],
-                    'message': row['message'],
-                    'days_before_exam': row['days_before_exam'],
-                    'exam_keys': json.loads(row['exam_keys']),
-                    'is_active': bool(row['is_active']),
-                    'is_global': bool(row['is_global']),
-                    'created_by_admin': row['created_by_admin'],
-                    'created_at': row['created_at']
-                })
-            return reminders
+            return [self._row_to_reminder(row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def _row_to_reminder(row: sqlite3.Row) -> Dict[str, Any]:
+        """تبدیل سطر auto_reminders به دیکشنری"""
+        return {
+            'id': row['id'],
+            'title': row['title'],
+            'message': row['message'],
+            'days_before_exam': row['days_before_exam'],
+            'exam_keys': json.loads(row['exam_keys']),
+            'is_active': bool(row['is_active']),
+            'is_global': bool(row['is_global']),
+            'created_by_admin': row['created_by_admin'],
+            'next_fire_at': row['next_fire_at'],
+            'created_at': row['created_at']
+        }
 
     def get_active_auto_reminders(self) -> List[Dict[str, Any]]:
         """دریافت ریمایندرهای خودکار فعال"""
         reminders = self.get_all_auto_reminders()
         return [r for r in reminders if r['is_active']]
 
+    def get_active_auto_reminder(self, reminder_id: int) -> Optional[Dict[str, Any]]:
+        """دریافت یک ریمایندر خودکار فعال (None اگر حذف یا غیرفعال شده) - بارگذاری تکی موتور زمان‌بندی"""
+        with self.connections.read() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
+            cursor.execute('SELECT * FROM auto_reminders WHERE id = ? AND is_active = TRUE', (reminder_id,))
+            row = cursor.fetchone()
+            return self._row_to_reminder(row) if row else None
+
     def update_auto_reminder(self, reminder_id: int, **kwargs) -> bool:
         """ویرایش ریمایندر خودکار"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connections.write() as conn:
             cursor = conn.cursor()
             
             update_fields = []
@@ -186,21 +249,66 @@ class AutoReminderSystem:
                 SET {', '.join(update_fields)} 
                 WHERE id = ?
             ''', params)
-            
-            return cursor.rowcount > 0
+
+            success = cursor.rowcount > 0
+
+        if success:
+            self._notify_change(reminder_id)
+        return success
 
     def delete_auto_reminder(self, reminder_id: int) -> bool:
         """حذف ریمایندر خودکار"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connections.write() as conn:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM auto_reminders WHERE id = ?', (reminder_id,))
-            return cursor.rowcount > 0
+            success = cursor.rowcount > 0
+
+        if success:
+            self._notify_change(reminder_id, deleted=True)
+        return success
+
+    def compute_next_fire_at(self, reminder: Dict[str, Any], after: datetime = None) -> str:
+        """محاسبه next_fire_at (رشته UTC) برای ریمایندر خودکار"""
+        if not reminder.get('is_active', True):
+            return None
+        after = after or datetime.now(TEHRAN_TIMEZONE)
+        return recurrence.to_utc_string(recurrence.next_auto_fire(reminder, after, EXAMS_1405))
+
+    def set_next_fire_at(self, reminder_id: int, next_fire_at: datetime = None):
+        """ذخیره زمان اجرای بعدی محاسبه‌شده توسط موتور زمان‌بندی"""
+        try:
+            with self.connections.write() as conn:
+                conn.execute(
+                    'UPDATE auto_reminders SET next_fire_at = ? WHERE id = ?',
+                    (recurrence.to_utc_string(next_fire_at), reminder_id)
+                )
+        except Exception as e:
+            logger.error(f"❌ خطا در ذخیره next_fire_at ریمایندر خودکار {reminder_id}: {e}")
+
+    def refresh_next_fire_at(self, reminder_id: int):
+        """محاسبه مجدد next_fire_at یک ریمایندر خودکار"""
+        reminder = next((r for r in self.get_all_auto_reminders() if r['id'] == reminder_id), None)
+        if reminder:
+            self.set_next_fire_at(reminder_id, recurrence.from_utc_string(self.compute_next_fire_at(reminder)))
+
+    def refresh_all_next_fire_at(self):
+        """محاسبه next_fire_at برای همه ریمایندرهای خودکار"""
+        try:
+            now = datetime.now(TEHRAN_TIMEZONE)
+            params = [
+                (self.compute_next_fire_at(reminder, now), reminder['id'])
+                for reminder in self.get_all_auto_reminders()
+            ]
+            with self.connections.write() as conn:
+                conn.executemany('UPDATE auto_reminders SET next_fire_at = ? WHERE id = ?', params)
+        except Exception as e:
+            logger.error(f"❌ خطا در محاسبه next_fire_at ریمایندرهای خودکار: {e}")
 
     def get_user_auto_reminders(self, user_id: int) -> List[Dict[str, Any]]:
         """دریافت ریمایندرهای خودکار کاربر"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self.connections.read() as conn:
             cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
             cursor.execute('''
                 SELECT uar.*, ar.title, ar.message, ar.days_before_exam, ar.exam_keys
                 FROM user_auto_reminders uar
@@ -212,7 +320,7 @@ class AutoReminderSystem:
 
     def toggle_user_auto_reminder(self, user_id: int, reminder_id: int) -> bool:
         """تغییر وضعیت ریمایندر خودکار برای کاربر"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connections.write() as conn:
             cursor = conn.cursor()
             
             # بررسی وجود رکورد
@@ -239,16 +347,25 @@ class AutoReminderSystem:
             conn.commit()
             return True
 
-    def get_users_for_auto_reminder(self, reminder_id: int) -> List[int]:
-        """دریافت لیست کاربرانی که این ریمایندر برایشان فعال است"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT user_id FROM user_auto_reminders 
-                WHERE auto_reminder_id = ? AND is_active = TRUE
-            ''', (reminder_id,))
-            
-            return [row[0] for row in cursor.fetchall()]
+    def _has_users_table(self) -> bool:
+        """جدول users (دیتابیس اصلی) در همین فایل است؟ - پیش‌فرض هر دو konkour_bot.db هستند"""
+        with self.connections.read() as conn:
+            cursor = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users'")
+            return cursor.fetchone() is not None
+
+    def get_users_for_auto_reminder(self, reminder_id: int) -> AudienceSnapshot:
+        """snapshot کاربرانی که این ریمایندر برایشان فعال است (بدون کاربران غیرقابل‌تحویل)"""
+        query = '''
+            SELECT user_id FROM user_auto_reminders uar
+            WHERE auto_reminder_id = ? AND is_active = TRUE
+        '''
+        if self._has_users_table():
+            query += '''
+            AND NOT EXISTS (
+                SELECT 1 FROM users u WHERE u.user_id = uar.user_id AND u.is_active = FALSE
+            )
+            '''
+        return load_audience(self.connections, query, (reminder_id,))
 
 # ایجاد instance اصلی
 auto_reminder_system = AutoReminderSystem()
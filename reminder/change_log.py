@@ -0,0 +1,83 @@
+"""
+ثبت تغییرات ریمایندرها برای همگام‌سازی بین instanceها - هر ایجاد/ویرایش/حذف یک ردیف
+(نوع + شناسه) در reminder_change_log می‌نویسد و موتور زمان‌بندی رهبر فقط ردیف‌های جدیدتر
+از آخرین poll را می‌خواند و همان ریمایندرها را دوباره بارگذاری می‌کند.
+"""
+import logging
+import time
+from typing import Any, Optional, Set, Tuple
+
+from utils.db_connection import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+# ردیف‌های قدیمی‌تر از این (ثانیه) پاک می‌شوند؛ رهبری که این مدت poll نکرده کل نوع را بارگذاری می‌کند
+CHANGE_LOG_RETENTION = 3600
+
+# هر چند ثبت یک‌بار پاک‌سازی انجام می‌شود
+CLEANUP_EVERY = 500
+
+
+class ChangeLog:
+    """جدول تغییرات مشترک ریمایندرها روی یک دیتابیس"""
+
+    def __init__(self, connections: ConnectionManager, retention: int = CHANGE_LOG_RETENTION):
+        self.connections = connections
+        self.retention = retention
+
+    @staticmethod
+    def create_table(cursor):
+        """ایجاد جدول (داخل init_database صاحب دیتابیس)"""
+        # جدول نسخه‌ای قبلی فقط شمارنده هر نوع را داشت
+        cursor.execute('DROP TABLE IF EXISTS reminder_changes')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS reminder_change_log (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                reminder_id INTEGER,            -- NULL = همه ریمایندرهای این نوع
+                changed_at REAL NOT NULL        -- epoch
+            )
+        ''')
+
+    def record(self, kind: str, reminder_id: Any = None):
+        """ثبت تغییر یک ریمایندر (بعد از هر ایجاد/ویرایش/حذف)"""
+        now = time.time()
+        try:
+            with self.connections.write() as conn:
+                cursor = conn.execute(
+                    'INSERT INTO reminder_change_log (kind, reminder_id, changed_at) VALUES (?, ?, ?)',
+                    (kind, reminder_id, now)
+                )
+                if cursor.lastrowid % CLEANUP_EVERY == 0:
+                    conn.execute('DELETE FROM reminder_change_log WHERE changed_at < ?', (now - self.retention,))
+                conn.commit()
+        except Exception as e:
+            logger.error(f"❌ خطا در ثبت تغییر ریمایندر {kind}:{reminder_id}: {e}")
+
+    def latest(self) -> int:
+        """شماره آخرین تغییر ثبت‌شده (0 اگر هنوز تغییری نیست)"""
+        with self.connections.read() as conn:
+            return conn.execute('SELECT COALESCE(MAX(seq), 0) FROM reminder_change_log').fetchone()[0]
+
+    def since(self, kind: str, after: int) -> Tuple[int, Optional[Set[Any]]]:
+        """
+        شناسه ریمایندرهای یک نوع که بعد از شماره after تغییر کرده‌اند و شماره آخرین تغییر.
+        None به جای مجموعه یعنی کل نوع باید بارگذاری شود (تغییر بدون شناسه یا ردیف‌های پاک‌شده).
+        """
+        with self.connections.read() as conn:
+            latest, oldest = conn.execute(
+                'SELECT COALESCE(MAX(seq), 0), MIN(seq) FROM reminder_change_log'
+            ).fetchone()
+            if latest <= after:
+                return after, set()
+            if oldest is not None and oldest > after + 1:
+                # ممکن است تغییراتی بین after و oldest پاک شده باشد
+                return latest, None
+            rows = conn.execute(
+                'SELECT reminder_id FROM reminder_change_log WHERE seq > ? AND seq <= ? AND kind = ?',
+                (after, latest, kind)
+            ).fetchall()
+        reminder_ids = {row[0] for row in rows}
+        if None in reminder_ids:
+            return latest, None
+        return latest, reminder_ids
@@ -0,0 +1,91 @@
+"""
+حالت خلاصه (digest) - پیام‌هایی از صف ارسال که در یک نوبت برای یک کاربر آماده شده‌اند
+(مثلا ریمایندر کنکور با چند کنکور + ریمایندر شخصی ساعت ۸) به جای چند درخواست جدا
+در یک پیام فرستاده می‌شوند؛ اگر از سقف طول پیام تلگرام بیشتر شوند چند تکه می‌شوند.
+
+شبیه‌سازی تعداد درخواست‌ها قبل/بعد:
+    python -m reminder.digest
+"""
+from typing import Any, Dict, List, Optional
+
+# سقف طول متن پیام تلگرام (کاراکتر)
+MAX_MESSAGE_LENGTH = 4096
+
+# جداکننده بخش‌های یک پیام خلاصه
+DIGEST_SEPARATOR = "\n\n〰️〰️〰️〰️〰️\n\n"
+
+
+class Digest:
+    """یک پیام خروجی و ردیف‌های outbox که با آن فرستاده می‌شوند"""
+
+    __slots__ = ('user_id', 'text', 'parse_mode', 'rows')
+
+    def __init__(self, user_id: int, text: str, parse_mode: Optional[str], rows: List[Dict[str, Any]]):
+        self.user_id = user_id
+        self.text = text
+        self.parse_mode = parse_mode
+        self.rows = rows
+
+
+def split_texts(texts: List[str], limit: int = MAX_MESSAGE_LENGTH,
+                separator: str = DIGEST_SEPARATOR) -> List[List[int]]:
+    """
+    چیدن متن‌ها به ترتیب در کمترین تکه‌های پشت سر هم که هر کدام از limit کوتاه‌ترند.
+    خروجی: اندیس متن‌های هر تکه. متنی که به تنهایی از limit بلندتر است تکه جدا می‌شود
+    (شکستن وسط متن HTML تگ‌ها را خراب می‌کند).
+    """
+    chunks: List[List[int]] = []
+    current: List[int] = []
+    length = 0
+    for index, text in enumerate(texts):
+        added = len(text) if not current else len(separator) + len(text)
+        if current and length + added > limit:
+            chunks.append(current)
+            current, length = [], 0
+            added = len(text)
+        current.append(index)
+        length += added
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def build_digests(rows: List[Dict[str, Any]], limit: int = MAX_MESSAGE_LENGTH) -> List[Digest]:
+    """
+    گروه‌بندی ردیف‌های برداشته‌شده از outbox بر اساس کاربر (و parse_mode) و ساخت پیام‌های خلاصه.
+    ترتیب بخش‌ها همان ترتیب صف است؛ ردیف‌های تکی بدون تغییر می‌مانند.
+    """
+    groups: Dict[tuple, List[Dict[str, Any]]] = {}
+    for row in rows:
+        groups.setdefault((row['user_id'], row['parse_mode']), []).append(row)
+
+    digests: List[Digest] = []
+    for (user_id, parse_mode), group in groups.items():
+        if len(group) == 1:
+            digests.append(Digest(user_id, group[0]['text'], parse_mode, group))
+            continue
+        texts = [row['text'] for row in group]
+        for chunk in split_texts(texts, limit):
+            digests.append(Digest(
+                user_id,
+                DIGEST_SEPARATOR.join(texts[i] for i in chunk),
+                parse_mode,
+                [group[i] for i in chunk]
+            ))
+    return digests
+
+
+if __name__ == "__main__":
+    # ۱۰۰۰ کاربر، هر کدام ریمایندر کنکور با ۵ کنکور + یک ریمایندر شخصی در همان دقیقه
+    exam_text = "⏰ <b>یادآوری کنکور</b>\n\n📘 <b>کنکور</b>\n" + "⏳ " * 150
+    personal_text = "⏰ <b>یادآوری شخصی</b>\n\n📝 مرور فصل ۳"
+    sample_rows = []
+    for user_id in range(1000):
+        for part in range(5):
+            sample_rows.append({'user_id': user_id, 'parse_mode': 'HTML', 'text': exam_text})
+        sample_rows.append({'user_id': user_id, 'parse_mode': 'HTML', 'text': personal_text})
+
+    digests = build_digests(sample_rows)
+    longest = max(len(digest.text) for digest in digests)
+    print(f"قبل: {len(sample_rows)} درخواست sendMessage - بعد: {len(digests)} درخواست "
+          f"(x{round(len(sample_rows) / len(digests), 1)} کمتر، بلندترین پیام {longest} کاراکتر)")
@@ -0,0 +1,128 @@
+"""
+انتخاب رهبر بین چند instance ربات - lease با heartbeat در دیتابیس مشترک
+(همه instanceها آپدیت‌ها را پاسخ می‌دهند ولی فقط رهبر زمان‌بندها و صف ارسال را اجرا می‌کند)
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config import LEADER_HEARTBEAT_INTERVAL, LEADER_LEASE_TTL
+from utils.async_db import async_reminder_db
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderLease:
+    """
+    هر heartbeat_interval ثانیه lease تمدید (یا در صورت انقضا گرفته) می‌شود.
+    با رهبر شدن سرویس‌های ثبت‌شده شروع می‌شوند و با از دست رفتن lease
+    (یا خطای دیتابیس در تمدید) قبل از انقضای ttl متوقف می‌شوند.
+    """
+
+    def __init__(self, name: str = 'schedulers', ttl: int = LEADER_LEASE_TTL,
+                 heartbeat_interval: int = LEADER_HEARTBEAT_INTERVAL):
+        self.name = name
+        self.ttl = ttl
+        self.heartbeat_interval = heartbeat_interval
+        self.holder_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.is_leader = False
+        self.is_running = False
+        # (نام، شروع - coroutine طولانی، توقف)
+        self._services: List[Tuple[str, Callable[[], Awaitable[Any]], Callable[[], Awaitable[Any]]]] = []
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._stop_event: Optional[asyncio.Event] = None
+        self.stats = {
+            'elections': 0,
+            'step_downs': 0,
+            'renew_failures': 0,
+            'last_heartbeat': None
+        }
+
+    def add_service(self, name: str, start: Callable[[], Awaitable[Any]],
+                    stop: Callable[[], Awaitable[Any]]):
+        """ثبت سرویسی که فقط روی رهبر اجرا می‌شود (start تا زمان stop ادامه دارد)"""
+        self._services.append((name, start, stop))
+
+    # --- تغییر نقش ---
+
+    async def _become_leader(self):
+        self.is_leader = True
+        self.stats['elections'] += 1
+        logger.info(f"👑 این instance ({self.holder_id}) رهبر زمان‌بندها شد")
+        for name, start, _ in self._services:
+            self._tasks[name] = asyncio.create_task(start())
+
+    async def _step_down(self):
+        self.is_leader = False
+        self.stats['step_downs'] += 1
+        for name, _, stop in reversed(self._services):
+            try:
+                await stop()
+            except Exception as e:
+                logger.error(f"❌ خطا در توقف سرویس {name}: {e}")
+        # منتظر پایان حلقه‌ها تا شروع دوباره دو حلقه هم‌زمان نسازد
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+        logger.info(f"🔻 instance {self.holder_id} دیگر رهبر زمان‌بندها نیست")
+
+    # --- حلقه heartbeat ---
+
+    async def run(self):
+        """حلقه گرفتن/تمدید lease تا زمان stop"""
+        if self.is_running:
+            return
+
+        self.is_running = True
+        self._stop_event = asyncio.Event()
+        logger.info(f"🗳️ انتخاب رهبر شروع شد (instance {self.holder_id}، ttl={self.ttl}s)")
+
+        while self.is_running:
+            try:
+                acquired = await async_reminder_db.acquire_lease(self.name, self.holder_id, self.ttl)
+                self.stats['last_heartbeat'] = time.time()
+
+                if acquired and not self.is_leader:
+                    await self._become_leader()
+                elif not acquired and self.is_leader:
+                    self.stats['renew_failures'] += 1
+                    logger.warning(f"⚠️ تمدید lease {self.name} ناموفق بود - کناره‌گیری از رهبری")
+                    await self._step_down()
+
+            except Exception as e:
+                logger.error(f"❌ خطا در heartbeat رهبری: {e}")
+                if self.is_leader:
+                    await self._step_down()
+
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=self.heartbeat_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self):
+        """توقف سرویس‌ها و آزاد کردن lease برای رهبر شدن فوری instance دیگر"""
+        self.is_running = False
+        if self._stop_event is not None:
+            self._stop_event.set()
+        if self.is_leader:
+            await self._step_down()
+            await async_reminder_db.release_lease(self.name, self.holder_id)
+        logger.info("🛑 انتخاب رهبر متوقف شد")
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """آمار رهبری"""
+        stats = dict(self.stats)
+        stats.update({
+            'holder_id': self.holder_id,
+            'is_leader': self.is_leader,
+            'services': [name for name, _, _ in self._services],
+            'lease': await async_reminder_db.get_lease(self.name)
+        })
+        return stats
+
+
+# ایجاد instance اصلی
+scheduler_lease = LeaderLease()
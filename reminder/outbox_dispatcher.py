@@ -0,0 +1,220 @@
+"""
+مصرف‌کننده صف پایدار ارسال (outbox) - ارسال دسته‌ای پیام‌های ریمایندر و ادامه بعد از ری‌استارت
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+import pytz
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+from config import DIGEST_MODE, DIGEST_WINDOW_SECONDS
+from reminder.digest import Digest, build_digests
+from utils.async_db import async_reminder_db
+from reminder.reminder_utils import recurrence
+from utils.broadcast_engine import broadcast_engine
+from utils.dead_chats import UndeliverableChatError, dead_chats
+from utils.metrics import SEND_SECONDS, SEND_TOTAL
+
+logger = logging.getLogger(__name__)
+
+# تنظیم تایم‌زون تهران
+TEHRAN_TIMEZONE = pytz.timezone('Asia/Tehran')
+
+# خطاهایی که تلاش دوباره برایشان فایده‌ای ندارد (ربات بلاک شده، چت نامعتبر و ...)
+PERMANENT_ERRORS = (TelegramForbiddenError, TelegramBadRequest, UndeliverableChatError)
+
+
+class OutboxDispatcher:
+    """
+    schedulerها فقط ردیف‌های outbox را می‌سازند و این کلاس آن‌ها را دسته‌دسته
+    از دیتابیس برمی‌دارد و از طریق broadcast_engine ارسال می‌کند.
+    ردیف‌هایی که هنگام توقف در وضعیت sending مانده‌اند در شروع بعدی دوباره در صف قرار می‌گیرند.
+    در حالت خلاصه، ردیف‌های یک دسته که برای یک کاربر هستند با یک پیام فرستاده می‌شوند.
+    """
+
+    def __init__(self, batch_size: int = 200, idle_interval: float = 30,
+                 max_attempts: int = 5, retry_base_delay: int = 30, complete_every: int = 25,
+                 digest_mode: bool = DIGEST_MODE, digest_window: float = DIGEST_WINDOW_SECONDS):
+        self.batch_size = batch_size
+        self.complete_every = complete_every      # ثبت نتیجه هر چند ارسال (پنجره ارسال دوباره بعد از کرش)
+        self.idle_interval = idle_interval        # حداکثر خواب وقتی صف خالی است
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay  # backoff نمایی: 30s, 60s, 120s, ...
+        self.digest_mode = digest_mode
+        self.digest_window = digest_window        # انتظار بعد از ثبت ردیف جدید تا بقیه ریمایندرهای همان لحظه برسند
+        self.bot = None
+        self.is_running = False
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = {
+            'total_sent': 0,
+            'total_failed': 0,
+            'total_retried': 0,
+            'total_batches': 0,
+            'api_calls': 0,
+            'coalesced': 0,        # ردیف‌هایی که در پیام خلاصه ادغام شدند و درخواست جدا نداشتند
+            'last_batch': None,
+            'errors': 0
+        }
+
+    def wake(self):
+        """بیدار کردن مصرف‌کننده بعد از ثبت ردیف‌های جدید"""
+        if self._loop is not None and self._wakeup is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._wakeup.set)
+            except RuntimeError:
+                # حلقه بسته شده است
+                pass
+
+    async def enqueue(self, reminder_type: str, reminder_id: int, fire_at: datetime,
+                      parts: List[tuple], user_ids: Sequence[int], parse_mode: Optional[str] = "HTML") -> int:
+        """ثبت یک نوبت ریمایندر در outbox و بیدار کردن مصرف‌کننده"""
+        inserted = await async_reminder_db.enqueue_outbox(reminder_type, reminder_id, fire_at, parts, user_ids, parse_mode)
+        if inserted:
+            self.wake()
+        return inserted
+
+    async def start(self, bot):
+        """شروع مصرف صف (فراخوانی‌های بعدی بی‌اثر هستند)"""
+        if self.is_running:
+            return
+
+        self.bot = bot
+        self.is_running = True
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+
+        await async_reminder_db.reset_stale_outbox()
+        await dead_chats.load()
+        await async_reminder_db.cleanup_outbox()
+        logger.info("🚀 مصرف‌کننده صف ارسال ریمایندرها شروع به کار کرد")
+
+        while self.is_running:
+            try:
+                if await self.process_batch():
+                    continue
+
+                delay = self.idle_interval
+                next_attempt = await async_reminder_db.get_next_outbox_attempt()
+                if next_attempt is not None:
+                    seconds = (next_attempt - datetime.now(TEHRAN_TIMEZONE)).total_seconds()
+                    delay = min(delay, max(seconds, 0.2))
+
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                    woken = True
+                except asyncio.TimeoutError:
+                    woken = False
+                self._wakeup.clear()
+
+                if woken and self.digest_mode and self.digest_window > 0 and self.is_running:
+                    # ریمایندرهای دیگر همین لحظه (مثلا کنکور و شخصی ساعت ۸) هم ثبت شوند تا با هم خلاصه شوند
+                    await asyncio.sleep(self.digest_window)
+
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error(f"❌ خطا در مصرف‌کننده صف ارسال: {e}")
+                await asyncio.sleep(1)
+
+    async def stop(self):
+        """توقف مصرف صف"""
+        self.is_running = False
+        if self._wakeup is not None:
+            self._wakeup.set()
+        logger.info("🛑 مصرف‌کننده صف ارسال متوقف شد")
+
+    def _retry_at(self, attempts: int) -> Optional[str]:
+        """زمان تلاش بعدی (UTC) یا None اگر تلاش‌ها تمام شده باشد"""
+        if attempts + 1 >= self.max_attempts:
+            return None
+        delay = self.retry_base_delay * (2 ** attempts)
+        return recurrence.to_utc_string(datetime.now(TEHRAN_TIMEZONE) + timedelta(seconds=delay))
+
+    async def process_batch(self) -> int:
+        """ارسال یک دسته از پیام‌های آماده؛ تعداد ردیف‌های پردازش‌شده برگردانده می‌شود"""
+        rows = await async_reminder_db.claim_outbox_batch(self.batch_size)
+        if not rows:
+            return 0
+
+        started = time.monotonic()
+        if self.digest_mode:
+            digests = build_digests(rows)
+        else:
+            digests = [Digest(row['user_id'], row['text'], row['parse_mode'], [row]) for row in rows]
+
+        finished_at: Dict[int, float] = {}
+        pending = []
+        for index, digest in enumerate(digests):
+            kwargs = {'parse_mode': digest.parse_mode} if digest.parse_mode else {}
+            future = await broadcast_engine.submit(self.bot, digest.user_id, digest.text, **kwargs)
+            future.add_done_callback(
+                lambda _, index=index: finished_at.__setitem__(index, time.monotonic())
+            )
+            pending.append((index, digest, future))
+        self.stats['api_calls'] += len(digests)
+        self.stats['coalesced'] += len(rows) - len(digests)
+
+        results: List[Dict[str, Any]] = []
+        for index, digest, future in pending:
+            error = await future
+            delivery_time_ms = int((finished_at.get(index, time.monotonic()) - started) * 1000)
+            # همه ردیف‌های یک پیام خلاصه نتیجه یکسان دارند
+            for row in digest.rows:
+                retry_at = None
+                if error is not None:
+                    if not isinstance(error, PERMANENT_ERRORS):
+                        retry_at = self._retry_at(row['attempts'])
+                    if retry_at:
+                        self.stats['total_retried'] += 1
+                        outcome = 'retry'
+                    else:
+                        self.stats['total_failed'] += 1
+                        outcome = 'undeliverable' if isinstance(error, UndeliverableChatError) else 'failed'
+                        logger.warning(
+                            f"❌ ارسال ریمایندر {row['reminder_type']}:{row['reminder_id']} "
+                            f"به کاربر {row['user_id']} ناموفق بود: {error}"
+                        )
+                else:
+                    self.stats['total_sent'] += 1
+                    outcome = 'sent'
+                    SEND_SECONDS.observe(delivery_time_ms / 1000, row['reminder_type'])
+                SEND_TOTAL.inc(row['reminder_type'], outcome)
+
+                results.append({
+                    'id': row['id'],
+                    'user_id': row['user_id'],
+                    'reminder_id': row['reminder_id'],
+                    'reminder_type': row['reminder_type'],
+                    'error': error,
+                    'retry_at': retry_at,
+                    'delivery_time_ms': delivery_time_ms
+                })
+            if len(results) >= self.complete_every:
+                await async_reminder_db.complete_outbox_batch(results)
+                results = []
+
+        await async_reminder_db.complete_outbox_batch(results)
+
+        self.stats['total_batches'] += 1
+        self.stats['last_batch'] = datetime.now(TEHRAN_TIMEZONE)
+        logger.info(
+            f"📤 دسته صف ارسال: {len(rows)} پیام با {len(digests)} درخواست در "
+            f"{round(time.monotonic() - started, 2)} ثانیه پردازش شد"
+        )
+        return len(rows)
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """آمار مصرف‌کننده و وضعیت صف"""
+        stats = dict(self.stats)
+        stats.update({
+            'is_running': self.is_running,
+            'queue': await async_reminder_db.get_outbox_stats()
+        })
+        return stats
+
+
+# ایجاد instance اصلی
+outbox_dispatcher = OutboxDispatcher()
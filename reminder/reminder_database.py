@@ -3,11 +3,16 @@
 """
 import sqlite3
 import logging
+import time
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Sequence, Tuple
 import json
 import pytz
 
+from reminder.change_log import ChangeLog
+from reminder.reminder_utils import recurrence
+from utils.db_connection import get_connection_manager
+
 logger = logging.getLogger(__name__)
 
 # تنظیم تایم‌زون تهران
@@ -16,19 +21,35 @@ TEHRAN_TIMEZONE = pytz.timezone('Asia/Tehran')
 class ReminderDatabase:
     def __init__(self, db_path="konkour_bot.db"):
         self.db_path = db_path
+        self.connections = get_connection_manager(db_path)
+        self._change_listeners = []
+        self.changes = ChangeLog(self.connections)
         self.init_database()
 
+    def add_change_listener(self, listener):
+        """ثبت تابعی که بعد از هر تغییر در ریمایندرها فراخوانی می‌شود: listener(reminder_type, reminder_id)"""
+        if listener not in self._change_listeners:
+            self._change_listeners.append(listener)
+
+    def _notify_change(self, reminder_type: str, reminder_id: int = None, deleted: bool = False):
+        """محاسبه مجدد next_fire_at و اطلاع‌رسانی تغییر ریمایندر به شنونده‌ها (مثل موتور زمان‌بندی)"""
+        if not deleted and reminder_id is not None:
+            self.refresh_next_fire_at(reminder_type, reminder_id)
+        # برای رهبری که در instance دیگری اجرا می‌شود
+        self.changes.record(reminder_type, reminder_id)
+        
+        for listener in self._change_listeners:
+            try:
+                listener(reminder_type, reminder_id)
+            except Exception as e:
+                logger.error(f"❌ خطا در اطلاع‌رسانی تغییر ریمایندر: {e}")
+
     def init_database(self):
         """ایجاد جداول ریمایندرها با بهینه‌سازی"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connections.write() as conn:
+            # PRAGMAها (WAL، foreign_keys، cache) یک‌بار هنگام ساخت اتصال توسط ConnectionManager اعمال می‌شوند
             cursor = conn.cursor()
             
-            # فعال کردن ویژگی‌های پیشرفته SQLite
-            cursor.execute("PRAGMA foreign_keys = ON")
-            cursor.execute("PRAGMA journal_mode = WAL")
-            cursor.execute("PRAGMA synchronous = NORMAL")
-            cursor.execute("PRAGMA cache_size = -64000")  # 64MB cache
-            
             # جدول ریمایندرهای کنکور
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS exam_reminders (
@@ -44,6 +65,7 @@ class ReminderDatabase:
                     is_active BOOLEAN DEFAULT TRUE,
                     last_sent TIMESTAMP,
                     total_sent INTEGER DEFAULT 0,
+                    next_fire_at TIMESTAMP,    -- زمان اجرای بعدی به UTC
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
@@ -67,6 +89,7 @@ class ReminderDatabase:
                     is_active BOOLEAN DEFAULT TRUE,
                     last_sent TIMESTAMP,
                     total_sent INTEGER DEFAULT 0,
+                    next_fire_at TIMESTAMP,    -- زمان اجرای بعدی به UTC
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
@@ -82,6 +105,7 @@ class ReminderDatabase:
                     exam_keys TEXT NOT NULL,
                     is_active BOOLEAN DEFAULT TRUE,
                     created_by_admin INTEGER NOT NULL,
+                    next_fire_at TIMESTAMP,    -- زمان اجرای بعدی به UTC
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             ''')
@@ -113,6 +137,7 @@ class ReminderDatabase:
                     repeat_interval INTEGER DEFAULT 0, -- فاصله زمانی (@)
                     is_active BOOLEAN DEFAULT TRUE,
                     total_sent INTEGER DEFAULT 0,
+                    next_fire_at TIMESTAMP,        -- زمان اجرای بعدی به UTC
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
@@ -179,8 +204,399 @@ class ReminderDatabase:
                 ON admin_advanced_reminders(is_active, admin_id)
             ''')
             
+            # جدول نرمال‌شده زمان‌بندی (روز هفته + دقیقه از ابتدای روز) به جای JSON
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS reminder_schedule (
+                    reminder_type TEXT NOT NULL,     -- exam / admin_advanced
+                    reminder_id INTEGER NOT NULL,
+                    weekday INTEGER NOT NULL,        -- 0=Monday (مطابق datetime.weekday)
+                    minute_of_day INTEGER NOT NULL,  -- برای admin_advanced: دقیقه شروع بازه
+                    end_minute INTEGER,              -- admin_advanced: دقیقه پایان بازه (NULL = فقط همان دقیقه)
+                    PRIMARY KEY (reminder_type, reminder_id, weekday, minute_of_day)
+                ) WITHOUT ROWID
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_reminder_schedule_slot 
+                ON reminder_schedule(weekday, minute_of_day, reminder_type, reminder_id)
+            ''')
+            
+            # جدول نرمال‌شده کنکورهای هر ریمایندر کنکور
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS reminder_exam_keys (
+                    reminder_id INTEGER NOT NULL,
+                    position INTEGER NOT NULL,
+                    exam_key TEXT NOT NULL,
+                    PRIMARY KEY (reminder_id, position)
+                ) WITHOUT ROWID
+            ''')
+
+            # صف پایدار ارسال (outbox): متن پیام‌ها یک‌بار ذخیره می‌شود
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS outbox_messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    text TEXT NOT NULL,
+                    parse_mode TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+            # هر ردیف = یک پیام برای یک کاربر؛ کلید یکتا از ارسال تکراری جلوگیری می‌کند
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    reminder_type TEXT NOT NULL,
+                    reminder_id INTEGER NOT NULL,
+                    fire_at TIMESTAMP NOT NULL,          -- UTC، نوبت اجرای ریمایندر
+                    part INTEGER NOT NULL DEFAULT 0,     -- شماره تکرار / کنکور
+                    user_id INTEGER NOT NULL,
+                    message_id INTEGER NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',  -- pending / sending / sent / failed
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at TIMESTAMP NOT NULL,  -- UTC
+                    last_error TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    sent_at TIMESTAMP,
+                    UNIQUE (reminder_type, reminder_id, fire_at, part, user_id)
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_outbox_pending
+                ON outbox(status, next_attempt_at)
+            ''')
+
+            # تغییرات ریمایندرها - رهبر با poll این جدول تغییرات instanceهای دیگر را می‌بیند
+            ChangeLog.create_table(cursor)
+
+            # lease رهبری بین چند instance ربات (فقط رهبر زمان‌بندها و صف ارسال را اجرا می‌کند)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS scheduler_leases (
+                    name TEXT PRIMARY KEY,
+                    holder TEXT NOT NULL,
+                    expires_at REAL NOT NULL,      -- epoch
+                    acquired_at REAL NOT NULL,
+                    heartbeat_at REAL NOT NULL
+                )
+            ''')
+
+            # بازه ارسال ریمایندرهای پیشرفته برای دیتابیس‌های قدیمی
+            self._ensure_column(cursor, 'reminder_schedule', 'end_minute', 'INTEGER')
+
+            # ستون next_fire_at برای دیتابیس‌های قدیمی + ایندکس اسکن بازه‌ای
+            for table in ('exam_reminders', 'personal_reminders', 'admin_advanced_reminders', 'auto_reminders'):
+                self._ensure_column(cursor, table, 'next_fire_at', 'TIMESTAMP')
+                cursor.execute(f'''
+                    CREATE INDEX IF NOT EXISTS idx_{table}_next_fire 
+                    ON {table}(next_fire_at)
+                ''')
+            
             conn.commit()
             logger.info("✅ دیتابیس ریمایندرها راه‌اندازی شد")
+        
+        self.migrate_json_schedules()
+        self.backfill_next_fire_at()
+
+    def _ensure_column(self, cursor, table: str, column: str, definition: str):
+        """افزودن ستون به جدول موجود در صورت نبود (مهاجرت ساده)"""
+        cursor.execute(f"PRAGMA table_info({table})")
+        if column not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            logger.info(f"🛠️ ستون {column} به جدول {table} اضافه شد")
+
+    # --- زمان اجرای بعدی (next_fire_at) ---
+
+    NEXT_FIRE_TABLES = {
+        'exam': 'exam_reminders',
+        'personal': 'personal_reminders',
+        'admin_advanced': 'admin_advanced_reminders'
+    }
+
+    def _row_to_reminder(self, reminder_type: str, row: sqlite3.Row) -> Dict[str, Any]:
+        """تبدیل سطر دیتابیس به دیکشنری ریمایندر بر اساس نوع"""
+        if reminder_type == 'exam':
+            specific_dates = row['specific_dates']
+            reminder = {
+                'id': row['id'],
+                'user_id': row['user_id'],
+                'exam_keys': [],        # از reminder_exam_keys پر می‌شود
+                'days_of_week': [],     # از reminder_schedule پر می‌شود
+                'specific_times': [],   # از reminder_schedule پر می‌شود
+                'specific_dates': json.loads(specific_dates) if specific_dates and specific_dates != '[]' else [],
+                'start_date': row['start_date'],
+                'end_date': row['end_date'],
+                'is_active': bool(row['is_active']),
+                'last_sent': row['last_sent'],
+                'total_sent': row['total_sent'],
+                'created_at': row['created_at']
+            }
+        elif reminder_type == 'personal':
+            reminder = {
+                'id': row['id'],
+                'user_id': row['user_id'],
+                'title': row['title'],
+                'message': row['message'],
+                'repetition_type': row['repetition_type'],
+                'days_of_week': json.loads(row['days_of_week'] or '[]'),
+                'specific_time': row['specific_time'],
+                'custom_days_interval': row['custom_days_interval'],
+                'start_date': row['start_date'],
+                'end_date': row['end_date'],
+                'max_occurrences': row['max_occurrences'],
+                'is_active': bool(row['is_active'])
+            }
+        else:
+            reminder = {
+                'id': row['id'],
+                'admin_id': row['admin_id'],
+                'title': row['title'],
+                'message': row['message'],
+                'start_time': row['start_time'],
+                'start_date': row['start_date'],
+                'end_time': row['end_time'],
+                'end_date': row['end_date'],
+                'days_of_week': [],     # از reminder_schedule پر می‌شود
+                'repeat_count': row['repeat_count'],
+                'repeat_interval': row['repeat_interval'],
+                'is_active': bool(row['is_active']),
+                'total_sent': row['total_sent'],
+                'created_at': row['created_at']
+            }
+        
+        reminder['next_fire_at'] = row['next_fire_at']
+        reminder['reminder_type'] = reminder_type
+        return reminder
+
+    # --- جداول نرمال‌شده زمان‌بندی ---
+
+    SCHEDULE_CHUNK_SIZE = 500  # کمتر از سقف پارامترهای SQLite
+
+    def _write_schedule(self, cursor, reminder_type: str, reminder_id: int,
+                        days_of_week: List[int], minutes: List[int], end_minute: Optional[int] = None):
+        """
+        بازنویسی ردیف‌های reminder_schedule یک ریمایندر
+        end_minute: پایان بازه ارسال ریمایندر پیشرفته (هر دقیقه از minute_of_day تا end_minute اجرا می‌شود)
+        """
+        cursor.execute(
+            'DELETE FROM reminder_schedule WHERE reminder_type = ? AND reminder_id = ?',
+            (reminder_type, reminder_id)
+        )
+        cursor.executemany(
+            'INSERT OR IGNORE INTO reminder_schedule (reminder_type, reminder_id, weekday, minute_of_day, end_minute) VALUES (?, ?, ?, ?, ?)',
+            [(reminder_type, reminder_id, int(day), minute, end_minute) for day in days_of_week for minute in minutes if minute is not None]
+        )
+
+    def _write_exam_keys(self, cursor, reminder_id: int, exam_keys: List[str]):
+        """بازنویسی کنکورهای یک ریمایندر کنکور"""
+        cursor.execute('DELETE FROM reminder_exam_keys WHERE reminder_id = ?', (reminder_id,))
+        cursor.executemany(
+            'INSERT INTO reminder_exam_keys (reminder_id, position, exam_key) VALUES (?, ?, ?)',
+            [(reminder_id, position, exam_key) for position, exam_key in enumerate(exam_keys)]
+        )
+
+    def _delete_schedule(self, cursor, reminder_type: str, reminder_id: int):
+        """حذف ردیف‌های فرزند یک ریمایندر"""
+        cursor.execute(
+            'DELETE FROM reminder_schedule WHERE reminder_type = ? AND reminder_id = ?',
+            (reminder_type, reminder_id)
+        )
+        if reminder_type == 'exam':
+            cursor.execute('DELETE FROM reminder_exam_keys WHERE reminder_id = ?', (reminder_id,))
+
+    def _attach_schedules(self, cursor, reminder_type: str, reminders: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """پر کردن days_of_week / specific_times / exam_keys از جداول نرمال‌شده (بدون json.loads)"""
+        if reminder_type not in ('exam', 'admin_advanced') or not reminders:
+            return reminders
+        
+        by_id = {reminder['id']: reminder for reminder in reminders}
+        ids = list(by_id)
+        days_map = {reminder_id: set() for reminder_id in ids}
+        minutes_map = {reminder_id: set() for reminder_id in ids}
+        
+        for start in range(0, len(ids), self.SCHEDULE_CHUNK_SIZE):
+            chunk = ids[start:start + self.SCHEDULE_CHUNK_SIZE]
+            placeholders = ','.join('?' * len(chunk))
+            
+            cursor.execute(f'''
+                SELECT reminder_id, weekday, minute_of_day FROM reminder_schedule
+                WHERE reminder_type = ? AND reminder_id IN ({placeholders})
+            ''', [reminder_type] + chunk)
+            for reminder_id, weekday, minute in cursor.fetchall():
+                days_map[reminder_id].add(weekday)
+                minutes_map[reminder_id].add(minute)
+            
+            if reminder_type == 'exam':
+                cursor.execute(f'''
+                    SELECT reminder_id, exam_key FROM reminder_exam_keys
+                    WHERE reminder_id IN ({placeholders})
+                    ORDER BY reminder_id, position
+                ''', chunk)
+                for reminder_id, exam_key in cursor.fetchall():
+                    by_id[reminder_id]['exam_keys'].append(exam_key)
+        
+        for reminder_id, reminder in by_id.items():
+            reminder['days_of_week'] = sorted(days_map[reminder_id])
+            if reminder_type == 'exam':
+                reminder['specific_times'] = [
+                    f"{minute // 60:02d}:{minute % 60:02d}" for minute in sorted(minutes_map[reminder_id])
+                ]
+        
+        return reminders
+
+    def migrate_json_schedules(self) -> int:
+        """انتقال days_of_week / specific_times / exam_keys ریمایندرهای قدیمی از JSON به جداول نرمال‌شده"""
+        migrated = 0
+        try:
+            with self.connections.write() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute('''
+                    SELECT id, exam_keys, days_of_week, specific_times FROM exam_reminders r
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM reminder_schedule s
+                        WHERE s.reminder_type = 'exam' AND s.reminder_id = r.id
+                    )
+                ''')
+                for reminder_id, exam_keys, days_of_week, specific_times in cursor.fetchall():
+                    minutes = [recurrence.parse_time(t) for t in json.loads(specific_times or '[]')]
+                    self._write_schedule(cursor, 'exam', reminder_id, json.loads(days_of_week or '[]'), minutes)
+                    self._write_exam_keys(cursor, reminder_id, json.loads(exam_keys or '[]'))
+                    migrated += 1
+                
+                # ریمایندرهای پیشرفته بدون زمان‌بندی یا با زمان‌بندی قدیمی (فقط دقیقه شروع، بدون end_minute)
+                cursor.execute('''
+                    SELECT id, days_of_week, start_time, end_time FROM admin_advanced_reminders r
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM reminder_schedule s
+                        WHERE s.reminder_type = 'admin_advanced' AND s.reminder_id = r.id
+                        AND s.end_minute IS NOT NULL
+                    )
+                ''')
+                for reminder_id, days_of_week, start_time, end_time in cursor.fetchall():
+                    self._write_schedule(
+                        cursor, 'admin_advanced', reminder_id,
+                        json.loads(days_of_week or '[]'), [recurrence.parse_time(start_time)],
+                        recurrence.parse_time(end_time)
+                    )
+                    migrated += 1
+                
+                conn.commit()
+            
+            if migrated:
+                logger.info(f"🛠️ زمان‌بندی {migrated} ریمایندر به جدول reminder_schedule منتقل شد")
+        except Exception as e:
+            logger.error(f"❌ خطا در انتقال زمان‌بندی ریمایندرها: {e}")
+        return migrated
+
+    def get_reminders_firing_at(self, weekday: int, minute_of_day: int, 
+                                target_date: str = None) -> List[Dict[str, Any]]:
+        """ریمایندرهای کنکور و پیشرفته فعالی که در روز هفته و دقیقه مشخص اجرا می‌شوند - یک lookup ایندکس‌دار"""
+        with self.connections.read() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
+            
+            reminders = []
+            for reminder_type in ('exam', 'admin_advanced'):
+                table = self.NEXT_FIRE_TABLES[reminder_type]
+                if reminder_type == 'admin_advanced':
+                    # ریمایندر پیشرفته هر دقیقه بازه [شروع، پایان] اجرا می‌شود (مثل next_advanced_fire)
+                    slot = 's.minute_of_day <= ? AND s.end_minute >= ?'
+                    slot_params = [minute_of_day, minute_of_day]
+                else:
+                    slot = 's.minute_of_day = ?'
+                    slot_params = [minute_of_day]
+                query = f'''
+                    SELECT r.* FROM reminder_schedule s
+                    JOIN {table} r ON r.id = s.reminder_id
+                    WHERE s.weekday = ? AND {slot} AND s.reminder_type = ?
+                    AND r.is_active = TRUE
+                '''
+                params = [weekday] + slot_params + [reminder_type]
+                if target_date:
+                    query += ' AND r.start_date <= ? AND r.end_date >= ?'
+                    params += [target_date, target_date]
+                
+                cursor.execute(query, params)
+                typed = [self._row_to_reminder(reminder_type, row) for row in cursor.fetchall()]
+                reminders.extend(self._attach_schedules(cursor, reminder_type, typed))
+            
+            return reminders
+
+    def compute_next_fire_at(self, reminder_type: str, reminder: Dict[str, Any], 
+                             after: datetime = None) -> Optional[str]:
+        """محاسبه next_fire_at (رشته UTC) برای یک ریمایندر"""
+        after = after or datetime.now(TEHRAN_TIMEZONE)
+        return recurrence.to_utc_string(recurrence.next_fire(reminder_type, reminder, after))
+
+    def set_next_fire_at(self, reminder_type: str, reminder_id: int, next_fire_at: Optional[datetime]):
+        """ذخیره زمان اجرای بعدی محاسبه‌شده توسط موتور زمان‌بندی"""
+        table = self.NEXT_FIRE_TABLES.get(reminder_type)
+        if not table:
+            return
+        try:
+            with self.connections.write() as conn:
+                conn.execute(
+                    f'UPDATE {table} SET next_fire_at = ? WHERE id = ?',
+                    (recurrence.to_utc_string(next_fire_at), reminder_id)
+                )
+        except Exception as e:
+            logger.error(f"❌ خطا در ذخیره next_fire_at ریمایندر {reminder_id}: {e}")
+
+    def refresh_next_fire_at(self, reminder_type: str, reminder_id: int, 
+                             after: datetime = None) -> Optional[str]:
+        """محاسبه مجدد و ذخیره next_fire_at بعد از ویرایش یا ارسال"""
+        table = self.NEXT_FIRE_TABLES.get(reminder_type)
+        if not table:
+            return None
+        try:
+            with self.connections.write() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = sqlite3.Row
+                cursor.execute(f'SELECT * FROM {table} WHERE id = ?', (reminder_id,))
+                row = cursor.fetchone()
+                if not row:
+                    return None
+                
+                reminder = self._attach_schedules(cursor, reminder_type, [self._row_to_reminder(reminder_type, row)])[0]
+                next_fire_at = self.compute_next_fire_at(reminder_type, reminder, after)
+                cursor.execute(
+                    f'UPDATE {table} SET next_fire_at = ? WHERE id = ?',
+                    (next_fire_at, reminder_id)
+                )
+                return next_fire_at
+        except Exception as e:
+            logger.error(f"❌ خطا در محاسبه next_fire_at ریمایندر {reminder_id}: {e}")
+            return None
+
+    def backfill_next_fire_at(self) -> int:
+        """محاسبه next_fire_at برای ریمایندرهای فعالی که هنوز مقدار ندارند"""
+        updated = 0
+        try:
+            with self.connections.write() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = sqlite3.Row
+                now = datetime.now(TEHRAN_TIMEZONE)
+                
+                for reminder_type, table in self.NEXT_FIRE_TABLES.items():
+                    cursor.execute(
+                        f'SELECT * FROM {table} WHERE is_active = TRUE AND next_fire_at IS NULL'
+                    )
+                    reminders = self._attach_schedules(
+                        cursor, reminder_type, [self._row_to_reminder(reminder_type, row) for row in cursor.fetchall()]
+                    )
+                    params = [
+                        (self.compute_next_fire_at(reminder_type, reminder, now), reminder['id'])
+                        for reminder in reminders
+                    ]
+                    if params:
+                        cursor.executemany(f'UPDATE {table} SET next_fire_at = ? WHERE id = ?', params)
+                        updated += len(params)
+                
+                conn.commit()
+            
+            if updated:
+                logger.info(f"🕒 next_fire_at برای {updated} ریمایندر محاسبه شد")
+        except Exception as e:
+            logger.error(f"❌ خطا در محاسبه اولیه next_fire_at: {e}")
+        return updated
 
     # --- توابع جدید برای ریمایندرهای پیشرفته ادمین ---
     
@@ -190,7 +606,7 @@ class ReminderDatabase:
                                   days_of_week: List[int], 
                                   repeat_count: int, repeat_interval: int) -> int:
         """افزودن ریمایندر پیشرفته توسط ادمین"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connections.write() as conn:
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -212,14 +628,20 @@ class ReminderDatabase:
             ))
             
             reminder_id = cursor.lastrowid
+            self._write_schedule(
+                cursor, 'admin_advanced', reminder_id, days_of_week,
+                [recurrence.parse_time(start_time)], recurrence.parse_time(end_time)
+            )
             logger.info(f"✅ ریمایندر پیشرفته ادمین {reminder_id} ایجاد شد")
-            return reminder_id
+        
+        self._notify_change('admin_advanced', reminder_id)
+        return reminder_id
 
     def get_admin_advanced_reminders(self, admin_id: int = None) -> List[Dict[str, Any]]:
         """دریافت ریمایندرهای پیشرفته ادمین"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self.connections.read() as conn:
             cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
             
             if admin_id:
                 cursor.execute(
@@ -231,30 +653,12 @@ class ReminderDatabase:
             else:
                 cursor.execute('''SELECT * FROM admin_advanced_reminders ORDER BY created_at DESC''')
             
-            reminders = []
-            for row in cursor.fetchall():
-                reminders.append({
-                    'id': row['id'],
-                    'admin_id': row['admin_id'],
-                    'title': row['title'],
-                    'message': row['message'],
-                    'start_time': row['start_time'],
-                    'start_date': row['start_date'],
-                    'end_time': row['end_time'],
-                    'end_date': row['end_date'],
-                    'days_of_week': json.loads(row['days_of_week']),
-                    'repeat_count': row['repeat_count'],
-                    'repeat_interval': row['repeat_interval'],
-                    'is_active': bool(row['is_active']),
-                    'total_sent': row['total_sent'],
-                    'created_at': row['created_at']
-                })
-            
-            return reminders
+            reminders = [self._row_to_reminder('admin_advanced', row) for row in cursor.fetchall()]
+            return self._attach_schedules(cursor, 'admin_advanced', reminders)
 
     def update_admin_advanced_reminder(self, reminder_id: int, **kwargs) -> bool:
         """ویرایش ریمایندر پیشرفته ادمین"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connections.write() as conn:
             cursor = conn.cursor()
             
             update_fields = []
@@ -281,26 +685,43 @@ class ReminderDatabase:
             
             success = cursor.rowcount > 0
             if success:
+                if 'days_of_week' in kwargs or 'start_time' in kwargs or 'end_time' in kwargs:
+                    cursor.execute(
+                        'SELECT days_of_week, start_time, end_time FROM admin_advanced_reminders WHERE id = ?',
+                        (reminder_id,)
+                    )
+                    days_json, start_time, end_time = cursor.fetchone()
+                    days = kwargs['days_of_week'] if isinstance(kwargs.get('days_of_week'), list) else json.loads(days_json)
+                    self._write_schedule(
+                        cursor, 'admin_advanced', reminder_id, days,
+                        [recurrence.parse_time(start_time)], recurrence.parse_time(end_time)
+                    )
                 logger.info(f"✅ ریمایندر پیشرفته {reminder_id} آپدیت شد")
-            
-            return success
+        
+        if success:
+            self._notify_change('admin_advanced', reminder_id)
+        return success
 
     def delete_admin_advanced_reminder(self, reminder_id: int) -> bool:
         """حذف ریمایندر پیشرفته ادمین"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connections.write() as conn:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM admin_advanced_reminders WHERE id = ?', (reminder_id,))
-            
+            # rowcount ردیف اصلی - بعد از حذف ردیف‌های فرزند تغییر می‌کند
             success = cursor.rowcount > 0
+            self._delete_schedule(cursor, 'admin_advanced', reminder_id)
+            
             if success:
                 logger.info(f"🗑️ ریمایندر پیشرفته {reminder_id} حذف شد")
-            
-            return success
+        
+        if success:
+            self._notify_change('admin_advanced', reminder_id, deleted=True)
+        return success
 
     def update_advanced_reminder_sent_count(self, reminder_id: int):
         """به‌روزرسانی تعداد ارسال‌های ریمایندر پیشرفته"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connections.write() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     UPDATE admin_advanced_reminders 
@@ -314,7 +735,7 @@ class ReminderDatabase:
 
     def toggle_admin_advanced_reminder(self, reminder_id: int) -> bool:
         """تغییر وضعیت فعال/غیرفعال ریمایندر پیشرفته"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connections.write() as conn:
             cursor = conn.cursor()
             
             # دریافت وضعیت فعلی
@@ -335,18 +756,21 @@ class ReminderDatabase:
             if success:
                 status_text = "فعال" if new_status else "غیرفعال"
                 logger.info(f"✅ ریمایندر پیشرفته {reminder_id} {status_text} شد")
-            
-            return success
+        
+        if success:
+            self._notify_change('admin_advanced', reminder_id)
+        return success
 
     # --- توابع کمکی برای سازگاری ---
     def execute_query(self, query: str, params: tuple = (), fetch_all: bool = False):
         """اجرای کوئری و بازگرداندن نتایج - برای سازگاری با کدهای موجود"""
+        is_select = query.strip().upper().startswith('SELECT')
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with (self.connections.read() if is_select else self.connections.write()) as conn:
                 cursor = conn.cursor()
                 cursor.execute(query, params)
                 
-                if query.strip().upper().startswith('SELECT'):
+                if is_select:
                     if fetch_all:
                         result = cursor.fetchall()
                     else:
@@ -363,7 +787,7 @@ class ReminderDatabase:
     def execute_many(self, query: str, params_list: list):
         """اجرای دستورات bulk"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connections.write() as conn:
                 cursor = conn.cursor()
                 cursor.executemany(query, params_list)
                 conn.commit()
@@ -389,7 +813,7 @@ class ReminderDatabase:
             for date in specific_dates:
                 specific_dates_gregorian.append(persian_to_gregorian_string(date))
         
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connections.write() as conn:
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -407,14 +831,21 @@ class ReminderDatabase:
             ))
             
             reminder_id = cursor.lastrowid
+            self._write_schedule(
+                cursor, 'exam', reminder_id, days_of_week,
+                [recurrence.parse_time(t) for t in specific_times]
+            )
+            self._write_exam_keys(cursor, reminder_id, exam_keys)
             logger.info(f"✅ ریمایندر کنکور {reminder_id} برای کاربر {user_id} ایجاد شد")
-            return reminder_id
+        
+        self._notify_change('exam', reminder_id)
+        return reminder_id
 
     def get_user_exam_reminders(self, user_id: int) -> List[Dict[str, Any]]:
         """دریافت ریمایندرهای کنکور کاربر"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self.connections.read() as conn:
             cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
             
             cursor.execute(
                 '''SELECT * FROM exam_reminders 
@@ -423,24 +854,8 @@ class ReminderDatabase:
                 (user_id,)
             )
             
-            reminders = []
-            for row in cursor.fetchall():
-                reminders.append({
-                    'id': row['id'],
-                    'user_id': row['user_id'],
-                    'exam_keys': json.loads(row['exam_keys']),
-                    'days_of_week': json.loads(row['days_of_week']),
-                    'specific_times': json.loads(row['specific_times']),
-                    'specific_dates': json.loads(row['specific_dates']),
-                    'start_date': row['start_date'],  # میلادی
-                    'end_date': row['end_date'],      # میلادی
-                    'is_active': bool(row['is_active']),
-                    'last_sent': row['last_sent'],
-                    'total_sent': row['total_sent'],
-                    'created_at': row['created_at']
-                })
-            
-            return reminders
+            reminders = [self._row_to_reminder('exam', row) for row in cursor.fetchall()]
+            return self._attach_schedules(cursor, 'exam', reminders)
 
     # --- توابع ریمایندر شخصی ---
     
@@ -457,7 +872,7 @@ class ReminderDatabase:
         start_date_gregorian = persian_to_gregorian_string(start_date)
         end_date_gregorian = persian_to_gregorian_string(end_date) if end_date else None
         
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connections.write() as conn:
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -480,13 +895,15 @@ class ReminderDatabase:
             
             reminder_id = cursor.lastrowid
             logger.info(f"✅ ریمایندر شخصی {reminder_id} برای کاربر {user_id} ایجاد شد")
-            return reminder_id
+        
+        self._notify_change('personal', reminder_id)
+        return reminder_id
 
     def get_user_personal_reminders(self, user_id: int) -> List[Dict[str, Any]]:
         """دریافت ریمایندرهای شخصی کاربر"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self.connections.read() as conn:
             cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
             
             cursor.execute(
                 '''SELECT * FROM personal_reminders 
@@ -519,149 +936,61 @@ class ReminderDatabase:
 
     # --- توابع اصلی برای سیستم زمان‌بندی ---
     
-    def get_due_reminders(self, target_date: str, target_time: str, target_weekday: int) -> List[Dict[str, Any]]:
-        """دریافت ریمایندرهای due برای تاریخ و زمان مشخص - با تاریخ میلادی"""
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                
-                # تبدیل زمان فارسی به انگلیسی
-                time_map = {
-                    "۸:۰۰": "08:00", "۱۰:۰۰": "10:00", "۱۲:۰۰": "12:00", 
-                    "۱۴:۰۰": "14:00", "۱۶:۰۰": "16:00", "۱۸:۰۰": "18:00",
-                    "۲۰:۰۰": "20:00", "۲۲:۰۰": "22:00"
-                }
-                
-                target_time_english = time_map.get(target_time, target_time)
-                
-                # 🔥 حالا target_date خودش میلادی هست (از سیستم)
-                # پس نیاز به تبدیل نداریم!
-                
-                logger.info(f"🔍 جستجوی ریمایندر برای تاریخ میلادی: {target_date}, زمان: {target_time_english}")
-                
-                # دریافت ریمایندرهای کنکور - با تاریخ میلادی
-                cursor.execute('''
-                    SELECT * FROM exam_reminders 
-                    WHERE is_active = TRUE 
-                    AND json_extract(days_of_week, '$') LIKE ?
-                    AND json_extract(specific_times, '$') LIKE ?
-                    AND start_date <= ? 
-                    AND end_date >= ?
-                ''', (
-                    f'%{target_weekday}%',
-                    f'%"{target_time_english}"%',
-                    target_date,  # تاریخ میلادی
-                    target_date   # تاریخ میلادی
-                ))
-                
-                reminders = []
-                for row in cursor.fetchall():
-                    reminders.append({
-                        'id': row['id'],
-                        'user_id': row['user_id'],
-                        'exam_keys': json.loads(row['exam_keys']),
-                        'days_of_week': json.loads(row['days_of_week']),
-                        'specific_times': json.loads(row['specific_times']),
-                        'specific_dates': json.loads(row['specific_dates']),
-                        'start_date': row['start_date'],
-                        'end_date': row['end_date'],
-                        'is_active': bool(row['is_active']),
-                        'reminder_type': 'exam'
-                    })
-                
-                # دریافت ریمایندرهای شخصی - با تاریخ میلادی
-                cursor.execute('''
-                    SELECT * FROM personal_reminders 
-                    WHERE is_active = TRUE 
-                    AND specific_time = ?
-                    AND start_date <= ? 
-                    AND (end_date >= ? OR end_date IS NULL)
-                ''', (target_time_english, target_date, target_date))
-                
-                for row in cursor.fetchall():
-                    reminders.append({
-                        'id': row['id'],
-                        'user_id': row['user_id'],
-                        'title': row['title'],
-                        'message': row['message'],
-                        'repetition_type': row['repetition_type'],
-                        'days_of_week': json.loads(row['days_of_week']),
-                        'specific_time': row['specific_time'],
-                        'custom_days_interval': row['custom_days_interval'],
-                        'start_date': row['start_date'],
-                        'end_date': row['end_date'],
-                        'max_occurrences': row['max_occurrences'],
-                        'is_active': bool(row['is_active']),
-                        'reminder_type': 'personal'
-                    })
-                
-                # 🔥 دریافت ریمایندرهای پیشرفته ادمین - با تاریخ میلادی
-                cursor.execute('''
-                    SELECT * FROM admin_advanced_reminders 
-                    WHERE is_active = TRUE 
-                    AND json_extract(days_of_week, '$') LIKE ?
-                    AND start_time = ?
-                    AND start_date <= ? 
-                    AND end_date >= ?
-                ''', (
-                    f'%{target_weekday}%',
-                    target_time_english,
-                    target_date,  # تاریخ میلادی
-                    target_date   # تاریخ میلادی
-                ))
-                
-                for row in cursor.fetchall():
-                    reminders.append({
-                        'id': row['id'],
-                        'admin_id': row['admin_id'],
-                        'title': row['title'],
-                        'message': row['message'],
-                        'start_time': row['start_time'],
-                        'start_date': row['start_date'],
-                        'end_time': row['end_time'],
-                        'end_date': row['end_date'],
-                        'days_of_week': json.loads(row['days_of_week']),
-                        'repeat_count': row['repeat_count'],
-                        'repeat_interval': row['repeat_interval'],
-                        'is_active': bool(row['is_active']),
-                        'reminder_type': 'admin_advanced'
-                    })
-                
-                logger.info(f"✅ پیدا شد {len(reminders)} ریمایندر برای ارسال")
-                return reminders
-                
-        except Exception as e:
-            logger.error(f"خطا در دریافت ریمایندرهای due: {e}")
-            return []
-
     def get_active_exam_reminders(self) -> List[Dict[str, Any]]:
         """دریافت همه ریمایندرهای کنکور فعال"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self.connections.read() as conn:
             cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
             
             cursor.execute('''
                 SELECT * FROM exam_reminders 
                 WHERE is_active = TRUE
             ''')
             
-            reminders = []
-            for row in cursor.fetchall():
-                reminders.append({
-                    'id': row['id'],
-                    'user_id': row['user_id'],
-                    'exam_keys': json.loads(row['exam_keys']),
-                    'days_of_week': json.loads(row['days_of_week']),
-                    'specific_times': json.loads(row['specific_times']),
-                    'specific_dates': json.loads(row['specific_dates']),
-                    'start_date': row['start_date'],
-                    'end_date': row['end_date'],
-                    'is_active': bool(row['is_active']),
-                    'reminder_type': 'exam'
-                })
+            reminders = [self._row_to_reminder('exam', row) for row in cursor.fetchall()]
+            return self._attach_schedules(cursor, 'exam', reminders)
+
+    def get_active_personal_reminders(self) -> List[Dict[str, Any]]:
+        """دریافت همه ریمایندرهای شخصی فعال"""
+        with self.connections.read() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
             
-            return reminders
+            cursor.execute('''
+                SELECT * FROM personal_reminders 
+                WHERE is_active = TRUE
+            ''')
+            
+            return [self._row_to_reminder('personal', row) for row in cursor.fetchall()]
+
+    def get_active_admin_advanced_reminders(self) -> List[Dict[str, Any]]:
+        """دریافت همه ریمایندرهای پیشرفته فعال"""
+        with self.connections.read() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
+            
+            cursor.execute('''
+                SELECT * FROM admin_advanced_reminders 
+                WHERE is_active = TRUE
+            ''')
+            
+            reminders = [self._row_to_reminder('admin_advanced', row) for row in cursor.fetchall()]
+            return self._attach_schedules(cursor, 'admin_advanced', reminders)
+
+    def get_active_reminder(self, reminder_type: str, reminder_id: int) -> Optional[Dict[str, Any]]:
+        """دریافت یک ریمایندر فعال با شناسه (None اگر حذف یا غیرفعال شده) - بارگذاری تکی موتور زمان‌بندی"""
+        table = self.NEXT_FIRE_TABLES.get(reminder_type)
+        if table is None:
+            return None
+        with self.connections.read() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
+            
+            cursor.execute(f'SELECT * FROM {table} WHERE id = ? AND is_active = TRUE', (reminder_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            return self._attach_schedules(cursor, reminder_type, [self._row_to_reminder(reminder_type, row)])[0]
 
     def update_reminder_status(self, reminder_type: str, reminder_id: int, is_active: bool):
         """به‌روزرسانی وضعیت ریمایندر"""
@@ -676,7 +1005,7 @@ class ReminderDatabase:
         if not table:
             return False
             
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connections.write() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 f'UPDATE {table} SET is_active = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
@@ -686,8 +1015,10 @@ class ReminderDatabase:
             success = cursor.rowcount > 0
             if success:
                 logger.info(f"✅ وضعیت ریمایندر {reminder_id} به {'فعال' if is_active else 'غیرفعال'} تغییر کرد")
-            
-            return success
+        
+        if success:
+            self._notify_change(reminder_type, reminder_id)
+        return success
 
     def delete_reminder(self, reminder_type: str, reminder_id: int):
         """حذف ریمایندر"""
@@ -701,51 +1032,24 @@ class ReminderDatabase:
         if not table:
             return False
             
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connections.write() as conn:
             cursor = conn.cursor()
             cursor.execute(f'DELETE FROM {table} WHERE id = ?', (reminder_id,))
-            
+            # rowcount ردیف اصلی - بعد از حذف ردیف‌های فرزند تغییر می‌کند
             success = cursor.rowcount > 0
+            self._delete_schedule(cursor, reminder_type, reminder_id)
+            
             if success:
                 logger.info(f"🗑️ ریمایندر {reminder_id} حذف شد")
-            
-            return success
-
-    def log_reminder_sent(self, user_id: int, reminder_id: int, reminder_type: str, 
-                         status: str = 'sent', error_message: str = None, 
-                         delivery_time_ms: int = None):
-        """ثبت لاگ ارسال ریمایندر"""
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO reminder_logs 
-                    (user_id, reminder_id, reminder_type, status, error_message, delivery_time_ms)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (user_id, reminder_id, reminder_type, status, error_message, delivery_time_ms))
-                
-                # آپدیت آمار ارسال در جدول اصلی
-                table_map = {
-                    'exam': 'exam_reminders',
-                    'personal': 'personal_reminders',
-                    'admin_advanced': 'admin_advanced_reminders'
-                }
-                table = table_map.get(reminder_type)
-                if table:
-                    cursor.execute(f'''
-                        UPDATE {table} 
-                        SET last_sent = CURRENT_TIMESTAMP, 
-                            total_sent = total_sent + 1 
-                        WHERE id = ?
-                    ''', (reminder_id,))
-                
-        except Exception as e:
-            logger.error(f"خطا در ثبت لاگ ریمایندر: {e}")
+        
+        if success:
+            self._notify_change(reminder_type, reminder_id, deleted=True)
+        return success
 
     def get_reminder_stats(self, user_id: int = None) -> Dict[str, Any]:
         """دریافت آمار ریمایندرها"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connections.read() as conn:
                 cursor = conn.cursor()
                 
                 stats = {}
@@ -805,7 +1109,7 @@ class ReminderDatabase:
     def cleanup_old_logs(self, days_old: int = 30):
         """پاک کردن لاگ‌های قدیمی"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connections.write() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     DELETE FROM reminder_logs 
@@ -822,6 +1126,301 @@ class ReminderDatabase:
             logger.error(f"خطا در پاک کردن لاگ‌های قدیمی: {e}")
             return 0
 
+    # --- صف پایدار ارسال (outbox) ---
+
+    def enqueue_outbox(self, reminder_type: str, reminder_id: int, fire_at: datetime,
+                       parts: List[Tuple[int, str, Optional[datetime]]], user_ids: Sequence[int],
+                       parse_mode: Optional[str] = "HTML") -> int:
+        """
+        تبدیل یک نوبت ریمایندر به ردیف‌های outbox (یک ردیف برای هر کاربر و هر بخش)
+
+        parts: لیست (شماره بخش، متن، زمان ارسال) - مثلا هر تکرار یا هر کنکور یک بخش است.
+        user_ids: لیست یا AudienceSnapshot - برای هر بخش دوباره پیمایش می‌شود (بدون کپی).
+        اگر این نوبت قبلاً ثبت شده باشد (مثلا اجرای دوباره بعد از ری‌استارت) چیزی اضافه نمی‌شود.
+        """
+        if not parts or not len(user_ids):
+            return 0
+
+        fire_at_utc = recurrence.to_utc_string(fire_at)
+        try:
+            with self.connections.write() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT 1 FROM outbox
+                    WHERE reminder_type = ? AND reminder_id = ? AND fire_at = ?
+                    LIMIT 1
+                ''', (reminder_type, reminder_id, fire_at_utc))
+                if cursor.fetchone():
+                    logger.info(f"ℹ️ نوبت {fire_at_utc} ریمایندر {reminder_type}:{reminder_id} قبلاً در صف ثبت شده")
+                    return 0
+
+                inserted = 0
+                for part, text, send_at in parts:
+                    cursor.execute(
+                        'INSERT INTO outbox_messages (text, parse_mode) VALUES (?, ?)',
+                        (text, parse_mode)
+                    )
+                    message_id = cursor.lastrowid
+                    send_at_utc = recurrence.to_utc_string(send_at or fire_at)
+                    cursor.executemany('''
+                        INSERT OR IGNORE INTO outbox
+                        (reminder_type, reminder_id, fire_at, part, user_id, message_id, next_attempt_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ''', (
+                        (reminder_type, reminder_id, fire_at_utc, part, user_id, message_id, send_at_utc)
+                        for user_id in user_ids
+                    ))
+                    inserted += cursor.rowcount
+
+                conn.commit()
+
+            logger.info(f"📥 {inserted} پیام ریمایندر {reminder_type}:{reminder_id} در صف ارسال ثبت شد")
+            return inserted
+
+        except Exception as e:
+            logger.error(f"❌ خطا در ثبت ریمایندر {reminder_type}:{reminder_id} در صف ارسال: {e}")
+            return 0
+
+    def claim_outbox_batch(self, limit: int = 100, now_utc: str = None) -> List[Dict[str, Any]]:
+        """برداشتن دسته‌ای از پیام‌های آماده ارسال و علامت‌گذاری آن‌ها به عنوان sending"""
+        now_utc = now_utc or recurrence.to_utc_string(datetime.now(TEHRAN_TIMEZONE))
+        try:
+            with self.connections.write() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = sqlite3.Row
+                # قفل نوشتن از ابتدا گرفته می‌شود تا دو مصرف‌کننده یک ردیف را برندارند
+                cursor.execute('BEGIN IMMEDIATE')
+                cursor.execute('''
+                    SELECT o.id, o.reminder_type, o.reminder_id, o.fire_at, o.part, o.user_id,
+                           o.attempts, o.next_attempt_at, m.text, m.parse_mode
+                    FROM outbox o
+                    JOIN outbox_messages m ON m.id = o.message_id
+                    WHERE o.status = 'pending' AND o.next_attempt_at <= ?
+                    ORDER BY o.next_attempt_at
+                    LIMIT ?
+                ''', (now_utc, limit))
+                rows = [dict(row) for row in cursor.fetchall()]
+
+                if rows:
+                    cursor.executemany(
+                        "UPDATE outbox SET status = 'sending' WHERE id = ?",
+                        [(row['id'],) for row in rows]
+                    )
+                conn.commit()
+                return rows
+
+        except Exception as e:
+            logger.error(f"❌ خطا در برداشتن پیام‌ها از صف ارسال: {e}")
+            return []
+
+    def complete_outbox_batch(self, results: List[Dict[str, Any]]):
+        """
+        ثبت نتیجه ارسال یک دسته از outbox و لاگ آن در reminder_logs (در یک تراکنش)
+
+        هر نتیجه: id, user_id, reminder_id, reminder_type, error, retry_at (UTC یا None), delivery_time_ms
+        """
+        if not results:
+            return
+
+        sent = [r for r in results if r.get('error') is None]
+        retried = [r for r in results if r.get('error') is not None and r.get('retry_at')]
+        failed = [r for r in results if r.get('error') is not None and not r.get('retry_at')]
+
+        try:
+            with self.connections.write() as conn:
+                cursor = conn.cursor()
+                cursor.executemany('''
+                    UPDATE outbox
+                    SET status = 'sent', attempts = attempts + 1, sent_at = CURRENT_TIMESTAMP, last_error = NULL
+                    WHERE id = ?
+                ''', [(r['id'],) for r in sent])
+                cursor.executemany('''
+                    UPDATE outbox
+                    SET status = 'pending', attempts = attempts + 1, next_attempt_at = ?, last_error = ?
+                    WHERE id = ?
+                ''', [(r['retry_at'], str(r['error'])[:500], r['id']) for r in retried])
+                cursor.executemany('''
+                    UPDATE outbox
+                    SET status = 'failed', attempts = attempts + 1, last_error = ?
+                    WHERE id = ?
+                ''', [(str(r['error'])[:500], r['id']) for r in failed])
+
+                # لاگ پیام‌های ارسال‌شده و پیام‌هایی که دیگر تلاش نمی‌شوند
+                cursor.executemany('''
+                    INSERT INTO reminder_logs
+                    (user_id, reminder_id, reminder_type, status, error_message, delivery_time_ms)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', [
+                    (r['user_id'], r['reminder_id'], r['reminder_type'],
+                     'sent' if r.get('error') is None else 'failed',
+                     None if r.get('error') is None else str(r['error'])[:500],
+                     r.get('delivery_time_ms'))
+                    for r in sent + failed
+                ])
+
+                # آپدیت آمار ارسال در جدول اصلی
+                sent_counts: Dict[Tuple[str, int], int] = {}
+                for r in sent:
+                    key = (r['reminder_type'], r['reminder_id'])
+                    sent_counts[key] = sent_counts.get(key, 0) + 1
+                for (reminder_type, reminder_id), count in sent_counts.items():
+                    table = self.NEXT_FIRE_TABLES.get(reminder_type)
+                    if not table:
+                        continue
+                    # جدول ریمایندرهای پیشرفته ستون last_sent ندارد
+                    touched = 'updated_at' if reminder_type == 'admin_advanced' else 'last_sent'
+                    cursor.execute(f'''
+                        UPDATE {table}
+                        SET {touched} = CURRENT_TIMESTAMP,
+                            total_sent = total_sent + ?
+                        WHERE id = ?
+                    ''', (count, reminder_id))
+
+                conn.commit()
+
+        except Exception as e:
+            logger.error(f"❌ خطا در ثبت نتیجه ارسال صف: {e}")
+
+    def reset_stale_outbox(self) -> int:
+        """برگرداندن پیام‌های نیمه‌کاره (sending) به صف بعد از ری‌استارت"""
+        try:
+            with self.connections.write() as conn:
+                cursor = conn.cursor()
+                cursor.execute("UPDATE outbox SET status = 'pending' WHERE status = 'sending'")
+                reset_count = cursor.rowcount
+                conn.commit()
+
+            if reset_count:
+                logger.info(f"♻️ {reset_count} پیام نیمه‌کاره به صف ارسال برگشت")
+            return reset_count
+
+        except Exception as e:
+            logger.error(f"❌ خطا در بازیابی صف ارسال: {e}")
+            return 0
+
+    # --- lease رهبری ---
+
+    def acquire_lease(self, name: str, holder: str, ttl: float) -> bool:
+        """
+        گرفتن یا تمدید lease (اتمیک): اگر lease مال همین holder باشد یا منقضی شده باشد
+        ثبت می‌شود و True برمی‌گردد؛ در غیر این صورت False.
+        """
+        now = time.time()
+        try:
+            with self.connections.write() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO scheduler_leases (name, holder, expires_at, acquired_at, heartbeat_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(name) DO UPDATE SET
+                        holder = excluded.holder,
+                        expires_at = excluded.expires_at,
+                        heartbeat_at = excluded.heartbeat_at,
+                        acquired_at = CASE WHEN scheduler_leases.holder = excluded.holder
+                                           THEN scheduler_leases.acquired_at
+                                           ELSE excluded.acquired_at END
+                    WHERE scheduler_leases.holder = excluded.holder
+                       OR scheduler_leases.expires_at < excluded.heartbeat_at
+                ''', (name, holder, now + ttl, now, now))
+                acquired = cursor.rowcount > 0
+                conn.commit()
+            return acquired
+
+        except Exception as e:
+            logger.error(f"❌ خطا در گرفتن lease {name}: {e}")
+            return False
+
+    def release_lease(self, name: str, holder: str) -> bool:
+        """آزاد کردن lease (فقط توسط holder فعلی) تا instance دیگر بلافاصله رهبر شود"""
+        try:
+            with self.connections.write() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "UPDATE scheduler_leases SET expires_at = 0 WHERE name = ? AND holder = ?",
+                    (name, holder)
+                )
+                released = cursor.rowcount > 0
+                conn.commit()
+            return released
+
+        except Exception as e:
+            logger.error(f"❌ خطا در آزاد کردن lease {name}: {e}")
+            return False
+
+    def get_lease(self, name: str) -> Optional[Dict[str, Any]]:
+        """وضعیت فعلی lease"""
+        try:
+            with self.connections.read() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT holder, expires_at, acquired_at, heartbeat_at FROM scheduler_leases WHERE name = ?",
+                    (name,)
+                )
+                row = cursor.fetchone()
+                if row is None:
+                    return None
+                return {
+                    'holder': row[0],
+                    'expires_at': row[1],
+                    'acquired_at': row[2],
+                    'heartbeat_at': row[3],
+                    'is_valid': row[1] > time.time()
+                }
+        except Exception as e:
+            logger.error(f"❌ خطا در دریافت lease {name}: {e}")
+            return None
+
+    def get_next_outbox_attempt(self) -> Optional[datetime]:
+        """زمان اولین پیام منتظر در صف (وقت تهران)"""
+        try:
+            with self.connections.read() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'")
+                row = cursor.fetchone()
+                return recurrence.from_utc_string(row[0]) if row and row[0] else None
+        except Exception as e:
+            logger.error(f"❌ خطا در دریافت زمان پیام بعدی صف: {e}")
+            return None
+
+    def get_outbox_stats(self) -> Dict[str, Any]:
+        """آمار صف ارسال بر اساس وضعیت"""
+        try:
+            with self.connections.read() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT status, COUNT(*) FROM outbox GROUP BY status')
+                stats = {'pending': 0, 'sending': 0, 'sent': 0, 'failed': 0}
+                stats.update({status: count for status, count in cursor.fetchall()})
+                return stats
+        except Exception as e:
+            logger.error(f"❌ خطا در دریافت آمار صف ارسال: {e}")
+            return {}
+
+    def cleanup_outbox(self, days_old: int = 7) -> int:
+        """پاک کردن پیام‌های ارسال‌شده/ناموفق قدیمی از صف"""
+        try:
+            with self.connections.write() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    DELETE FROM outbox
+                    WHERE status IN ('sent', 'failed')
+                    AND created_at < datetime('now', ?)
+                ''', (f'-{days_old} days',))
+                deleted_count = cursor.rowcount
+                cursor.execute('''
+                    DELETE FROM outbox_messages
+                    WHERE id NOT IN (SELECT message_id FROM outbox)
+                    AND created_at < datetime('now', ?)
+                ''', (f'-{days_old} days',))
+                conn.commit()
+
+            if deleted_count > 0:
+                logger.info(f"🧹 {deleted_count} پیام قدیمی از صف ارسال پاک شد")
+            return deleted_count
+
+        except Exception as e:
+            logger.error(f"❌ خطا در پاکسازی صف ارسال: {e}")
+            return 0
+
     def init_advanced_reminders_table(self):
         """ایجاد جدول ریمایندرهای پیشرفته"""
         query = """
@@ -2,6 +2,7 @@
 هندلرهای سیستم ریمایندر - نسخه کامل با تاریخ میلادی
 """
 import logging
+import re
 from datetime import datetime, timedelta
 from aiogram import F, types
 from aiogram.fsm.context import FSMContext
@@ -21,13 +22,16 @@ from reminder.reminder_keyboards import (
     create_back_only_menu,
     remove_menu
 )
-from reminder.reminder_database import reminder_db
+from utils.async_db import async_reminder_db
 from reminder.reminder_utils import validator, formatter, analyzer
 from utils.time_utils import get_current_persian_datetime, format_gregorian_date_for_display
 from exam_data import EXAMS_1405
 
 logger = logging.getLogger(__name__)
 
+# فرمت ساعت HH:MM
+TIME_PATTERN = re.compile(r'^([0-1]?[0-9]|2[0-3]):([0-5][0-9])$')
+
 # حالت‌های FSM برای ریمایندر کنکور
 class ExamReminderStates(StatesGroup):
     selecting_exams = State()
@@ -59,7 +63,7 @@ class ManagementStates(StatesGroup):
 # --- هندلرهای اصلی ریمایندر ---
 async def reminder_main_handler(message: types.Message):
     """منوی اصلی ریمایندر"""
-    user_stats = reminder_db.get_reminder_stats(message.from_user.id)
+    user_stats = await async_reminder_db.get_reminder_stats(message.from_user.id)
     
     await message.answer(
         "📅 <b>سیستم مدیریت یادآوری‌ها</b>\n\n"
@@ -252,10 +256,7 @@ async def process_time_input(message: types.Message, state: FSMContext):
     time_str = time_str.translate(persian_to_english)
     
     # اعتبارسنجی فرمت زمان
-    import re
-    time_pattern = re.compile(r'^([0-1]?[0-9]|2[0-3]):([0-5][0-9])$')
-    
-    if not time_pattern.match(time_str):
+    if not TIME_PATTERN.match(time_str):
         await message.answer(
             "❌ <b>فرمت زمان نامعتبر!</b>\n\n"
             "⚠️ <b>لطفاً فقط از اعداد انگلیسی استفاده کنید:</b>\n"
@@ -377,7 +378,7 @@ async def process_confirmation(message: types.Message, state: FSMContext):
         
         try:
             # ذخیره در دیتابیس
-            reminder_id = reminder_db.add_exam_reminder(
+            reminder_id = await async_reminder_db.add_exam_reminder(
                 user_id=message.from_user.id,
                 exam_keys=state_data['selected_exams'],
                 days_of_week=state_data['selected_days'],
@@ -672,10 +673,7 @@ async def process_personal_time_input(message: types.Message, state: FSMContext)
     time_str = time_str.translate(persian_to_english)
     
     # اعتبارسنجی فرمت زمان
-    import re
-    time_pattern = re.compile(r'^([0-1]?[0-9]|2[0-3]):([0-5][0-9])$')
-    
-    if not time_pattern.match(time_str):
+    if not TIME_PATTERN.match(time_str):
         await message.answer(
             "❌ <b>فرمت زمان نامعتبر!</b>\n\n"
             "لطفاً ساعت را به فرمت HH:MM وارد کنید:\n"
@@ -742,7 +740,7 @@ async def process_personal_confirmation(message: types.Message, state: FSMContex
         
         try:
             # ذخیره در دیتابیس
-            reminder_id = reminder_db.add_personal_reminder(
+            reminder_id = await async_reminder_db.add_personal_reminder(
                 user_id=message.from_user.id,
                 title=state_data['title'],
                 message=state_data['message'],
@@ -844,8 +842,8 @@ async def list_auto_reminders(message: types.Message):
 # --- هندلرهای مدیریت یادآوری ---
 async def manage_reminders_handler(message: types.Message):
     """منوی مدیریت یادآوری"""
-    user_reminders = reminder_db.get_user_exam_reminders(message.from_user.id)
-    personal_reminders = reminder_db.get_user_personal_reminders(message.from_user.id)
+    user_reminders = await async_reminder_db.get_user_exam_reminders(message.from_user.id)
+    personal_reminders = await async_reminder_db.get_user_personal_reminders(message.from_user.id)
     
     total_count = len(user_reminders) + len(personal_reminders)
     active_count = len([r for r in user_reminders + personal_reminders if r['is_active']])
@@ -868,8 +866,8 @@ async def manage_reminders_handler(message: types.Message):
 
 async def view_all_reminders(message: types.Message):
     """مشاهده همه یادآوری‌ها"""
-    user_reminders = reminder_db.get_user_exam_reminders(message.from_user.id)
-    personal_reminders = reminder_db.get_user_personal_reminders(message.from_user.id)
+    user_reminders = await async_reminder_db.get_user_exam_reminders(message.from_user.id)
+    personal_reminders = await async_reminder_db.get_user_personal_reminders(message.from_user.id)
     
     if not user_reminders and not personal_reminders:
         await message.answer(
@@ -970,8 +968,8 @@ async def edit_reminder_handler(message: types.Message):
 # --- هندلرهای مدیریت با عملکرد واقعی ---
 async def toggle_reminder_status(message: types.Message):
     """تغییر وضعیت فعال/غیرفعال کردن یادآوری"""
-    user_reminders = reminder_db.get_user_exam_reminders(message.from_user.id)
-    personal_reminders = reminder_db.get_user_personal_reminders(message.from_user.id)
+    user_reminders = await async_reminder_db.get_user_exam_reminders(message.from_user.id)
+    personal_reminders = await async_reminder_db.get_user_personal_reminders(message.from_user.id)
     all_reminders = user_reminders + personal_reminders
     
     if not all_reminders:
@@ -983,8 +981,6 @@ async def toggle_reminder_status(message: types.Message):
         return
     
     # ایجاد کیبورد اینلاین برای انتخاب ریمایندر
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    
     keyboard = []
     for reminder in all_reminders:
         reminder_type = 'exam' if 'exam_keys' in reminder else 'personal'
@@ -1011,8 +1007,8 @@ async def toggle_reminder_status(message: types.Message):
 
 async def delete_reminder_handler(message: types.Message):
     """حذف یادآوری"""
-    user_reminders = reminder_db.get_user_exam_reminders(message.from_user.id)
-    personal_reminders = reminder_db.get_user_personal_reminders(message.from_user.id)
+    user_reminders = await async_reminder_db.get_user_exam_reminders(message.from_user.id)
+    personal_reminders = await async_reminder_db.get_user_personal_reminders(message.from_user.id)
     all_reminders = user_reminders + personal_reminders
     
     if not all_reminders:
@@ -1024,8 +1020,6 @@ async def delete_reminder_handler(message: types.Message):
         return
     
     # ایجاد کیبورد اینلاین برای انتخاب ریمایندر
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    
     keyboard = []
     for reminder in all_reminders:
         reminder_type = 'exam' if 'exam_keys' in reminder else 'personal'
@@ -1070,7 +1064,7 @@ async def handle_reminder_management_callback(callback: types.CallbackQuery):
         _, reminder_type, reminder_id = data.split(":")
         reminder_id = int(reminder_id)
         
-        success = reminder_db.delete_reminder(reminder_type, reminder_id)
+        success = await async_reminder_db.delete_reminder(reminder_type, reminder_id)
         
         if success:
             await callback.answer("✅ یادآوری حذف شد")
@@ -1095,9 +1089,9 @@ async def handle_reminder_management_callback(callback: types.CallbackQuery):
         # دریافت وضعیت فعلی
         reminders = []
         if reminder_type == 'exam':
-            reminders = reminder_db.get_user_exam_reminders(callback.from_user.id)
+            reminders = await async_reminder_db.get_user_exam_reminders(callback.from_user.id)
         else:
-            reminders = reminder_db.get_user_personal_reminders(callback.from_user.id)
+            reminders = await async_reminder_db.get_user_personal_reminders(callback.from_user.id)
         
         current_reminder = next((r for r in reminders if r['id'] == reminder_id), None)
         if not current_reminder:
@@ -1105,7 +1099,7 @@ async def handle_reminder_management_callback(callback: types.CallbackQuery):
             return
         
         new_status = not current_reminder['is_active']
-        success = reminder_db.update_reminder_status(reminder_type, reminder_id, new_status)
+        success = await async_reminder_db.update_reminder_status(reminder_type, reminder_id, new_status)
         
         if success:
             status_text = "فعال" if new_status else "غیرفعال"
@@ -1161,9 +1155,9 @@ async def process_reminder_management(message: types.Message):
             is_active = text.startswith('فعال')
             
             # تشخیص نوع ریمایندر و به‌روزرسانی
-            success = reminder_db.update_reminder_status('exam', reminder_id, is_active)
+            success = await async_reminder_db.update_reminder_status('exam', reminder_id, is_active)
             if not success:
-                success = reminder_db.update_reminder_status('personal', reminder_id, is_active)
+                success = await async_reminder_db.update_reminder_status('personal', reminder_id, is_active)
             
             if success:
                 status_text = "فعال" if is_active else "غیرفعال"
@@ -1179,9 +1173,9 @@ async def process_reminder_management(message: types.Message):
             reminder_id = int(parts[1])
             
             # حذف ریمایندر
-            success = reminder_db.delete_reminder('exam', reminder_id)
+            success = await async_reminder_db.delete_reminder('exam', reminder_id)
             if not success:
-                success = reminder_db.delete_reminder('personal', reminder_id)
+                success = await async_reminder_db.delete_reminder('personal', reminder_id)
             
             if success:
                 await message.answer(f"✅ یادآوری {reminder_id} حذف شد")
@@ -2,7 +2,9 @@
 کیبوردهای ساده سیستم ریمایندر
 """
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove
+from utils.keyboard_registry import cached_keyboard
 
+@cached_keyboard
 def create_reminder_main_menu():
     """منوی اصلی ریمایندر"""
     return ReplyKeyboardMarkup(
@@ -17,6 +19,7 @@ def create_reminder_main_menu():
         input_field_placeholder="گزینه مورد نظر را انتخاب کنید..."
     )
 
+@cached_keyboard
 def create_exam_selection_menu():
     """منوی انتخاب کنکورها"""
     return ReplyKeyboardMarkup(
@@ -30,6 +33,7 @@ def create_exam_selection_menu():
         resize_keyboard=True
     )
 
+@cached_keyboard
 def create_days_selection_menu():
     """منوی انتخاب روزهای هفته"""
     return ReplyKeyboardMarkup(
@@ -44,6 +48,7 @@ def create_days_selection_menu():
         resize_keyboard=True
     )
 
+@cached_keyboard
 def create_time_input_menu():
     """منوی ورود ساعت دلخواه"""
     return ReplyKeyboardMarkup(
@@ -53,6 +58,7 @@ def create_time_input_menu():
         resize_keyboard=True
     )
 
+@cached_keyboard
 def create_date_input_menu():
     """منوی ورود تاریخ"""
     return ReplyKeyboardMarkup(
@@ -63,6 +69,7 @@ def create_date_input_menu():
         resize_keyboard=True
     )
 
+@cached_keyboard
 def create_repetition_type_menu():
     """منوی انتخاب نوع تکرار"""
     return ReplyKeyboardMarkup(
@@ -77,6 +84,7 @@ def create_repetition_type_menu():
         resize_keyboard=True
     )
 
+@cached_keyboard
 def create_confirmation_menu():
     """منوی تأیید نهایی"""
     return ReplyKeyboardMarkup(
@@ -89,6 +97,7 @@ def create_confirmation_menu():
         resize_keyboard=True
     )
 
+@cached_keyboard
 def create_management_menu():
     """منوی مدیریت یادآوری"""
     return ReplyKeyboardMarkup(
@@ -102,6 +111,7 @@ def create_management_menu():
         resize_keyboard=True
     )
 
+@cached_keyboard
 def create_auto_reminders_menu():
     """منوی یادآوری خودکار"""
     return ReplyKeyboardMarkup(
@@ -113,6 +123,7 @@ def create_auto_reminders_menu():
         resize_keyboard=True
     )
 
+@cached_keyboard
 def create_auto_reminders_user_menu():
     """منوی ریمایندرهای خودکار برای کاربران عادی"""
     return ReplyKeyboardMarkup(
@@ -124,6 +135,7 @@ def create_auto_reminders_user_menu():
         resize_keyboard=True
     )
 
+@cached_keyboard
 def create_auto_reminders_admin_menu():
     """منوی مدیریت ریمایندرهای خودکار برای ادمین"""
     return ReplyKeyboardMarkup(
@@ -137,6 +149,7 @@ def create_auto_reminders_admin_menu():
         resize_keyboard=True
     )
     
+@cached_keyboard
 def create_back_only_menu():
     """فقط دکمه بازگشت"""
     return ReplyKeyboardMarkup(
@@ -146,6 +159,7 @@ def create_back_only_menu():
         resize_keyboard=True
     )
 
+@cached_keyboard
 def remove_menu():
     """حذف منو"""
     return ReplyKeyboardRemove()
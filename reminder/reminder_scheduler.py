@@ -1,16 +1,18 @@
 """
 سیستم زمان‌بندی و ارسال ریمایندرها - نسخه کامل با تاریخ میلادی
 """
-import asyncio
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import List, Dict, Any, Optional
 import pytz
-import time
 
 from reminder.reminder_database import reminder_db
-from exam_data import EXAMS_1405
-from utils.time_utils import get_current_persian_datetime, format_time_remaining
+from reminder.reminder_utils import recurrence
+from reminder.timer_engine import timer_engine, TimerSource
+from reminder.smoothing import peak_smoother
+from exam_catalog import exam_catalog
+from utils.time_utils import get_current_persian_datetime
+from reminder.outbox_dispatcher import outbox_dispatcher
 
 logger = logging.getLogger(__name__)
 
@@ -21,7 +23,7 @@ class ReminderScheduler:
     def __init__(self, bot):
         self.bot = bot
         self.is_running = False
-        self.check_interval = 60  # چک هر ۱ دقیقه
+        self.check_interval = 60  # فقط برای چک دستی؛ زمان‌بندی توسط timer_engine انجام می‌شود
         self.last_check = None
         self.stats = {
             'total_checks': 0,
@@ -31,7 +33,7 @@ class ReminderScheduler:
         }
         
     async def start_scheduler(self):
-        """شروع سیستم زمان‌بندی"""
+        """شروع سیستم زمان‌بندی - ثبت ریمایندرهای کنکور و شخصی در موتور یکپارچه"""
         if self.is_running:
             logger.warning("⚠️ سیستم ریمایندر در حال اجراست")
             return
@@ -39,233 +41,95 @@ class ReminderScheduler:
         self.is_running = True
         logger.info("🚀 سیستم ریمایندر شروع به کار کرد")
         
-        # بارگذاری اولیه ریمایندرهای فعال
-        active_reminders = reminder_db.get_active_exam_reminders()
-        logger.info(f"📥 {len(active_reminders)} ریمایندر فعال بارگذاری شد")
-        
-        while self.is_running:
-            try:
-                await self.check_and_send_reminders()
-                self.stats['total_checks'] += 1
-                self.stats['last_successful_check'] = datetime.now(TEHRAN_TIMEZONE)
-                await asyncio.sleep(self.check_interval)
-                
-            except Exception as e:
-                self.stats['errors'] += 1
-                logger.error(f"خطا در سیستم ریمایندر: {e}")
-                await asyncio.sleep(10)  # وقفه کوتاه در صورت خطا
+        timer_engine.register_source(TimerSource(
+            'exam', reminder_db.get_active_exam_reminders,
+            peak_smoother.wrap(recurrence.next_exam_fire), self.fire_timer_reminder,
+            persist=self.persist_next_fire,
+            changes=reminder_db.changes,
+            load_one=lambda reminder_id: reminder_db.get_active_reminder('exam', reminder_id)
+        ))
+        timer_engine.register_source(TimerSource(
+            'personal', reminder_db.get_active_personal_reminders,
+            peak_smoother.wrap(recurrence.next_personal_fire), self.fire_timer_reminder,
+            persist=self.persist_next_fire,
+            changes=reminder_db.changes,
+            load_one=lambda reminder_id: reminder_db.get_active_reminder('personal', reminder_id)
+        ))
                 
-    async def stop_scheduler(self):
-        """توقف سیستم زمان‌بندی"""
-        self.is_running = False
-        logger.info("🛑 سیستم ریمایندر متوقف شد")
-        
-    async def check_and_send_reminders(self):
-        """چک و ارسال ریمایندرهای due"""
-        try:
-            now = datetime.now(TEHRAN_TIMEZONE)
-            current_time_str = now.strftime("%H:%M")
-            current_date_str = now.strftime("%Y-%m-%d")  # میلادی
-            current_weekday = now.weekday()  # 0=Monday, 6=Sunday
-            
-            self.last_check = now
-            
-            logger.debug(f"🔍 چک ریمایندرها - زمان: {current_time_str} - تاریخ میلادی: {current_date_str} - روز هفته: {current_weekday}")
-            
-            # دریافت ریمایندرهای due از دیتابیس - با تاریخ میلادی
-            due_reminders = reminder_db.get_due_reminders(
-                current_date_str, 
-                current_time_str, 
-                current_weekday
-            )
-            
-            if due_reminders:
-                logger.info(f"📤 پیدا شد {len(due_reminders)} ریمایندر برای ارسال")
-                
-                # ارسال موازی ریمایندرها
-                tasks = []
-                for reminder in due_reminders:
-                    task = asyncio.create_task(self.send_reminder(reminder))
-                    tasks.append(task)
-                
-                # منتظر تمام شدن همه ارسال‌ها بمان
-                results = await asyncio.gather(*tasks, return_exceptions=True)
-                
-                # بررسی نتایج
-                successful_sends = 0
-                for i, result in enumerate(results):
-                    if isinstance(result, Exception):
-                        logger.error(f"❌ خطا در ارسال ریمایندر {due_reminders[i]['id']}: {result}")
-                    else:
-                        successful_sends += 1
-                
-                self.stats['total_reminders_sent'] += successful_sends
-                logger.info(f"✅ {successful_sends} ریمایندر با موفقیت ارسال شد")
-                
-            else:
-                logger.debug("✅ هیچ ریمایندری برای ارسال پیدا نشد")
-                
-        except Exception as e:
-            self.stats['errors'] += 1
-            logger.error(f"خطا در چک ریمایندرها: {e}")
+    def persist_next_fire(self, reminder: Dict[str, Any], next_fire_at: Optional[datetime]):
+        """ذخیره زمان اجرای بعدی در ستون next_fire_at"""
+        reminder_db.set_next_fire_at(reminder['reminder_type'], reminder['id'], next_fire_at)
 
-    async def send_reminder(self, reminder: Dict[str, Any]):
-        """ارسال ریمایندر"""
-        start_time = time.time()
+    async def fire_timer_reminder(self, reminder: Dict[str, Any], fire_at: datetime):
+        """ثبت ریمایندری که موتور زمان‌بندی در زمان مقرر اجرا کرده است در صف ارسال"""
+        self.last_check = fire_at
+        queued = await self.enqueue_reminder(reminder, fire_at)
+        self.stats['total_checks'] += 1
+        self.stats['last_successful_check'] = datetime.now(TEHRAN_TIMEZONE)
+        if queued:
+            self.stats['total_reminders_sent'] += 1
+        
+    async def enqueue_reminder(self, reminder: Dict[str, Any], fire_at: datetime) -> int:
+        """ساخت پیام‌های ریمایندر و ثبت آن‌ها در صف پایدار ارسال"""
+        if reminder['reminder_type'] == 'exam':
+            parts = await self.build_exam_reminder_parts(reminder)
+        elif reminder['reminder_type'] == 'personal':
+            # در متن پیام ساعت انتخابی کاربر نمایش داده می‌شود نه زمان جابه‌جاشده
+            slot_at = peak_smoother.slot_time(reminder, fire_at)
+            parts = [(0, self.create_personal_reminder_message(reminder, slot_at), None)]
+        else:
+            logger.warning(f"⚠️ نوع ریمایندر نامعتبر: {reminder['reminder_type']}")
+            return 0
         
-        try:
-            user_id = reminder['user_id']
-            
-            if reminder['reminder_type'] == 'exam':
-                success = await self.send_exam_reminder(reminder)
-            elif reminder['reminder_type'] == 'personal':
-                success = await self.send_personal_reminder(reminder)
-            else:
-                logger.warning(f"⚠️ نوع ریمایندر نامعتبر: {reminder['reminder_type']}")
-                success = False
-            
-            delivery_time = int((time.time() - start_time) * 1000)  # میلی‌ثانیه
-            
-            if success:
-                # ثبت لاگ ارسال موفق
-                reminder_db.log_reminder_sent(
-                    user_id, reminder['id'], reminder['reminder_type'],
-                    status='sent', delivery_time_ms=delivery_time
-                )
-                logger.info(f"✅ ریمایندر {reminder['id']} برای کاربر {user_id} ارسال شد ({delivery_time}ms)")
-            else:
-                # ثبت لاگ ارسال ناموفق
-                reminder_db.log_reminder_sent(
-                    user_id, reminder['id'], reminder['reminder_type'],
-                    status='failed', error_message='ارسال ناموفق',
-                    delivery_time_ms=delivery_time
-                )
-                logger.warning(f"❌ ارسال ریمایندر {reminder['id']} برای کاربر {user_id} ناموفق بود")
-            
-            return success
-            
-        except Exception as e:
-            delivery_time = int((time.time() - start_time) * 1000)
-            reminder_db.log_reminder_sent(
-                reminder['user_id'], reminder['id'], reminder['reminder_type'],
-                status='failed', error_message=str(e),
-                delivery_time_ms=delivery_time
-            )
-            logger.error(f"❌ خطا در ارسال ریمایندر {reminder['id']}: {e}")
-            return False
+        return await outbox_dispatcher.enqueue(
+            reminder['reminder_type'], reminder['id'], fire_at, parts, [reminder['user_id']]
+        )
 
-    async def send_exam_reminder(self, reminder: Dict[str, Any]) -> bool:
-        """ارسال ریمایندر کنکور"""
-        try:
-            user_id = reminder['user_id']
-            sent_count = 0
-            
-            for exam_key in reminder['exam_keys']:
-                if exam_key in EXAMS_1405:
-                    exam = EXAMS_1405[exam_key]
-                    message = await self.create_exam_reminder_message(exam)
-                    
-                    await self.bot.send_message(
-                        chat_id=user_id,
-                        text=message,
-                        parse_mode="HTML"
-                    )
-                    sent_count += 1
-                    
-                    logger.debug(f"🎯 ریمایندر کنکور {exam['name']} برای کاربر {user_id} ارسال شد")
-            
-            return sent_count > 0
-            
-        except Exception as e:
-            logger.error(f"خطا در ارسال ریمایندر کنکور: {e}")
-            return False
+    async def build_exam_reminder_parts(self, reminder: Dict[str, Any]) -> List[tuple]:
+        """یک پیام برای هر کنکور ریمایندر (شماره بخش = جایگاه کنکور)"""
+        parts = []
+        for position, exam_key in enumerate(reminder['exam_keys']):
+            if exam_key in exam_catalog:
+                message = await self.create_exam_reminder_message(exam_key)
+                parts.append((position, message, None))
+        return parts
 
-    async def send_personal_reminder(self, reminder: Dict[str, Any]) -> bool:
-        """ارسال ریمایندر شخصی"""
-        try:
-            user_id = reminder['user_id']
-            
-            message = (
-                f"⏰ <b>یادآوری شخصی</b>\n\n"
-                f"📝 {reminder['title']}\n\n"
-                f"📄 {reminder['message']}\n\n"
-                f"🕒 <i>زمان یادآوری: {datetime.now(TEHRAN_TIMEZONE).strftime('%H:%M')}</i>\n"
-                f"💪 <b>موفق باشید!</b>"
-            )
-            
-            await self.bot.send_message(
-                chat_id=user_id,
-                text=message,
-                parse_mode="HTML"
-            )
-            
-            logger.debug(f"📝 ریمایندر شخصی برای کاربر {user_id} ارسال شد")
-            return True
-            
-        except Exception as e:
-            logger.error(f"خطا در ارسال ریمایندر شخصی: {e}")
-            return False
+    def create_personal_reminder_message(self, reminder: Dict[str, Any], fire_at: datetime) -> str:
+        """ایجاد پیام ریمایندر شخصی"""
+        return (
+            f"⏰ <b>یادآوری شخصی</b>\n\n"
+            f"📝 {reminder['title']}\n\n"
+            f"📄 {reminder['message']}\n\n"
+            f"🕒 <i>زمان یادآوری: {fire_at.astimezone(TEHRAN_TIMEZONE).strftime('%H:%M')}</i>\n"
+            f"💪 <b>موفق باشید!</b>"
+        )
 
-    async def create_exam_reminder_message(self, exam: Dict[str, Any]) -> str:
-        """ایجاد پیام ریمایندر کنکور"""
-        from datetime import datetime
-        
+    async def create_exam_reminder_message(self, exam_key: str) -> str:
+        """ایجاد پیام ریمایندر کنکور (زمان باقی‌مانده از کاتالوگ مشترک کنکورها)"""
         # اطلاعات زمان فعلی
         current_time = get_current_persian_datetime()
         
-        # محاسبه زمان باقی‌مانده - حل مشکل تایم‌زون
-        now = datetime.now(TEHRAN_TIMEZONE)  # مطمئن شو now هم aware هست
-        
-        dates = exam["date"] if isinstance(exam["date"], list) else [exam["date"]]
-        exam_dates = []
-        
-        for date_tuple in dates:
-            # ایجاد datetime با تایم‌زون تهران
-            if len(date_tuple) == 3:  # (year, month, day)
-                # استخراج ساعت از زمان آزمون
-                time_parts = exam["time"].split(":")
-                hour = int(time_parts[0])
-                minute = int(time_parts[1]) if len(time_parts) > 1 else 0
-                
-                exam_date = datetime(date_tuple[0], date_tuple[1], date_tuple[2], hour, minute, 0)
-                exam_date = TEHRAN_TIMEZONE.localize(exam_date)  # تبدیل به aware
-            else:
-                # اگر ساعت هم در تاریخ باشد
-                exam_date = datetime(*date_tuple)
-                exam_date = TEHRAN_TIMEZONE.localize(exam_date)  # تبدیل به aware
-                
-            exam_dates.append(exam_date)
-        
-        future_dates = [d for d in exam_dates if d > now]
-        
-        if not future_dates:
-            countdown_text = "✅ برگزار شده"
-            total_days = 0
-        else:
-            target = min(future_dates)
-            countdown_text, total_days = format_time_remaining(target)
+        exam = exam_catalog.get(exam_key)
+        countdown = exam_catalog.countdown(exam_key)
         
         # ساخت پیام
         message = (
             f"⏰ <b>یادآوری کنکور</b>\n\n"
-            f"📘 <b>{exam['name']}</b>\n"
-            f"📅 تاریخ: {exam['persian_date']}\n"
-            f"🕒 ساعت: {exam['time']}\n\n"
-            f"{countdown_text}\n"
-            f"📆 تعداد روزهای باقی‌مانده: {total_days} روز\n\n"
+            f"📘 <b>{exam.name}</b>\n"
+            f"📅 تاریخ: {exam.persian_date}\n"
+            f"🕒 ساعت: {exam.time}\n\n"
+            f"{countdown.text}\n"
+            f"📆 تعداد روزهای باقی‌مانده: {countdown.total_days} روز\n\n"
             f"🕒 <i>زمان یادآوری: {current_time['full_time']}</i>\n"
             f"💪 <b>موفق باشید!</b>"
         )
         
-        return message    
-    
-
+        return message
 
     async def send_test_reminder_now(self, user_id: int):
         """ارسال ریمایندر تستی فوری"""
         try:
-            test_exam = EXAMS_1405["ریاضی_فنی"]
-            message = await self.create_exam_reminder_message(test_exam)
+            message = await self.create_exam_reminder_message("ریاضی_فنی")
             
             await self.bot.send_message(
                 chat_id=user_id,
@@ -280,75 +144,6 @@ class ReminderScheduler:
             logger.error(f"خطا در ارسال ریمایندر تستی: {e}")
             return False
 
-    async def send_bulk_reminders(self, user_ids: List[int], message: str):
-        """ارسال ریمایندر به چند کاربر"""
-        successful_sends = 0
-        failed_sends = 0
-        
-        for user_id in user_ids:
-            try:
-                await self.bot.send_message(
-                    chat_id=user_id,
-                    text=message,
-                    parse_mode="HTML"
-                )
-                successful_sends += 1
-                logger.debug(f"✅ ریمایندر گروهی برای کاربر {user_id} ارسال شد")
-                
-                # وقفه کوتاه برای جلوگیری از محدودیت تلگرام
-                await asyncio.sleep(0.1)
-                
-            except Exception as e:
-                failed_sends += 1
-                logger.error(f"❌ خطا در ارسال ریمایندر گروهی به کاربر {user_id}: {e}")
-        
-        logger.info(f"📤 ارسال گروهی کامل: {successful_sends} موفق, {failed_sends} ناموفق")
-        return successful_sends, failed_sends
-
-    def get_scheduler_stats(self) -> Dict[str, Any]:
-        """دریافت آمار سیستم زمان‌بندی"""
-        db_stats = reminder_db.get_reminder_stats()
-        
-        stats = {
-            'scheduler_running': self.is_running,
-            'total_checks': self.stats['total_checks'],
-            'total_reminders_sent': self.stats['total_reminders_sent'],
-            'errors': self.stats['errors'],
-            'last_check': self.last_check,
-            'last_successful_check': self.stats['last_successful_check'],
-            'check_interval': self.check_interval
-        }
-        
-        # ترکیب با آمار دیتابیس
-        stats.update(db_stats)
-        return stats
-
-    async def health_check(self) -> Dict[str, Any]:
-        """بررسی سلامت سیستم"""
-        try:
-            # تست اتصال به دیتابیس
-            test_reminders = reminder_db.get_active_exam_reminders()
-            db_healthy = True
-            
-            # تست ارسال (اگر ربات متصل است)
-            bot_healthy = await self.bot.get_me()
-            
-            return {
-                'status': 'healthy',
-                'database': 'connected' if db_healthy else 'disconnected',
-                'bot': 'connected' if bot_healthy else 'disconnected',
-                'active_reminders': len(test_reminders),
-                'scheduler_running': self.is_running,
-                'last_check': self.last_check
-            }
-            
-        except Exception as e:
-            return {
-                'status': 'unhealthy',
-                'error': str(e),
-                'scheduler_running': self.is_running
-            }
-
 # ایجاد instance اصلی
 reminder_scheduler = None
 
@@ -8,11 +8,16 @@ from typing import List, Dict, Any, Optional
 import re
 import pytz
 
+from reminder.smoothing import SMOOTHED_TYPES, peak_smoother
+
 logger = logging.getLogger(__name__)
 
 # تنظیم تایم‌زون تهران
 TEHRAN_TIMEZONE = pytz.timezone('Asia/Tehran')
 
+# ساعت ارسال ریمایندرهای خودکار در روز هدف
+AUTO_REMINDER_SEND_TIME = "08:00"
+
 class ReminderValidator:
     """کلاس اعتبارسنجی داده‌های ریمایندر"""
     
@@ -162,6 +167,167 @@ class TimeConverter:
         persian_time = ''.join(english_to_persian.get(char, char) for char in english_time)
         return persian_time
 
+class ReminderRecurrence:
+    """محاسبه زمان اجرای بعدی ریمایندرها (همه زمان‌ها به وقت تهران)"""
+
+    @staticmethod
+    def parse_time(time_str: str) -> Optional[int]:
+        """تبدیل 'HH:MM' (فارسی یا انگلیسی) به دقیقه از ابتدای روز"""
+        try:
+            hour, minute = TimeConverter.persian_to_english_time(str(time_str)).strip().split(":")[:2]
+            hour, minute = int(hour), int(minute)
+            if 0 <= hour <= 23 and 0 <= minute <= 59:
+                return hour * 60 + minute
+        except (ValueError, AttributeError):
+            pass
+        return None
+
+    @staticmethod
+    def parse_date(date_str: Optional[str]):
+        """تبدیل تاریخ میلادی 'YYYY-MM-DD' به date"""
+        if not date_str:
+            return None
+        try:
+            return datetime.strptime(str(date_str)[:10], "%Y-%m-%d").date()
+        except ValueError:
+            return None
+
+    @staticmethod
+    def localize(day, minute_of_day: int) -> datetime:
+        """ساخت datetime آگاه از تایم‌زون تهران برای یک روز و دقیقه مشخص"""
+        naive = datetime(day.year, day.month, day.day, minute_of_day // 60, minute_of_day % 60)
+        return TEHRAN_TIMEZONE.localize(naive)
+
+    @staticmethod
+    def next_weekly_fire(after: datetime, weekdays: List[int], minutes: List[int],
+                         start_date=None, end_date=None) -> Optional[datetime]:
+        """اولین زمان بعد از after که روز هفته و دقیقه‌اش در لیست باشد"""
+        if not weekdays or not minutes:
+            return None
+
+        after_local = after.astimezone(TEHRAN_TIMEZONE)
+        day = after_local.date()
+        if start_date and start_date > day:
+            day = start_date
+
+        allowed_days = set(weekdays)
+        sorted_minutes = sorted(set(minutes))
+
+        # یک هفته و یک روز برای پیدا کردن اولین تطابق کافی است
+        for offset in range(8):
+            candidate_day = day + timedelta(days=offset)
+            if end_date and candidate_day > end_date:
+                return None
+            if candidate_day.weekday() not in allowed_days:
+                continue
+            for minute in sorted_minutes:
+                candidate = ReminderRecurrence.localize(candidate_day, minute)
+                if candidate > after_local:
+                    return candidate
+        return None
+
+    @staticmethod
+    def next_exam_fire(reminder: Dict[str, Any], after: datetime) -> Optional[datetime]:
+        """زمان اجرای بعدی ریمایندر کنکور"""
+        minutes = [m for m in (ReminderRecurrence.parse_time(t) for t in reminder.get('specific_times', [])) if m is not None]
+        return ReminderRecurrence.next_weekly_fire(
+            after,
+            reminder.get('days_of_week', []),
+            minutes,
+            ReminderRecurrence.parse_date(reminder.get('start_date')),
+            ReminderRecurrence.parse_date(reminder.get('end_date'))
+        )
+
+    @staticmethod
+    def next_personal_fire(reminder: Dict[str, Any], after: datetime) -> Optional[datetime]:
+        """زمان اجرای بعدی ریمایندر شخصی (هر روز در ساعت مشخص، در بازه تاریخ)"""
+        minute = ReminderRecurrence.parse_time(reminder.get('specific_time', ''))
+        if minute is None:
+            return None
+        return ReminderRecurrence.next_weekly_fire(
+            after,
+            list(range(7)),
+            [minute],
+            ReminderRecurrence.parse_date(reminder.get('start_date')),
+            ReminderRecurrence.parse_date(reminder.get('end_date'))
+        )
+
+    @staticmethod
+    def next_advanced_fire(reminder: Dict[str, Any], after: datetime) -> Optional[datetime]:
+        """زمان اجرای بعدی ریمایندر پیشرفته (هر دقیقه بین ساعت شروع و پایان)"""
+        start_minute = ReminderRecurrence.parse_time(reminder.get('start_time', ''))
+        end_minute = ReminderRecurrence.parse_time(reminder.get('end_time', ''))
+        if start_minute is None or end_minute is None or end_minute < start_minute:
+            return None
+        return ReminderRecurrence.next_weekly_fire(
+            after,
+            reminder.get('days_of_week', []),
+            list(range(start_minute, end_minute + 1)),
+            ReminderRecurrence.parse_date(reminder.get('start_date')),
+            ReminderRecurrence.parse_date(reminder.get('end_date'))
+        )
+
+    @staticmethod
+    def auto_fire_times(reminder: Dict[str, Any], exams_data: Dict, send_time: str = AUTO_REMINDER_SEND_TIME) -> Dict[str, datetime]:
+        """زمان ارسال ریمایندر خودکار برای هر کنکور (days_before_exam روز قبل از اولین تاریخ کنکور)"""
+        send_minute = ReminderRecurrence.parse_time(send_time) or 0
+        fire_times = {}
+
+        for exam_key in reminder.get('exam_keys', []):
+            exam = exams_data.get(exam_key)
+            if not exam:
+                continue
+            dates = exam["date"] if isinstance(exam["date"], list) else [exam["date"]]
+            first_date = dates[0]
+            exam_day = datetime(first_date[0], first_date[1], first_date[2]).date()
+            target_day = exam_day - timedelta(days=reminder.get('days_before_exam', 0))
+            fire_times[exam_key] = ReminderRecurrence.localize(target_day, send_minute)
+
+        return fire_times
+
+    @staticmethod
+    def next_auto_fire(reminder: Dict[str, Any], after: datetime, exams_data: Dict,
+                       send_time: str = AUTO_REMINDER_SEND_TIME) -> Optional[datetime]:
+        """زمان اجرای بعدی ریمایندر خودکار"""
+        upcoming = [
+            fire_at for fire_at in ReminderRecurrence.auto_fire_times(reminder, exams_data, send_time).values()
+            if fire_at > after
+        ]
+        return min(upcoming) if upcoming else None
+
+    @staticmethod
+    def next_fire(reminder_type: str, reminder: Dict[str, Any], after: datetime) -> Optional[datetime]:
+        """زمان اجرای بعدی بر اساس نوع ریمایندر (exam / personal / admin_advanced)"""
+        calculators = {
+            'exam': ReminderRecurrence.next_exam_fire,
+            'personal': ReminderRecurrence.next_personal_fire,
+            'admin_advanced': ReminderRecurrence.next_advanced_fire
+        }
+        calculator = calculators.get(reminder_type)
+        if calculator is None or not reminder.get('is_active', True):
+            return None
+        if reminder_type in SMOOTHED_TYPES:
+            calculator = peak_smoother.wrap(calculator)
+        return calculator(reminder, after)
+
+    @staticmethod
+    def to_utc_string(value: Optional[datetime]) -> Optional[str]:
+        """تبدیل datetime به رشته UTC قابل مقایسه در SQLite ('YYYY-MM-DD HH:MM:SS')"""
+        if value is None:
+            return None
+        return value.astimezone(pytz.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+    @staticmethod
+    def from_utc_string(value: Optional[str]) -> Optional[datetime]:
+        """تبدیل رشته UTC ذخیره‌شده به datetime به وقت تهران"""
+        if not value:
+            return None
+        try:
+            naive = datetime.strptime(str(value)[:19], "%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            return None
+        return pytz.utc.localize(naive).astimezone(TEHRAN_TIMEZONE)
+
 class ReminderAnalyzer:
     """کلاس تحلیل و آمار ریمایندرها"""
     
@@ -199,4 +365,5 @@ def setup_reminder_system(bot):
 validator = ReminderValidator()
 formatter = ReminderFormatter()
 time_converter = TimeConverter()
+recurrence = ReminderRecurrence()
 analyzer = ReminderAnalyzer()
@@ -0,0 +1,95 @@
+"""
+پخش بار ریمایندرهای ساعت‌های رند - انتخابگر زمان فقط ساعت‌های ثابت (۸:۰۰، ۱۰:۰۰ ...) دارد
+و بیشتر ریمایندرها در یک دقیقه جمع می‌شوند. با این سیاست زمان اجرای هر کاربر یک
+جابه‌جایی ثابت (بر اساس user_id) در بازه ±N دقیقه دارد؛ پس همه ریمایندرهای یک کاربر
+با هم جابه‌جا می‌شوند (و در حالت خلاصه هنوز یک پیام هستند) و کل بار در پنجره پخش می‌شود.
+
+شبیه‌سازی صف ارسال یک ساعت شلوغ:
+    python -m reminder.smoothing
+"""
+import hashlib
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from config import PEAK_SMOOTHING_MINUTES
+
+# ریمایندرهای تک‌کاربره که زمانشان از انتخابگر ساعت‌های ثابت می‌آید
+SMOOTHED_TYPES = ('exam', 'personal')
+
+
+class PeakSmoother:
+    """جابه‌جایی قطعی هر کاربر در بازه [-window, +window] و اعمال آن روی محاسبه زمان بعدی"""
+
+    def __init__(self, window_minutes: float = PEAK_SMOOTHING_MINUTES):
+        self.window_seconds = int(window_minutes * 60)
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_seconds > 0
+
+    def offset(self, user_id: int) -> timedelta:
+        """جابه‌جایی ثابت کاربر (بین اجراها و ری‌استارت‌ها یکسان است)"""
+        if not self.enabled:
+            return timedelta(0)
+        digest = hashlib.blake2b(str(user_id).encode(), digest_size=8).digest()
+        span = 2 * self.window_seconds + 1
+        return timedelta(seconds=int.from_bytes(digest, 'big') % span - self.window_seconds)
+
+    def wrap(self, next_fire: Callable[[Dict[str, Any], datetime], Optional[datetime]]
+             ) -> Callable[[Dict[str, Any], datetime], Optional[datetime]]:
+        """
+        تبدیل تابع زمان بعدی یک منبع ریمایندر به نسخه جابه‌جاشده:
+        نوبت اصلی بعد از (after - offset) پیدا و offset به آن اضافه می‌شود.
+        """
+        def smoothed(reminder: Dict[str, Any], after: datetime) -> Optional[datetime]:
+            if not self.enabled:
+                return next_fire(reminder, after)
+            offset = self.offset(reminder['user_id'])
+            slot = next_fire(reminder, after - offset)
+            return slot + offset if slot is not None else None
+        return smoothed
+
+    def slot_time(self, reminder: Dict[str, Any], fire_at: datetime) -> datetime:
+        """زمان اصلی انتخاب‌شده توسط کاربر (برای نمایش در متن پیام)"""
+        return fire_at - self.offset(reminder['user_id'])
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'window_minutes': self.window_seconds / 60
+        }
+
+
+def simulate_slot(user_ids: List[int], smoother: PeakSmoother, rate: float = 25) -> Dict[str, Any]:
+    """
+    صف ارسال یک ساعت شلوغ: هر کاربر یک پیام در زمان (ساعت + جابه‌جایی)،
+    ارسال با حداکثر rate پیام در ثانیه. خروجی: بیشترین ورودی در یک ثانیه و بیشترین تاخیر صف
+    """
+    arrivals: Dict[int, int] = {}
+    for user_id in user_ids:
+        second = int(smoother.offset(user_id).total_seconds())
+        arrivals[second] = arrivals.get(second, 0) + 1
+
+    backlog = 0.0
+    max_delay = 0.0
+    for second in range(min(arrivals), max(arrivals) + 1):
+        backlog += arrivals.get(second, 0)
+        max_delay = max(max_delay, backlog / rate)
+        backlog = max(0.0, backlog - rate)
+    return {
+        'peak_per_second': max(arrivals.values()),
+        'max_queue_delay_s': round(max_delay, 1)
+    }
+
+
+# ایجاد instance اصلی
+peak_smoother = PeakSmoother()
+
+
+if __name__ == "__main__":
+    users = [5_000_000_000 + i * 7919 for i in range(5000)]
+    print("۵۰۰۰ ریمایندر ساعت ۸:۰۰ - محدودیت ۲۵ پیام در ثانیه")
+    for minutes in (0, 1, 3, 5, 10):
+        result = simulate_slot(users, PeakSmoother(minutes))
+        print(f"±{minutes:>2} دقیقه: بیشترین ورودی {result['peak_per_second']:>5} پیام/ثانیه - "
+              f"بیشترین انتظار در صف {result['max_queue_delay_s']:>6} ثانیه")
@@ -0,0 +1,396 @@
+"""
+موتور زمان‌بندی یکپارچه ریمایندرها - min-heap بر اساس زمان اجرای بعدی
+"""
+import asyncio
+import heapq
+import logging
+import itertools
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import pytz
+
+from reminder.change_log import ChangeLog
+from reminder.reminder_utils import recurrence
+from utils.async_db import db_executor, run_in_db_thread
+from utils.metrics import SCHEDULER_FIRE_SECONDS, SCHEDULER_LAG_SECONDS, SCHEDULER_TICK_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# تنظیم تایم‌زون تهران
+TEHRAN_TIMEZONE = pytz.timezone('Asia/Tehran')
+
+
+class TimerSource:
+    """یک منبع ریمایندر که در موتور زمان‌بندی ثبت می‌شود"""
+
+    def __init__(self, kind: str,
+                 load: Callable[[], Iterable[Dict[str, Any]]],
+                 next_fire: Callable[[Dict[str, Any], datetime], Optional[datetime]],
+                 fire: Callable[[Dict[str, Any], datetime], Any],
+                 persist: Optional[Callable[[Dict[str, Any], Optional[datetime]], None]] = None,
+                 changes: Optional[ChangeLog] = None,
+                 load_one: Optional[Callable[[Any], Optional[Dict[str, Any]]]] = None):
+        self.kind = kind
+        self.load = load            # دریافت ریمایندرهای فعال از دیتابیس
+        self.next_fire = next_fire  # محاسبه زمان اجرای بعدی بعد از یک لحظه مشخص
+        self.fire = fire            # coroutine ارسال ریمایندر
+        self.persist = persist      # ذخیره next_fire_at جدید در دیتابیس بعد از هر اجرا
+        self.changes = changes      # جدول تغییرات دیتابیس (تغییرات instanceهای دیگر با poll آن دیده می‌شود)
+        self.load_one = load_one    # دریافت یک ریمایندر فعال با شناسه (None = حذف/غیرفعال) برای بارگذاری تکی
+
+
+class TimerEngine:
+    """
+    به جای چند حلقه polling، همه ریمایندرها یک‌بار بارگذاری می‌شوند و
+    موتور دقیقاً تا زمان اولین ریمایندر due می‌خوابد.
+    """
+
+    def __init__(self, resync_interval: int = 6 * 3600, catch_up_window: int = 300,
+                 change_poll_interval: float = 5):
+        self.resync_interval = resync_interval  # همگام‌سازی کامل دوره‌ای برای تغییرات خارج از ربات
+        self.catch_up_window = catch_up_window  # ریمایندرهای جامانده (مثلا هنگام ری‌استارت) تا این چند ثانیه هنوز ارسال می‌شوند
+        # تغییرات ثبت‌شده روی instanceهای دیگر (که callback آن‌ها به این پروسه نمی‌رسد) هر چند ثانیه poll می‌شوند
+        self.change_poll_interval = change_poll_interval
+        self._versions: Dict[str, Any] = {}
+        self._last_poll = 0.0
+        self.is_running = False
+        self._sources: Dict[str, TimerSource] = {}
+        self._heap: List[Tuple[float, int, str, Any]] = []
+        self._entries: Dict[Tuple[str, Any], Tuple[int, Dict[str, Any]]] = {}
+        self._in_flight: Dict[Tuple[str, Any], asyncio.Task] = {}
+        self._dirty: set = set()
+        self._dirty_ids: Dict[str, set] = {}
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._last_resync: Optional[datetime] = None
+        self.stats = {
+            'total_fired': 0,
+            'total_skipped': 0,
+            'total_reloads': 0,
+            'item_reloads': 0,
+            'last_fire': None,
+            'last_lag_ms': 0,
+            'remote_changes': 0,
+            'errors': 0
+        }
+
+    # --- ثبت منابع ---
+
+    def register_source(self, source: TimerSource):
+        """ثبت یک نوع ریمایندر در موتور"""
+        self._sources[source.kind] = source
+        self.notify_changed(source.kind)
+        logger.info(f"🧩 منبع ریمایندر '{source.kind}' در موتور زمان‌بندی ثبت شد")
+
+    def unregister_source(self, kind: str):
+        """حذف یک نوع ریمایندر از موتور"""
+        self._sources.pop(kind, None)
+        self._drop_kind(kind)
+
+    def notify_changed(self, kind: Optional[str] = None, reminder_id: Any = None):
+        """
+        اعلام تغییر در دیتابیس - با reminder_id فقط همان ریمایندر دوباره بارگذاری می‌شود،
+        بدون آن همه ریمایندرهای این نوع
+        """
+        if kind is not None and reminder_id is not None:
+            self._dirty_ids.setdefault(kind, set()).add(reminder_id)
+        else:
+            self._dirty.add(kind or '*')
+        if self._loop is not None and self._wakeup is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._wakeup.set)
+            except RuntimeError:
+                # حلقه بسته شده است
+                pass
+
+    # --- مدیریت heap ---
+
+    def _drop_kind(self, kind: str):
+        """حذف همه ورودی‌های یک نوع (ورودی‌های heap به صورت lazy نادیده گرفته می‌شوند)"""
+        for key in [k for k in self._entries if k[0] == kind]:
+            del self._entries[key]
+
+    def _schedule(self, kind: str, item: Dict[str, Any], after: datetime,
+                  fire_at: Optional[datetime] = None, persist: bool = False):
+        """محاسبه زمان اجرای بعدی (یا استفاده از زمان ذخیره‌شده) و افزودن به heap"""
+        source = self._sources.get(kind)
+        key = (kind, item['id'])
+        if source is None:
+            return
+
+        if fire_at is None:
+            try:
+                fire_at = source.next_fire(item, after)
+            except Exception as e:
+                logger.error(f"❌ خطا در محاسبه زمان بعدی ریمایندر {kind}:{item.get('id')}: {e}")
+                fire_at = None
+
+            if persist and source.persist is not None:
+                # نوشتن در دیتابیس روی thread دیتابیس انجام می‌شود تا حلقه زمان‌بندی منتظر نماند
+                self._loop.run_in_executor(db_executor, self._persist, source, item, fire_at)
+
+        if fire_at is None:
+            self._entries.pop(key, None)
+            return
+
+        seq = next(self._seq)
+        self._entries[key] = (seq, item)
+        heapq.heappush(self._heap, (fire_at.timestamp(), seq, kind, item['id']))
+
+    def _persist(self, source: TimerSource, item: Dict[str, Any], fire_at: Optional[datetime]):
+        """ذخیره next_fire_at (روی thread دیتابیس)"""
+        try:
+            source.persist(item, fire_at)
+        except Exception as e:
+            logger.error(f"❌ خطا در ذخیره زمان بعدی ریمایندر {source.kind}:{item.get('id')}: {e}")
+
+    def _stored_fire_at(self, item: Dict[str, Any], now: datetime) -> Optional[datetime]:
+        """زمان ذخیره‌شده next_fire_at اگر هنوز معتبر باشد"""
+        stored = item.get('next_fire_at')
+        if isinstance(stored, str):
+            stored = recurrence.from_utc_string(stored)
+        if stored is None:
+            return None
+        if (now - stored).total_seconds() > self.catch_up_window:
+            return None
+        return stored
+
+    async def _reload(self, kinds: Iterable[str]):
+        """بارگذاری مجدد ریمایندرهای فعال از دیتابیس"""
+        now = datetime.now(TEHRAN_TIMEZONE)
+        for kind in kinds:
+            source = self._sources.get(kind)
+            if source is None:
+                continue
+            self._drop_kind(kind)
+            try:
+                if source.changes is not None:
+                    # شماره آخرین تغییر قبل از بارگذاری خوانده می‌شود تا تغییر هم‌زمان از دست نرود
+                    self._versions[kind] = await run_in_db_thread(source.changes.latest)
+                items = list(await run_in_db_thread(source.load))
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error(f"❌ خطا در بارگذاری ریمایندرهای {kind}: {e}")
+                continue
+            for item in items:
+                self._schedule(kind, item, now, fire_at=self._stored_fire_at(item, now))
+            logger.info(f"📥 {len(items)} ریمایندر '{kind}' در موتور زمان‌بندی بارگذاری شد")
+
+        self.stats['total_reloads'] += 1
+        # فشرده‌سازی heap از ورودی‌های منسوخ
+        if len(self._heap) > 2 * max(len(self._entries), 64):
+            self._heap = [
+                entry for entry in self._heap
+                if self._entries.get((entry[2], entry[3]), (None,))[0] == entry[1]
+            ]
+            heapq.heapify(self._heap)
+
+    async def _reload_items(self, kind: str, reminder_ids: Iterable[Any]):
+        """بارگذاری مجدد چند ریمایندر مشخص (بقیه ورودی‌های heap دست نمی‌خورند)"""
+        source = self._sources.get(kind)
+        if source is None:
+            return
+        reminder_ids = list(reminder_ids)
+        try:
+            items = await run_in_db_thread(
+                lambda: [(reminder_id, source.load_one(reminder_id)) for reminder_id in reminder_ids]
+            )
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error(f"❌ خطا در بارگذاری ریمایندرهای {kind} {reminder_ids}: {e}")
+            return
+
+        now = datetime.now(TEHRAN_TIMEZONE)
+        for reminder_id, item in items:
+            # ریمایندر حذف یا غیرفعال‌شده فقط از heap کنار می‌رود
+            self._entries.pop((kind, reminder_id), None)
+            if item is not None:
+                self._schedule(kind, item, now, fire_at=self._stored_fire_at(item, now))
+        self.stats['item_reloads'] += len(items)
+
+    async def _poll_changes(self):
+        """خواندن تغییرات ثبت‌شده بعد از آخرین poll هر منبع (از جمله تغییرات instanceهای دیگر)"""
+        self._last_poll = time.monotonic()
+        for kind, source in list(self._sources.items()):
+            if source.changes is None or kind not in self._versions:
+                continue
+            try:
+                latest, reminder_ids = await run_in_db_thread(source.changes.since, kind, self._versions[kind])
+            except Exception as e:
+                logger.error(f"❌ خطا در خواندن تغییرات {kind}: {e}")
+                continue
+            self._versions[kind] = latest
+            if reminder_ids is None:
+                self.stats['remote_changes'] += 1
+                self._dirty.add(kind)
+            elif reminder_ids:
+                # تغییرات همین پروسه هم اینجا دوباره دیده می‌شوند؛ هزینه‌اش فقط خواندن همان ردیف‌هاست
+                self.stats['remote_changes'] += len(reminder_ids)
+                self._dirty_ids.setdefault(kind, set()).update(reminder_ids)
+
+    async def _apply_pending_reloads(self):
+        """اعمال تغییرات اعلام‌شده"""
+        now = datetime.now(TEHRAN_TIMEZONE)
+        if self._last_resync is None or (now - self._last_resync).total_seconds() >= self.resync_interval:
+            self._dirty.add('*')
+        elif time.monotonic() - self._last_poll >= self.change_poll_interval:
+            await self._poll_changes()
+
+        if not self._dirty and not self._dirty_ids:
+            return
+
+        dirty, self._dirty = self._dirty, set()
+        dirty_ids, self._dirty_ids = self._dirty_ids, {}
+        if '*' in dirty:
+            self._last_resync = now
+            dirty = set(self._sources)
+        for kind in dirty_ids:
+            source = self._sources.get(kind)
+            if source is not None and source.load_one is None:
+                dirty.add(kind)
+        if dirty:
+            await self._reload(dirty)
+        for kind, reminder_ids in dirty_ids.items():
+            if kind not in dirty:
+                await self._reload_items(kind, reminder_ids)
+
+    def _peek(self) -> Optional[Tuple[float, int, str, Any]]:
+        """اولین ورودی معتبر heap"""
+        while self._heap:
+            entry = self._heap[0]
+            current = self._entries.get((entry[2], entry[3]))
+            if current is not None and current[0] == entry[1]:
+                return entry
+            heapq.heappop(self._heap)
+        return None
+
+    def seconds_until_next(self) -> Optional[float]:
+        """ثانیه‌های باقی‌مانده تا اولین ریمایندر due"""
+        entry = self._peek()
+        if entry is None:
+            return None
+        return max(0.0, entry[0] - datetime.now(TEHRAN_TIMEZONE).timestamp())
+
+    # --- حلقه اصلی ---
+
+    async def start(self):
+        """شروع موتور زمان‌بندی (فراخوانی‌های بعدی بی‌اثر هستند)"""
+        if self.is_running:
+            return
+
+        self.is_running = True
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        # بعد از توقف (مثلا از دست رفتن رهبری) heap ممکن است کهنه باشد
+        self._last_resync = None
+        self._versions.clear()
+        logger.info("🚀 موتور زمان‌بندی یکپارچه ریمایندرها شروع به کار کرد")
+
+        while self.is_running:
+            try:
+                await self._apply_pending_reloads()
+
+                delay = self.seconds_until_next()
+                until_resync = self.resync_interval - (
+                    datetime.now(TEHRAN_TIMEZONE) - self._last_resync
+                ).total_seconds()
+                delay = until_resync if delay is None else min(delay, until_resync)
+                delay = min(delay, self.change_poll_interval)
+
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    self._wakeup.clear()
+
+                with SCHEDULER_TICK_SECONDS.time():
+                    self._fire_due()
+
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error(f"❌ خطا در موتور زمان‌بندی: {e}")
+                await asyncio.sleep(1)
+
+    async def stop(self):
+        """توقف موتور زمان‌بندی"""
+        self.is_running = False
+        if self._wakeup is not None:
+            self._wakeup.set()
+        logger.info("🛑 موتور زمان‌بندی یکپارچه متوقف شد")
+
+    def _fire_due(self):
+        """اجرای همه ریمایندرهایی که زمانشان رسیده"""
+        now = datetime.now(TEHRAN_TIMEZONE)
+        now_ts = now.timestamp()
+
+        while True:
+            entry = self._peek()
+            if entry is None or entry[0] > now_ts:
+                break
+
+            heapq.heappop(self._heap)
+            fire_ts, _, kind, reminder_id = entry
+            key = (kind, reminder_id)
+            _, item = self._entries[key]
+            fire_at = datetime.fromtimestamp(fire_ts, TEHRAN_TIMEZONE)
+
+            previous = self._in_flight.get(key)
+            if previous is not None and not previous.done():
+                # ارسال قبلی همین ریمایندر هنوز تمام نشده؛ این نوبت ادغام می‌شود
+                self.stats['total_skipped'] += 1
+                logger.warning(f"⚠️ ارسال قبلی ریمایندر {kind}:{reminder_id} هنوز در جریان است")
+            else:
+                self._in_flight[key] = asyncio.create_task(self._dispatch(kind, item, fire_at))
+                self.stats['total_fired'] += 1
+                self.stats['last_fire'] = now
+                self.stats['last_lag_ms'] = int((now_ts - fire_ts) * 1000)
+                SCHEDULER_LAG_SECONDS.observe(now_ts - fire_ts, kind)
+
+            self._schedule(kind, item, fire_at, persist=True)
+
+    async def _dispatch(self, kind: str, item: Dict[str, Any], fire_at: datetime):
+        """اجرای coroutine ارسال منبع"""
+        source = self._sources.get(kind)
+        if source is None:
+            return
+        started = time.perf_counter()
+        try:
+            await source.fire(item, fire_at)
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error(f"❌ خطا در اجرای ریمایندر {kind}:{item.get('id')}: {e}")
+        finally:
+            SCHEDULER_FIRE_SECONDS.observe(time.perf_counter() - started, kind)
+            self._in_flight.pop((kind, item['id']), None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار موتور زمان‌بندی"""
+        entry = self._peek()
+        stats = dict(self.stats)
+        stats.update({
+            'is_running': self.is_running,
+            'scheduled_reminders': len(self._entries),
+            'sources': list(self._sources),
+            'next_fire_at': datetime.fromtimestamp(entry[0], TEHRAN_TIMEZONE) if entry else None,
+            'in_flight': len(self._in_flight)
+        })
+        return stats
+
+
+# ایجاد instance اصلی
+timer_engine = TimerEngine()
+
+
+def _subscribe_to_databases():
+    """ثبت موتور به عنوان شنونده تغییرات دیتابیس ریمایندرها"""
+    from reminder.reminder_database import reminder_db
+    from reminder.auto_reminder_system import auto_reminder_system
+
+    reminder_db.add_change_listener(timer_engine.notify_changed)
+    auto_reminder_system.add_change_listener(timer_engine.notify_changed)
+
+
+_subscribe_to_databases()
@@ -0,0 +1,80 @@
+"""
+لایه async دیتابیس - اجرای متدهای sqlite روی thread pool اختصاصی تا event loop ربات بلاک نشود
+"""
+import asyncio
+import functools
+import importlib
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from utils.metrics import DB_CALL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# threadهای اختصاصی دیتابیس (یک نویسنده + چند خواننده در ConnectionManager)
+db_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="db")
+
+
+async def run_in_db_thread(func: Callable, *args, **kwargs) -> Any:
+    """اجرای یک تابع sync دیتابیس روی thread pool دیتابیس (زمان آن در db_call_seconds ثبت می‌شود)"""
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    try:
+        return await loop.run_in_executor(db_executor, functools.partial(func, *args, **kwargs))
+    finally:
+        DB_CALL_SECONDS.observe(time.perf_counter() - started, getattr(func, '__name__', 'unknown'))
+
+
+class AsyncDatabaseProxy:
+    """
+    همان متدهای کلاس دیتابیس اما به صورت coroutine:
+        await async_db.get_user_progress(user_id)
+    شیء اصلی در اولین استفاده ایمپورت می‌شود تا وابستگی چرخشی بین ماژول‌ها ایجاد نشود.
+    """
+
+    def __init__(self, module_name: str, attr_name: str):
+        self._module_name = module_name
+        self._attr_name = attr_name
+        self._target = None
+        self._methods: Dict[str, Callable] = {}
+
+    @property
+    def sync(self):
+        """شیء sync اصلی (برای کدهایی که خودشان روی thread دیتابیس اجرا می‌شوند)"""
+        if self._target is None:
+            module = importlib.import_module(self._module_name)
+            self._target = getattr(module, self._attr_name)
+        return self._target
+
+    def __getattr__(self, name: str):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        method = self._methods.get(name)
+        if method is not None:
+            return method
+
+        attr = getattr(self.sync, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def method(*args, **kwargs):
+            return await run_in_db_thread(attr, *args, **kwargs)
+
+        self._methods[name] = method
+        return method
+
+
+def shutdown_db_executor(wait: bool = True):
+    """توقف thread pool دیتابیس هنگام خاموش شدن"""
+    db_executor.shutdown(wait=wait)
+    logger.info("🛑 thread pool دیتابیس متوقف شد")
+
+
+# ایجاد instance اصلی
+async_db = AsyncDatabaseProxy('database', 'database')
+async_reminder_db = AsyncDatabaseProxy('reminder.reminder_database', 'reminder_db')
+async_auto_reminder_system = AsyncDatabaseProxy('reminder.auto_reminder_system', 'auto_reminder_system')
@@ -0,0 +1,164 @@
+"""
+snapshot مخاطبان یک ارسال همگانی - شناسه گیرنده‌ها یک‌بار برای هر نوبت از دیتابیس
+به صورت دسته‌ای (fetchmany) خوانده و در یک array('q') فشرده (۸ بایت برای هر کاربر)
+نگه داشته می‌شوند؛ همه تکرارها و بخش‌های همان نوبت از همین snapshot استفاده می‌کنند.
+مخاطبان خیلی بزرگ به فایل موقت منتقل و با mmap خوانده می‌شوند تا در حافظه پروسه نمانند.
+
+مقایسه حافظه لیست دیکشنری‌ها / لیست int / snapshot:
+    python -m utils.audience
+"""
+import logging
+import mmap
+import sqlite3
+import tempfile
+from array import array
+from typing import Any, Dict, Iterator, Optional, Sequence
+
+from config import AUDIENCE_SPILL_THRESHOLD
+from utils.db_connection import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+# تعداد ردیف در هر fetchmany
+FETCH_BATCH_SIZE = 5000
+
+
+class AudienceSnapshot:
+    """
+    شناسه‌های گیرنده‌ها به صورت int64 پشت سر هم (در حافظه یا فایل mmap شده).
+    فقط خواندنی است؛ بعد از استفاده close() (یا with) فایل موقت را آزاد می‌کند.
+    """
+
+    __slots__ = ('_ids', '_file', '_mmap')
+
+    def __init__(self, ids: Sequence[int], file: Any = None, mapped: Optional[mmap.mmap] = None):
+        self._ids = ids
+        self._file = file
+        self._mmap = mapped
+
+    @classmethod
+    def from_cursor(cls, cursor: sqlite3.Cursor,
+                    spill_threshold: int = AUDIENCE_SPILL_THRESHOLD) -> 'AudienceSnapshot':
+        """
+        ساخت snapshot از ستون اول نتیجه یک SELECT؛ ردیف‌ها دسته‌ای خوانده می‌شوند و
+        بعد از رسیدن به spill_threshold بقیه مستقیم در فایل موقت نوشته می‌شوند.
+        """
+        ids = array('q')
+        spill = None
+        while True:
+            rows = cursor.fetchmany(FETCH_BATCH_SIZE)
+            if not rows:
+                break
+            ids.extend(row[0] for row in rows)
+            if spill is None and len(ids) >= spill_threshold:
+                spill = tempfile.TemporaryFile()
+            if spill is not None:
+                ids.tofile(spill)
+                del ids[:]
+
+        if spill is None:
+            return cls(ids)
+        return cls._from_spill(spill)
+
+    @classmethod
+    def _from_spill(cls, spill: Any) -> 'AudienceSnapshot':
+        spill.flush()
+        if spill.tell() == 0:
+            spill.close()
+            return cls(array('q'))
+        mapped = mmap.mmap(spill.fileno(), 0, access=mmap.ACCESS_READ)
+        logger.info(f"💾 snapshot مخاطبان ({len(mapped) // 8} کاربر) به فایل موقت منتقل شد")
+        return cls(memoryview(mapped).cast('q'), spill, mapped)
+
+    @property
+    def spilled(self) -> bool:
+        return self._mmap is not None
+
+    @property
+    def nbytes(self) -> int:
+        """حجم داده شناسه‌ها (بایت) - در حالت mmap در حافظه پروسه نیست"""
+        return len(self._ids) * 8
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __bool__(self) -> bool:
+        return len(self._ids) > 0
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._ids)
+
+    def __getitem__(self, index: int) -> int:
+        return self._ids[index]
+
+    def close(self):
+        """آزاد کردن mmap و فایل موقت (برای snapshot داخل حافظه بی‌اثر است)"""
+        if self._mmap is not None:
+            self._ids.release()
+            self._mmap.close()
+            self._file.close()
+            self._mmap = self._file = None
+        self._ids = array('q')
+
+    def __enter__(self) -> 'AudienceSnapshot':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def load_audience(connections: ConnectionManager, query: str, params: tuple = (),
+                  spill_threshold: int = AUDIENCE_SPILL_THRESHOLD) -> AudienceSnapshot:
+    """اجرای query (ستون اول = user_id) روی یک اتصال خواندن و ساخت snapshot - روی thread دیتابیس"""
+    with connections.read() as conn:
+        cursor = conn.execute(query, params)
+        try:
+            return AudienceSnapshot.from_cursor(cursor, spill_threshold)
+        finally:
+            cursor.close()
+
+
+def measure_memory(conn: sqlite3.Connection) -> Dict[str, Dict[str, int]]:
+    """حافظه (بایت، نهایی و اوج) خواندن مخاطبان جدول users به سه روش، با tracemalloc"""
+    import tracemalloc
+
+    def as_dicts():
+        cursor = conn.execute('SELECT user_id, username, first_name, last_name FROM users')
+        return [{'user_id': r[0], 'username': r[1], 'first_name': r[2], 'last_name': r[3]}
+                for r in cursor.fetchall()]
+
+    def as_int_list():
+        return [row[0] for row in conn.execute('SELECT user_id FROM users').fetchall()]
+
+    def as_snapshot():
+        return AudienceSnapshot.from_cursor(conn.execute('SELECT user_id FROM users'))
+
+    results = {}
+    for name, build in (('dict_rows', as_dicts), ('int_list', as_int_list), ('snapshot', as_snapshot)):
+        tracemalloc.start()
+        value = build()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[name] = {'current': current, 'peak': peak}
+        del value
+    return results
+
+
+if __name__ == "__main__":
+    count = 100_000
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE users (user_id INTEGER, username TEXT, first_name TEXT, last_name TEXT)')
+    conn.executemany('INSERT INTO users VALUES (?, ?, ?, ?)', (
+        (5_000_000_000 + i, f"user{i}", "نام", "نام خانوادگی") for i in range(count)
+    ))
+
+    print(f"حافظه خواندن {count} گیرنده:")
+    for name, size in measure_memory(conn).items():
+        print(f"{name:<10} نهایی {size['current'] / 1024 / 1024:>7.2f} MB   "
+              f"اوج {size['peak'] / 1024 / 1024:>7.2f} MB")
+
+    # مسیر فایل موقت با آستانه کوچک
+    cursor = conn.execute('SELECT user_id FROM users')
+    with AudienceSnapshot.from_cursor(cursor, spill_threshold=10_000) as snapshot:
+        assert list(snapshot) == [5_000_000_000 + i for i in range(count)]
+        print(f"mmap: {len(snapshot)} گیرنده، spilled={snapshot.spilled}")
@@ -0,0 +1,230 @@
+"""
+موتور ارسال گروهی پیام با رعایت محدودیت‌های تلگرام
+(token bucket سراسری + محدودیت هر چت + صف محدود و چند worker)
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from aiogram.exceptions import TelegramRetryAfter
+
+from utils.dead_chats import UndeliverableChatError, dead_chats
+from utils.metrics import BROADCAST_QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """token bucket ساده برای محدود کردن نرخ ارسال"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        """صبر تا آزاد شدن یک توکن (یا پایان توقف RetryAfter)"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """توقف کامل bucket (مثلا بعد از TelegramRetryAfter)"""
+        now = time.monotonic()
+        self.paused_until = max(self.paused_until, now + seconds)
+        self.tokens = 0
+        self.updated_at = now
+
+
+class BroadcastEngine:
+    """
+    صف مشترک ارسال پیام برای همه schedulerها.
+    هر پیام یک job است که توسط workerها با رعایت نرخ سراسری (~۳۰ پیام در ثانیه)
+    و فاصله حداقلی برای هر چت ارسال می‌شود.
+    """
+
+    def __init__(self, global_rate: float = 30, per_chat_interval: float = 1.0,
+                 workers: int = 8, queue_size: int = 1000, max_retries: int = 3):
+        self.bucket = TokenBucket(global_rate)
+        self.per_chat_interval = per_chat_interval
+        self.worker_count = workers
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._chat_next_allowed: Dict[int, float] = {}
+        self.stats = {
+            'total_sent': 0,
+            'total_failed': 0,
+            'total_retried': 0,
+            'total_paused': 0,
+            'last_retry_after': None
+        }
+
+    # --- مدیریت workerها ---
+
+    def _ensure_started(self):
+        """راه‌اندازی صف و workerها در اولین استفاده"""
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+
+        self._workers = [task for task in self._workers if not task.done()]
+        while len(self._workers) < self.worker_count:
+            self._workers.append(asyncio.create_task(self._worker(len(self._workers))))
+
+    async def stop(self):
+        """توقف workerها (jobهای باقی‌مانده در صف ارسال نمی‌شوند)"""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        logger.info("🛑 موتور ارسال گروهی متوقف شد")
+
+    def queue_depth(self) -> int:
+        """تعداد jobهای منتظر در صف"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    # --- ارسال ---
+
+    async def submit(self, bot, chat_id: int, text: str, **kwargs) -> asyncio.Future:
+        """افزودن یک پیام به صف؛ future با None (موفق) یا exception (ناموفق) کامل می‌شود"""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((bot, chat_id, text, kwargs, future, 0))
+        return future
+
+    async def send(self, bot, chat_id: int, text: str, **kwargs) -> bool:
+        """ارسال یک پیام از طریق صف مشترک"""
+        future = await self.submit(bot, chat_id, text, **kwargs)
+        error = await future
+        if error is not None:
+            logger.error(f"❌ خطا در ارسال پیام به کاربر {chat_id}: {error}")
+            return False
+        return True
+
+    async def broadcast(self, bot, chat_ids: Iterable[int], text: str, **kwargs) -> Dict[str, Any]:
+        """ارسال یک پیام به گروهی از کاربران و انتظار تا پایان همه ارسال‌ها"""
+        started = time.monotonic()
+        futures: List[Tuple[int, asyncio.Future]] = []
+        for chat_id in chat_ids:
+            futures.append((chat_id, await self.submit(bot, chat_id, text, **kwargs)))
+
+        errors = []
+        for chat_id, future in futures:
+            error = await future
+            if error is not None:
+                errors.append((chat_id, error))
+
+        result = {
+            'total': len(futures),
+            'sent': len(futures) - len(errors),
+            'failed': len(errors),
+            'errors': errors,
+            'duration_seconds': round(time.monotonic() - started, 2)
+        }
+        logger.info(
+            f"📤 ارسال گروهی کامل: {result['sent']} موفق, {result['failed']} ناموفق "
+            f"در {result['duration_seconds']} ثانیه"
+        )
+        return result
+
+    async def _wait_for_chat(self, chat_id: int):
+        """رعایت فاصله حداقلی بین دو پیام به یک چت"""
+        now = time.monotonic()
+        allowed_at = self._chat_next_allowed.get(chat_id, 0.0)
+        if allowed_at > now:
+            await asyncio.sleep(allowed_at - now)
+            now = time.monotonic()
+        self._chat_next_allowed[chat_id] = now + self.per_chat_interval
+
+        # پاکسازی چت‌هایی که محدودیتشان تمام شده
+        if len(self._chat_next_allowed) > 10000:
+            self._chat_next_allowed = {
+                key: value for key, value in self._chat_next_allowed.items() if value > now
+            }
+
+    async def _worker(self, index: int):
+        """worker ارسال پیام‌های صف"""
+        while True:
+            bot, chat_id, text, kwargs, future, attempt = await self._queue.get()
+            try:
+                if dead_chats.is_dead(chat_id) and await dead_chats.confirm_dead(chat_id):
+                    # کاربر ربات را بلاک کرده یا حسابش حذف شده - درخواستی فرستاده نمی‌شود
+                    dead_chats.record_skipped()
+                    if not future.done():
+                        future.set_result(UndeliverableChatError(f"chat {chat_id} is undeliverable"))
+                    continue
+
+                await self._wait_for_chat(chat_id)
+                await self.bucket.acquire()
+                await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                self.stats['total_sent'] += 1
+                if not future.done():
+                    future.set_result(None)
+
+            except TelegramRetryAfter as e:
+                # کل bucket متوقف می‌شود تا تلگرام دوباره اجازه دهد
+                self.bucket.pause(e.retry_after)
+                self.stats['total_paused'] += 1
+                self.stats['last_retry_after'] = e.retry_after
+                logger.warning(f"⏳ محدودیت Rate Limit - توقف ارسال‌ها برای {e.retry_after} ثانیه")
+
+                if attempt < self.max_retries:
+                    self.stats['total_retried'] += 1
+                    job = (bot, chat_id, text, kwargs, future, attempt + 1)
+                    if self._queue.full():
+                        # worker نباید روی صف پر منتظر بماند
+                        asyncio.create_task(self._queue.put(job))
+                    else:
+                        self._queue.put_nowait(job)
+                else:
+                    self.stats['total_failed'] += 1
+                    if not future.done():
+                        future.set_result(e)
+
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()
+                raise
+
+            except Exception as e:
+                self.stats['total_failed'] += 1
+                dead_chats.observe(chat_id, e)
+                if not future.done():
+                    future.set_result(e)
+
+            finally:
+                self._queue.task_done()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار موتور ارسال"""
+        stats = dict(self.stats)
+        stats.update({
+            'queue_depth': self.queue_depth(),
+            'workers': len([task for task in self._workers if not task.done()]),
+            'paused_for': max(0.0, round(self.bucket.paused_until - time.monotonic(), 1))
+        })
+        return stats
+
+
+# ایجاد instance اصلی
+broadcast_engine = BroadcastEngine()
+BROADCAST_QUEUE_DEPTH.set_function(broadcast_engine.queue_depth)
@@ -0,0 +1,93 @@
+"""
+رجیستری کانال‌های اجباری - نگهداری لیست کانال‌ها در حافظه با شماره نسخه
+(لیست بعد از تغییر توسط ادمین یا گذشتن CHANNEL_CACHE_TTL دوباره از دیتابیس خوانده می‌شود)
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from config import CHANNEL_CACHE_TTL
+from utils.async_db import async_db, run_in_db_thread
+
+logger = logging.getLogger(__name__)
+
+
+class ChannelRegistry:
+    """
+    هر تغییر در جدول mandatory_channels (افزودن/حذف کانال) version را زیاد می‌کند.
+    get() تا وقتی نسخه عوض نشده بدون خواندن دیتابیس همان لیست قبلی را برمی‌گرداند.
+    تغییر روی instance دیگر به این پروسه نمی‌رسد، پس لیست بعد از ttl ثانیه هم دوباره خوانده می‌شود
+    و اگر فرق کرده باشد نسخه زیاد می‌شود (کیبورد عضویت و ... دوباره ساخته می‌شوند).
+    """
+
+    def __init__(self, ttl: float = CHANNEL_CACHE_TTL):
+        self.ttl = ttl
+        self.version = 0
+        self._channels: Optional[List[Dict[str, Any]]] = None
+        self._loaded_version = -1
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'loads': 0
+        }
+
+    def invalidate(self):
+        """اعلام تغییر کانال‌ها (بعد از افزودن/حذف توسط ادمین)"""
+        with self._lock:
+            self.version += 1
+        logger.info(f"🔄 رجیستری کانال‌های اجباری باطل شد (نسخه {self.version})")
+
+    def _load(self) -> List[Dict[str, Any]]:
+        """خواندن کانال‌ها از دیتابیس (روی thread دیتابیس)"""
+        version = self.version
+        channels = async_db.sync.get_mandatory_channels()
+        with self._lock:
+            # اگر وسط خواندن تغییری ثبت شده باشد، نسخه جدید بار بعد خوانده می‌شود
+            if version >= self._loaded_version:
+                if self._channels is not None and channels != self._channels and version == self.version:
+                    # تغییر ثبت‌شده روی instance دیگر
+                    self.version += 1
+                    version = self.version
+                    logger.info(f"🔄 کانال‌های اجباری در دیتابیس تغییر کرده‌اند (نسخه {version})")
+                self._channels = channels
+                self._loaded_version = version
+                self._loaded_at = time.monotonic()
+        self.stats['loads'] += 1
+        return channels
+
+    def _cached(self) -> Optional[List[Dict[str, Any]]]:
+        if (self._channels is not None and self._loaded_version == self.version
+                and time.monotonic() - self._loaded_at < self.ttl):
+            self.stats['hits'] += 1
+            return list(self._channels)
+        return None
+
+    async def get(self) -> List[Dict[str, Any]]:
+        """لیست کانال‌های اجباری (از حافظه؛ بعد از تغییر یا انقضای ttl از دیتابیس)"""
+        channels = self._cached()
+        if channels is None:
+            channels = list(await run_in_db_thread(self._load))
+        return channels
+
+    def get_sync(self) -> List[Dict[str, Any]]:
+        """نسخه sync برای کدهایی که روی thread دیتابیس یا بیرون از event loop اجرا می‌شوند"""
+        channels = self._cached()
+        if channels is None:
+            channels = list(self._load())
+        return channels
+
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار رجیستری"""
+        stats = dict(self.stats)
+        stats.update({
+            'version': self.version,
+            'loaded_version': self._loaded_version,
+            'channels': len(self._channels or [])
+        })
+        return stats
+
+
+# ایجاد instance اصلی
+channel_registry = ChannelRegistry()
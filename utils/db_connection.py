@@ -0,0 +1,178 @@
+"""
+مدیریت اتصال‌های ماندگار SQLite - یک اتصال نوشتن + استخر اتصال‌های خواندن
+"""
+import os
+import queue
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+# PRAGMAهایی که فقط یک‌بار هنگام ساخت هر اتصال اجرا می‌شوند
+CONNECTION_PRAGMAS = (
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -64000",   # 64MB cache
+    "PRAGMA temp_store = MEMORY",
+)
+
+
+class ConnectionManager:
+    """
+    همه کلاس‌های دیتابیس (Database، ReminderDatabase، AutoReminderSystem) از یک manager
+    برای هر فایل استفاده می‌کنند:
+    - write(): اتصال نوشتن مشترک با قفل (SQLite در هر لحظه فقط یک نویسنده دارد)
+    - read(): اتصال از استخر خواندن (در حالت WAL خواندن‌ها منتظر نوشتن نمی‌مانند)
+    """
+
+    def __init__(self, db_path: str, readers: int = 4, cached_statements: int = 256,
+                 busy_timeout: int = 5000):
+        self.db_path = db_path
+        self.reader_count = readers
+        self.cached_statements = cached_statements  # کش prepared statementها برای هر اتصال
+        self.busy_timeout = busy_timeout
+        self._write_lock = threading.RLock()
+        self._writer = None
+        self._readers: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        self._all_readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        self.stats = {
+            'writes': 0,
+            'reads': 0,
+            'connections_opened': 0
+        }
+
+    def _connect(self, read_only: bool = False) -> sqlite3.Connection:
+        """ساخت یک اتصال جدید و اجرای PRAGMAها (فقط یک‌بار برای هر اتصال)"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout / 1000,
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        conn.execute(f"PRAGMA busy_timeout = {self.busy_timeout}")
+        if read_only:
+            conn.execute("PRAGMA query_only = ON")
+        else:
+            conn.execute("PRAGMA journal_mode = WAL")
+        self.stats['connections_opened'] += 1
+        return conn
+
+    def connect(self) -> sqlite3.Connection:
+        """اتصال مستقل جدید با همان تنظیمات (بستن آن با فراخواننده است)"""
+        return self._connect()
+
+    def _get_writer(self) -> sqlite3.Connection:
+        if self._writer is None:
+            self._writer = self._connect()
+        return self._writer
+
+    @contextmanager
+    def write(self) -> Iterator[sqlite3.Connection]:
+        """اتصال نوشتن؛ در پایان بلوک commit و در صورت خطا rollback می‌شود"""
+        with self._write_lock:
+            conn = self._get_writer()
+            self.stats['writes'] += 1
+            try:
+                yield conn
+                if conn.in_transaction:
+                    conn.commit()
+            except BaseException:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+
+    @contextmanager
+    def read(self) -> Iterator[sqlite3.Connection]:
+        """اتصال خواندن از استخر (اگر همه مشغول باشند منتظر آزاد شدن یکی می‌ماند)"""
+        conn = self._acquire_reader()
+        self.stats['reads'] += 1
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            if any(conn is reader for reader in self._all_readers):
+                self._readers.put(conn)
+            else:
+                # بعد از reconnect این اتصال دیگر عضو استخر نیست
+                conn.close()
+
+    def _acquire_reader(self) -> sqlite3.Connection:
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._readers_lock:
+            if len(self._all_readers) < self.reader_count:
+                conn = self._connect(read_only=True)
+                self._all_readers.append(conn)
+                return conn
+
+        return self._readers.get()
+
+    def reconnect(self):
+        """بستن همه اتصال‌ها؛ اتصال‌های جدید در اولین استفاده ساخته می‌شوند"""
+        with self._write_lock:
+            if self._writer is not None:
+                try:
+                    self._writer.close()
+                except sqlite3.Error:
+                    pass
+                self._writer = None
+
+        with self._readers_lock:
+            while True:
+                try:
+                    self._readers.get_nowait()
+                except queue.Empty:
+                    break
+            for conn in self._all_readers:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._all_readers = []
+
+        logger.info(f"🔄 اتصال‌های دیتابیس {self.db_path} دوباره ساخته می‌شوند")
+
+    def close(self):
+        """بستن همه اتصال‌ها (هنگام خاموش شدن)"""
+        self.reconnect()
+
+    def get_stats(self) -> Dict[str, int]:
+        """آمار استفاده از اتصال‌ها"""
+        stats = dict(self.stats)
+        stats.update({
+            'readers_open': len(self._all_readers),
+            'readers_idle': self._readers.qsize()
+        })
+        return stats
+
+
+_managers: Dict[str, ConnectionManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_connection_manager(db_path: str) -> ConnectionManager:
+    """manager مشترک برای هر فایل دیتابیس (همه کلاس‌ها از یک نویسنده استفاده می‌کنند)"""
+    key = os.path.abspath(db_path)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = ConnectionManager(db_path)
+            _managers[key] = manager
+        return manager
+
+
+def close_all_connections():
+    """بستن اتصال‌های همه دیتابیس‌ها"""
+    with _managers_lock:
+        for manager in _managers.values():
+            manager.close()
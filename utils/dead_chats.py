@@ -0,0 +1,133 @@
+"""
+حذف چت‌های مرده از ارسال‌ها - کاربرانی که ربات را بلاک کرده‌اند یا حسابشان حذف شده
+با اولین خطای ارسال قطعی غیرقابل‌تحویل علامت می‌خورند (users.is_active = FALSE)،
+از مخاطبان ارسال‌های همگانی کنار گذاشته می‌شوند و موتور ارسال برایشان درخواستی نمی‌فرستد.
+با /start بعدی کاربر دوباره فعال می‌شود؛ چون /start ممکن است روی instance دیگری پردازش شود،
+موتور ارسال قبل از رد کردن هر پیام وضعیت کاربر را در دیتابیس هم چک می‌کند.
+"""
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Set
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+from utils.async_db import async_db
+
+logger = logging.getLogger(__name__)
+
+# متن خطاهای TelegramBadRequest که یعنی چت دیگر وجود ندارد (نه خطای خود پیام)
+DEAD_CHAT_MARKERS = (
+    'chat not found',
+    'user not found',
+    'user is deactivated',
+    'peer_id_invalid',
+)
+
+
+class UndeliverableChatError(Exception):
+    """ارسال انجام نشد چون کاربر قبلاً غیرقابل‌تحویل علامت خورده است"""
+
+
+def is_dead_chat_error(error: Optional[BaseException]) -> bool:
+    """آیا خطای ارسال یعنی این چت دیگر پیام دریافت نمی‌کند؟"""
+    if isinstance(error, TelegramForbiddenError):
+        # ربات بلاک شده، حساب حذف شده یا کاربر هیچ‌وقت ربات را شروع نکرده
+        return True
+    if isinstance(error, TelegramBadRequest):
+        message = (error.message or '').lower()
+        return any(marker in message for marker in DEAD_CHAT_MARKERS)
+    return False
+
+
+class DeadChatRegistry:
+    """
+    مجموعه کاربران غیرقابل‌تحویل در حافظه (برای چک بدون دیتابیس در موتور ارسال)
+    و ثبت تغییرات آن در جدول users به صورت دسته‌ای در پس‌زمینه
+    """
+
+    def __init__(self):
+        self._dead: Set[int] = set()
+        self._pending: Set[int] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        self.loaded = False
+        self.stats = {
+            'marked': 0,           # کاربرانی که از خطای ارسال غیرقابل‌تحویل شدند
+            'revived': 0,          # کاربرانی که با /start برگشتند
+            'skipped_sends': 0     # درخواست‌هایی که موتور ارسال نفرستاد
+        }
+
+    async def load(self):
+        """بارگذاری کاربران غیرقابل‌تحویل از دیتابیس (در شروع مصرف‌کننده صف)"""
+        try:
+            self._dead = set(await async_db.get_undeliverable_user_ids())
+            self.loaded = True
+            logger.info(f"🪦 {len(self._dead)} کاربر غیرقابل‌تحویل بارگذاری شد")
+        except Exception as e:
+            logger.error(f"خطا در بارگذاری کاربران غیرقابل‌تحویل: {e}")
+
+    def is_dead(self, user_id: int) -> bool:
+        return user_id in self._dead
+
+    async def confirm_dead(self, user_id: int) -> bool:
+        """
+        تایید وضعیت کاربری که در حافظه مرده است از روی users.is_active
+        (ممکن است /start او روی instance دیگری پردازش شده باشد). اگر برگشته باشد از مجموعه حذف می‌شود.
+        """
+        if user_id in self._pending:
+            # هنوز در دیتابیس ثبت نشده
+            return True
+        try:
+            if await async_db.is_user_undeliverable(user_id):
+                return True
+        except Exception as e:
+            logger.error(f"خطا در بررسی وضعیت کاربر {user_id}: {e}")
+        self.revive(user_id)
+        return False
+
+    def observe(self, user_id: int, error: BaseException) -> bool:
+        """ثبت نتیجه ناموفق یک ارسال؛ اگر چت مرده باشد کاربر علامت می‌خورد"""
+        if not is_dead_chat_error(error) or user_id in self._dead:
+            return False
+        self._dead.add(user_id)
+        self._pending.add(user_id)
+        self.stats['marked'] += 1
+        logger.info(f"🪦 کاربر {user_id} غیرقابل‌تحویل شد: {error}")
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush())
+        return True
+
+    async def _flush(self):
+        """ثبت دسته‌ای کاربران علامت‌خورده در دیتابیس"""
+        # اجازه می‌دهیم بقیه خطاهای همان دسته ارسال هم جمع شوند
+        await asyncio.sleep(0)
+        while self._pending:
+            user_ids = list(self._pending)
+            self._pending.clear()
+            try:
+                await async_db.mark_users_undeliverable(user_ids)
+            except Exception as e:
+                logger.error(f"خطا در ثبت کاربران غیرقابل‌تحویل: {e}")
+
+    def revive(self, user_id: int):
+        """کاربر دوباره ربات را شروع کرده است (ستون is_active را add_user برمی‌گرداند) - فقط حافظه همین پروسه"""
+        self._pending.discard(user_id)
+        if user_id in self._dead:
+            self._dead.discard(user_id)
+            self.stats['revived'] += 1
+            logger.info(f"♻️ کاربر {user_id} دوباره قابل‌تحویل شد")
+
+    def record_skipped(self):
+        self.stats['skipped_sends'] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار چت‌های مرده و مقدار ارسالی که صرفه‌جویی شد"""
+        stats = dict(self.stats)
+        stats.update({
+            'undeliverable_users': len(self._dead),
+            'fanout_saved': self.stats['skipped_sends']
+        })
+        return stats
+
+
+# ایجاد instance اصلی
+dead_chats = DeadChatRegistry()
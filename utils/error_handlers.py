@@ -89,10 +89,9 @@ async def global_error_handler(event: ErrorEvent) -> bool:
 async def handle_database_error():
     """مدیریت خطاهای دیتابیس"""
     try:
-        from database import Database
-        db = Database()
-        # تلاش برای reconnect
-        db.get_connection().close()
+        from utils.async_db import async_db
+        # تلاش برای reconnect - اتصال‌های ماندگار بسته و در اولین استفاده دوباره ساخته می‌شوند
+        async_db.sync.connections.reconnect()
         logger.info("🔄 تلاش برای reconnect به دیتابیس")
     except Exception as e:
         logger.error(f"❌ reconnect دیتابیس ناموفق: {e}")
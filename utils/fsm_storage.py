@@ -0,0 +1,213 @@
+"""
+ذخیره‌ساز FSM روی SQLite - وضعیت ویزاردهای چندمرحله‌ای (ریمایندرها، ثبت مطالعه و ...)
+بعد از ری‌استارت حفظ می‌شود و بین چند instance ربات مشترک است
+"""
+import json
+import logging
+import sys
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from config import FSM_CACHE_TTL, FSM_STATE_TTL
+from utils.async_db import run_in_db_thread
+from utils.db_connection import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+# payloadهای بزرگ‌تر از این اندازه فشرده ذخیره می‌شوند (بایت)
+COMPRESS_THRESHOLD = 512
+
+
+def encode_data(data: Dict[str, Any]) -> Optional[bytes]:
+    """JSON فشرده (بدون فاصله، UTF-8 خام) و در صورت بزرگ بودن zlib؛ دیکشنری خالی = NULL"""
+    if not data:
+        return None
+    raw = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    if len(raw) > COMPRESS_THRESHOLD:
+        return b'z' + zlib.compress(raw)
+    return b'j' + raw
+
+
+def decode_data(blob: Optional[bytes]) -> Dict[str, Any]:
+    """برعکس encode_data"""
+    if not blob:
+        return {}
+    raw = zlib.decompress(blob[1:]) if blob[:1] == b'z' else blob[1:]
+    return json.loads(raw)
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    هر کلید FSM یک ردیف در جدول fsm_storage است (state + data با زمان انقضا).
+    - نوشتن‌ها مستقیم (write-through) روی thread دیتابیس ثبت می‌شوند
+    - جلسه‌هایی که state_ttl ثانیه دست نخورده‌اند منقضی و به مرور پاک می‌شوند
+    - کش داغ در حافظه با سقف حجم: چند خواندن پشت سر هم در یک آپدیت (فیلتر state،
+      get_data، update_data) به دیتابیس نمی‌رسد. اعتبار هر ورودی کش cache_ttl ثانیه است
+      تا instanceهای دیگر هم بعد از این مدت تغییرات را ببینند.
+    """
+
+    def __init__(self, connections: ConnectionManager, state_ttl: int = FSM_STATE_TTL,
+                 cache_ttl: float = FSM_CACHE_TTL, max_cache_bytes: int = 4 * 1024 * 1024,
+                 cleanup_interval: int = 3600):
+        self.connections = connections
+        self.state_ttl = state_ttl
+        self.cache_ttl = cache_ttl
+        self.max_cache_bytes = max_cache_bytes
+        self.cleanup_interval = cleanup_interval
+        # کلید -> (state, data خام, اندازه تقریبی, اعتبار تا با time.monotonic)
+        self._cache: "OrderedDict[str, Tuple[Optional[str], Optional[bytes], int, float]]" = OrderedDict()
+        self._cache_bytes = 0
+        self._last_cleanup = 0.0
+        self.stats = {
+            'cache_hits': 0,
+            'db_reads': 0,
+            'db_writes': 0,
+            'expired_cleaned': 0
+        }
+        self._init_table()
+
+    def _init_table(self):
+        with self.connections.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS fsm_storage (
+                    key TEXT PRIMARY KEY,
+                    state TEXT,
+                    data BLOB,
+                    expires_at REAL NOT NULL      -- epoch
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_fsm_storage_expires
+                ON fsm_storage(expires_at)
+            ''')
+            conn.commit()
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return (
+            f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:"
+            f"{key.business_connection_id or ''}:{key.destiny}"
+        )
+
+    # --- کش داغ ---
+
+    def _cache_get(self, db_key: str, count: bool = True) -> Optional[Tuple[Optional[str], Optional[bytes]]]:
+        entry = self._cache.get(db_key)
+        if entry is None:
+            return None
+        if entry[3] <= time.monotonic():
+            self._cache_drop(db_key)
+            return None
+        self._cache.move_to_end(db_key)
+        if count:
+            self.stats['cache_hits'] += 1
+        return entry[0], entry[1]
+
+    def _cache_put(self, db_key: str, state: Optional[str], data: Optional[bytes]):
+        self._cache_drop(db_key)
+        size = sys.getsizeof(db_key) + len(state or '') + len(data or b'') + 64
+        self._cache[db_key] = (state, data, size, time.monotonic() + self.cache_ttl)
+        self._cache_bytes += size
+        while self._cache_bytes > self.max_cache_bytes and self._cache:
+            _, (_, _, old_size, _) = self._cache.popitem(last=False)
+            self._cache_bytes -= old_size
+
+    def _cache_drop(self, db_key: str):
+        entry = self._cache.pop(db_key, None)
+        if entry is not None:
+            self._cache_bytes -= entry[2]
+
+    # --- دیتابیس (روی thread دیتابیس) ---
+
+    def _load(self, db_key: str) -> Tuple[Optional[str], Optional[bytes]]:
+        with self.connections.read() as conn:
+            row = conn.execute(
+                "SELECT state, data FROM fsm_storage WHERE key = ? AND expires_at > ?",
+                (db_key, time.time())
+            ).fetchone()
+        return (row[0], row[1]) if row else (None, None)
+
+    def _store(self, db_key: str, column: str, value: Any):
+        """ثبت یک ستون (state یا data) و تمدید انقضا؛ ردیف خالی حذف می‌شود"""
+        now = time.time()
+        # ستون دیگر یک ردیف منقضی‌شده نباید با تمدید انقضا دوباره زنده شود
+        other = 'data' if column == 'state' else 'state'
+        with self.connections.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                INSERT INTO fsm_storage (key, {column}, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    {column} = excluded.{column},
+                    {other} = CASE WHEN fsm_storage.expires_at <= ? THEN NULL ELSE fsm_storage.{other} END,
+                    expires_at = excluded.expires_at
+            ''', (db_key, value, now + self.state_ttl, now))
+            if value is None:
+                cursor.execute(
+                    "DELETE FROM fsm_storage WHERE key = ? AND state IS NULL AND data IS NULL",
+                    (db_key,)
+                )
+            if now - self._last_cleanup >= self.cleanup_interval:
+                self._last_cleanup = now
+                cursor.execute("DELETE FROM fsm_storage WHERE expires_at <= ?", (now,))
+                if cursor.rowcount:
+                    self.stats['expired_cleaned'] += cursor.rowcount
+                    logger.info(f"🧹 {cursor.rowcount} جلسه FSM منقضی‌شده پاک شد")
+            conn.commit()
+
+    async def _get(self, key: StorageKey) -> Tuple[Optional[str], Optional[bytes]]:
+        db_key = self._key(key)
+        cached = self._cache_get(db_key)
+        if cached is not None:
+            return cached
+        self.stats['db_reads'] += 1
+        state, data = await run_in_db_thread(self._load, db_key)
+        self._cache_put(db_key, state, data)
+        return state, data
+
+    # --- رابط BaseStorage ---
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        db_key = self._key(key)
+        self.stats['db_writes'] += 1
+        await run_in_db_thread(self._store, db_key, 'state', state)
+        cached = self._cache_get(db_key, count=False)
+        if cached is not None:
+            self._cache_put(db_key, state, cached[1])
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._get(key)
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        encoded = encode_data(data)
+        db_key = self._key(key)
+        self.stats['db_writes'] += 1
+        await run_in_db_thread(self._store, db_key, 'data', encoded)
+        cached = self._cache_get(db_key, count=False)
+        if cached is not None:
+            self._cache_put(db_key, cached[0], encoded)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        # هر بار از بایت‌ها ساخته می‌شود تا تغییر دیکشنری برگشتی روی کش اثر نگذارد
+        _, data = await self._get(key)
+        return decode_data(data)
+
+    async def close(self) -> None:
+        self._cache.clear()
+        self._cache_bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار ذخیره‌ساز FSM"""
+        stats = dict(self.stats)
+        stats.update({
+            'cached_keys': len(self._cache),
+            'cache_bytes': self._cache_bytes
+        })
+        return stats
@@ -1,8 +1,6 @@
 """
 ابزارهای عمومی و کمکی
 """
-from exam_data import EXAMS_1405
-from datetime import datetime
 
 def get_subject_emoji(subject: str) -> str:
     """
@@ -32,28 +30,20 @@ def get_next_exam():
     """
     پیدا کردن نزدیک‌ترین آزمون آینده و بازگشت دیکشنری کامل
     """
-    now = datetime.now()
-    next_exam = None
-    min_delta = None
+    from exam_catalog import exam_catalog
     
-    for exam_key, exam in EXAMS_1405.items():
-        dates = exam["date"] if isinstance(exam["date"], list) else [exam["date"]]
-        
-        for date_tuple in dates:
-            exam_date = datetime(*date_tuple)
-            if exam_date > now:
-                delta = exam_date - now
-                if min_delta is None or delta < min_delta:
-                    min_delta = delta
-                    next_exam = {
-                        'key': exam_key,
-                        'name': exam['name'],
-                        'date': exam_date,
-                        'persian_date': exam['persian_date'],
-                        'time': exam['time']
-                    }
+    found = exam_catalog.next_exam()
+    if found is None:
+        return None
     
-    return next_exam
+    exam, exam_date = found
+    return {
+        'key': exam.key,
+        'name': exam.name,
+        'date': exam_date,
+        'persian_date': exam.persian_date,
+        'time': exam.time
+    }
 
 def create_admin_stats_message() -> str:
     """
@@ -9,6 +9,8 @@ from datetime import datetime, timedelta
 from typing import Dict, Any
 from aiohttp import web
 
+from utils.metrics import UPDATE_ERRORS, UPDATE_SECONDS
+
 logger = logging.getLogger(__name__)
 
 class HealthMonitor:
@@ -25,6 +27,14 @@ class HealthMonitor:
             "memory_warnings": 0
         }
         self.alerts = []
+        # ربات و کش برنامه (با attach ثبت می‌شوند تا main دوباره ایمپورت نشود)
+        self.bot = None
+        self.cache = None
+    
+    def attach(self, bot, cache=None):
+        """ثبت ربات و کش برنامه برای بررسی‌های سلامت"""
+        self.bot = bot
+        self.cache = cache
     
     async def check_system_health(self) -> Dict[str, Any]:
         """بررسی سلامت سیستم"""
@@ -40,6 +50,10 @@ class HealthMonitor:
         # دیتابیس
         db_health = await self.check_database_health()
         
+        # شمارنده‌های آپدیت از متریک‌های هندلرها (utils.metrics)
+        self.metrics["requests_total"] = UPDATE_SECONDS.total_count()
+        self.metrics["errors_total"] = int(UPDATE_ERRORS.total())
+        
         # وضعیت کلی
         health_status = {
             "status": "healthy",
@@ -82,10 +96,8 @@ class HealthMonitor:
     async def check_database_health(self) -> str:
         """بررسی سلامت دیتابیس"""
         try:
-            from database import Database
-            db = Database()
-            with db.get_connection() as conn:
-                conn.execute("SELECT 1")
+            from utils.async_db import async_db
+            await async_db.execute_query("SELECT 1")
             return "healthy"
         except Exception as e:
             self.metrics["database_errors"] += 1
@@ -95,7 +107,9 @@ class HealthMonitor:
     async def check_webhook_health(self) -> str:
         """بررسی سلامت وب‌هوک"""
         try:
-            from main import bot
+            bot = self.bot
+            if bot is None:
+                from main import bot
             webhook_info = await bot.get_webhook_info()
             if webhook_info.url:
                 return "healthy"
@@ -107,8 +121,10 @@ class HealthMonitor:
     async def check_cache_health(self) -> str:
         """بررسی سلامت کش"""
         try:
-            from main import _CACHE
-            cache_size = len(_CACHE)
+            cache = self.cache
+            if cache is None:
+                from main import _CACHE as cache
+            cache_size = len(cache)
             if cache_size < 1000:  # حداکثر 1000 آیتم در کش
                 return "healthy"
             return "warning"
@@ -122,8 +138,10 @@ class HealthMonitor:
         
         # پاکسازی کش‌ها
         try:
-            from main import _CACHE
-            _CACHE.clear()
+            cache = self.cache
+            if cache is None:
+                from main import _CACHE as cache
+            cache.clear()
             logger.info("🧹 کش‌ها پاکسازی شدند")
         except:
             pass
@@ -0,0 +1,119 @@
+"""
+رجیستری کیبوردها - هر کیبورد ثابت فقط یک‌بار ساخته می‌شود و کیبوردهای پارامتری
+(مثل exam_actions_menu(exam_key)) برای هر مقدار آرگومان یک‌بار ساخته و نگه داشته می‌شوند
+
+اجرای بنچمارک:
+    python -m utils.keyboard_registry
+"""
+import functools
+import logging
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# نام کامل تابع -> نسخه کش‌شده آن
+_registry: Dict[str, Callable] = {}
+
+
+def cached_keyboard(func: Optional[Callable] = None, *, maxsize: Optional[int] = 128):
+    """
+    دکوراتور کش کیبورد. آرگومان‌ها باید hashable باشند (لیست‌ها را قبل از صدا زدن به tuple تبدیل کنید).
+    شیء برگردانده‌شده بین همه هندلرها مشترک است و نباید تغییر داده شود.
+    """
+    def decorator(builder: Callable) -> Callable:
+        cached = functools.lru_cache(maxsize=maxsize)(builder)
+        _registry[f"{builder.__module__}.{builder.__qualname__}"] = cached
+        return cached
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+def clear_keyboard_cache():
+    """پاک کردن همه کیبوردهای ساخته‌شده (مثلا بعد از تغییر متن دکمه‌ها در زمان اجرا)"""
+    for cached in _registry.values():
+        cached.cache_clear()
+    logger.info("🔄 کش کیبوردها پاک شد")
+
+
+def get_keyboard_stats() -> Dict[str, Any]:
+    """آمار کش کیبوردها"""
+    hits = misses = entries = 0
+    for cached in _registry.values():
+        info = cached.cache_info()
+        hits += info.hits
+        misses += info.misses
+        entries += info.currsize
+    return {
+        'keyboards': len(_registry),
+        'entries': entries,
+        'hits': hits,
+        'builds': misses
+    }
+
+
+def _measure(build: Callable[[], Any], iterations: int) -> Dict[str, float]:
+    """میانگین زمان و حافظه تخصیص‌یافته برای هر فراخوانی"""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        build()
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    keep = [build() for _ in range(min(iterations, 200))]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del keep
+
+    return {
+        'us_per_call': elapsed / iterations * 1_000_000,
+        'bytes_per_call': max(allocated, 0) / min(iterations, 200)
+    }
+
+
+def benchmark_keyboards(iterations: int = 2000) -> Dict[str, Dict[str, float]]:
+    """
+    مقایسه ساخت دوباره کیبوردهای ثابت (تابع اصلی) با نسخه کش‌شده.
+    خروجی: {نام کیبورد: {built_us, cached_us, built_bytes, cached_bytes}}
+    """
+    # ایمپورت ماژول‌های کیبورد تا همه کیبوردها در رجیستری ثبت شوند
+    import keyboards  # noqa: F401
+    import reminder.reminder_keyboards  # noqa: F401
+    import reminder.advanced_reminder_keyboards  # noqa: F401
+    import utils.keyboard_utils  # noqa: F401
+
+    results = {}
+    for name, cached in sorted(_registry.items()):
+        if cached.__wrapped__.__code__.co_argcount:
+            continue  # فقط کیبوردهای بدون آرگومان
+        cached()
+        built = _measure(cached.__wrapped__, iterations)
+        hit = _measure(cached, iterations)
+        results[name] = {
+            'built_us': built['us_per_call'],
+            'cached_us': hit['us_per_call'],
+            'built_bytes': built['bytes_per_call'],
+            'cached_bytes': hit['bytes_per_call']
+        }
+    return results
+
+
+if __name__ == "__main__":
+    # اجرا با python -m: رجیستری اصلی از ماژول ایمپورت‌شده خوانده می‌شود نه از __main__
+    from utils.keyboard_registry import benchmark_keyboards as run_benchmark
+
+    results = run_benchmark()
+    print(f"{'keyboard':60} {'built µs':>9} {'cached µs':>9} {'built B':>9} {'cached B':>9}")
+    for name, row in results.items():
+        print(
+            f"{name:60} {row['built_us']:9.2f} {row['cached_us']:9.2f} "
+            f"{row['built_bytes']:9.0f} {row['cached_bytes']:9.0f}"
+        )
+    total_built = sum(row['built_bytes'] for row in results.values())
+    total_cached = sum(row['cached_bytes'] for row in results.values())
+    print(f"\nمجموع حافظه تخصیص‌یافته در هر دور: {total_built:.0f}B -> {total_cached:.0f}B")
@@ -3,6 +3,9 @@
 """
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
+from utils.keyboard_registry import cached_keyboard
+
+@cached_keyboard
 def create_study_plan_keyboard() -> InlineKeyboardMarkup:
     """
     ایجاد کیبورد پیشرفته برای برنامه مطالعاتی
@@ -30,6 +33,7 @@ def create_study_plan_keyboard() -> InlineKeyboardMarkup:
     ]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
+@cached_keyboard
 def create_stats_keyboard() -> InlineKeyboardMarkup:
     """
     ایجاد کیبورد پیشرفته برای آمار مطالعه
@@ -1,62 +1,185 @@
 """
 توابع مربوط به سیستم عضویت اجباری
 """
+import asyncio
 import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
 from aiogram import Bot
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
-from database import Database
+
+from config import MEMBERSHIP_CACHE_TTL, MEMBERSHIP_NEGATIVE_TTL
+from utils.async_db import async_db
+from utils.channel_registry import channel_registry
 
 logger = logging.getLogger(__name__)
-db = Database()
+db = async_db  # فراخوانی‌های دیتابیس روی thread اختصاصی اجرا و await می‌شوند
+
+MEMBER_STATUSES = ('member', 'administrator', 'creator')
 
-async def check_user_membership(bot: Bot, user_id: int) -> bool:
+
+class MembershipCache:
+    """
+    کش دو لایه عضویت (حافظه + جدول channel_memberships):
+    - عضو بودن positive_ttl ثانیه و عضو نبودن negative_ttl ثانیه معتبر است
+    - فقط کانال‌هایی که در کش معتبر نیستند هم‌زمان از تلگرام پرسیده می‌شوند
+    - خطای API کش نمی‌شود (کاربر تا بررسی موفق بعدی عضو حساب نمی‌شود)
     """
-    بررسی عضویت کاربر در تمام کانال‌های اجباری
+
+    def __init__(self, positive_ttl: int = MEMBERSHIP_CACHE_TTL,
+                 negative_ttl: int = MEMBERSHIP_NEGATIVE_TTL, max_entries: int = 100000):
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        # (user_id, channel_id) -> (is_member, expires_at با time.monotonic)
+        self._entries: "OrderedDict[Tuple[int, int], Tuple[bool, float]]" = OrderedDict()
+        self.stats = {
+            'memory_hits': 0,
+            'db_hits': 0,
+            'api_calls': 0,
+            'api_errors': 0
+        }
+
+    def _ttl(self, is_member: bool) -> int:
+        return self.positive_ttl if is_member else self.negative_ttl
+
+    def _remember(self, user_id: int, channel_id: int, is_member: bool, age: float = 0.0):
+        expires_at = time.monotonic() + self._ttl(is_member) - age
+        key = (user_id, channel_id)
+        self._entries[key] = (is_member, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _from_memory(self, user_id: int, channel_id: int, force: bool) -> Optional[bool]:
+        entry = self._entries.get((user_id, channel_id))
+        if entry is None:
+            return None
+        is_member, expires_at = entry
+        if expires_at <= time.monotonic() or (force and not is_member):
+            return None
+        return is_member
+
+    def invalidate(self, user_id: Optional[int] = None):
+        """پاک کردن کش یک کاربر (یا کل کش)"""
+        if user_id is None:
+            self._entries.clear()
+        else:
+            for key in [key for key in self._entries if key[0] == user_id]:
+                del self._entries[key]
+
+    async def _fetch(self, bot: Bot, channel_id: int, user_id: int) -> Optional[bool]:
+        """پرسیدن عضویت از تلگرام (None در صورت خطا)"""
+        self.stats['api_calls'] += 1
+        try:
+            member = await bot.get_chat_member(channel_id, user_id)
+            return member.status in MEMBER_STATUSES
+        except Exception as e:
+            self.stats['api_errors'] += 1
+            logger.error(f"خطا در بررسی عضویت کاربر {user_id} در کانال {channel_id}: {e}")
+            return None
+
+    async def get_statuses(self, bot: Bot, user_id: int, channels: List[Dict[str, Any]],
+                           force: bool = False) -> Dict[int, bool]:
+        """
+        وضعیت عضویت کاربر در هر کانال: {channel_id: is_member}
+        force=True: نتیجه منفی کش‌شده نادیده گرفته می‌شود (مثلا بعد از زدن «بررسی عضویت»)
+        """
+        statuses: Dict[int, bool] = {}
+        missing = []
+        for channel in channels:
+            cached = self._from_memory(user_id, channel['channel_id'], force)
+            if cached is None:
+                missing.append(channel['channel_id'])
+            else:
+                statuses[channel['channel_id']] = cached
+        self.stats['memory_hits'] += len(statuses)
+
+        if missing:
+            stored = await db.get_user_channel_memberships(user_id)
+            now = datetime.utcnow()
+            for channel_id in list(missing):
+                row = stored.get(channel_id)
+                if row is None or not row['last_checked'] or (force and not row['is_member']):
+                    continue
+                age = (now - datetime.strptime(row['last_checked'], '%Y-%m-%d %H:%M:%S')).total_seconds()
+                if age < self._ttl(row['is_member']):
+                    statuses[channel_id] = row['is_member']
+                    self._remember(user_id, channel_id, row['is_member'], age)
+                    missing.remove(channel_id)
+                    self.stats['db_hits'] += 1
+
+        if missing:
+            results = await asyncio.gather(*(self._fetch(bot, channel_id, user_id) for channel_id in missing))
+            checked = {}
+            for channel_id, is_member in zip(missing, results):
+                statuses[channel_id] = bool(is_member)
+                if is_member is not None:
+                    checked[channel_id] = is_member
+                    self._remember(user_id, channel_id, is_member)
+            await db.update_channel_memberships(user_id, checked)
+
+        return statuses
+
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار کش عضویت"""
+        stats = dict(self.stats)
+        stats['entries'] = len(self._entries)
+        return stats
+
+
+# ایجاد instance اصلی
+membership_cache = MembershipCache()
+
+
+async def check_user_membership(bot: Bot, user_id: int, force: bool = False) -> bool:
+    """
+    بررسی عضویت کاربر در تمام کانال‌های اجباری (با کش عضویت)
     
     Args:
         bot: نمونه ربات
         user_id: آیدی عددی کاربر
+        force: نادیده گرفتن نتیجه منفی کش‌شده
     
     Returns:
         bool: True اگر کاربر در همه کانال‌ها عضو باشد
     """
-    channels = db.get_mandatory_channels()
+    channels = await channel_registry.get()
     
     if not channels:
         logger.info("هیچ کانال اجباری تعریف نشده است")
         return True  # اگر کانال اجباری وجود ندارد
     
-    logger.info(f"بررسی عضویت کاربر {user_id} در {len(channels)} کانال")
+    statuses = await membership_cache.get_statuses(bot, user_id, channels, force=force)
     
     for channel in channels:
-        try:
-            member = await bot.get_chat_member(channel['channel_id'], user_id)
-            is_member = member.status in ['member', 'administrator', 'creator']
-            
-            # بروزرسانی وضعیت در دیتابیس
-            db.update_channel_membership(user_id, channel['channel_id'], is_member)
-            
-            if not is_member:
-                logger.warning(f"کاربر {user_id} در کانال {channel['channel_title']} عضو نیست")
-                return False
-                
-            logger.info(f"کاربر {user_id} در کانال {channel['channel_title']} عضو است")
-            
-        except Exception as e:
-            logger.error(f"خطا در بررسی عضویت کاربر {user_id} در کانال {channel['channel_title']}: {e}")
+        if not statuses.get(channel['channel_id']):
+            logger.warning(f"کاربر {user_id} در کانال {channel['channel_title']} عضو نیست")
             return False
     
-    logger.info(f"کاربر {user_id} در تمام کانال‌های اجباری عضو است")
+    logger.debug(f"کاربر {user_id} در تمام کانال‌های اجباری عضو است")
     return True
 
-def create_membership_keyboard():
+# کیبورد عضویت ساخته‌شده برای هر نسخه رجیستری کانال‌ها: (version, markup)
+_membership_keyboard: Optional[Tuple[int, InlineKeyboardMarkup]] = None
+
+async def create_membership_keyboard():
     """
-    ایجاد کیبورد برای عضویت در کانال‌های اجباری
+    ایجاد کیبورد برای عضویت در کانال‌های اجباری (تا تغییر کانال‌ها از کش)
     
     Returns:
         InlineKeyboardMarkup: کیبورد با لینک‌های عضویت
     """
-    channels = db.get_mandatory_channels()
+    global _membership_keyboard
+    # get() اول صدا زده می‌شود تا تغییرات instanceهای دیگر (بعد از ttl) نسخه را زیاد کنند
+    channels = await channel_registry.get()
+    version = channel_registry.version
+    if _membership_keyboard is not None and _membership_keyboard[0] == version:
+        return _membership_keyboard[1]
+    
     keyboard = []
     
     if not channels:
@@ -82,7 +205,9 @@ def create_membership_keyboard():
     ])
     
     logger.info("کیبورد عضویت با موفقیت ایجاد شد")
-    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+    markup = InlineKeyboardMarkup(inline_keyboard=keyboard)
+    _membership_keyboard = (version, markup)
+    return markup
 
 async def get_membership_status(bot: Bot, user_id: int) -> dict:
     """
@@ -95,7 +220,7 @@ async def get_membership_status(bot: Bot, user_id: int) -> dict:
     Returns:
         dict: وضعیت عضویت در هر کانال
     """
-    channels = db.get_mandatory_channels()
+    channels = await channel_registry.get()
     status = {
         'user_id': user_id,
         'total_channels': len(channels),
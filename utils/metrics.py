@@ -0,0 +1,248 @@
+"""
+متریک‌های داخلی ربات به فرمت متنی Prometheus - counter، gauge و histogram با باکت‌های ثابت.
+ثبت هر مقدار فقط یک lookup دیکشنری و یک bisect است (بدون قفل؛ همه از thread event loop
+به‌روزرسانی می‌شوند) و متن خروجی فقط هنگام درخواست /metrics ساخته می‌شود.
+
+هزینه هر ثبت و ساخت خروجی:
+    python -m utils.metrics
+"""
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+
+# باکت‌های پیش‌فرض زمان (ثانیه)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# زمان تحویل ریمایندر از شروع دسته صف تا پاسخ تلگرام (شامل انتظار در صف rate limit)
+SEND_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """پایه متریک‌ها - هر سری با tuple مقدار labelها شناخته می‌شود"""
+
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[tuple, object] = {}
+
+    def _labels(self, values: tuple, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, values)]
+        if extra is not None:
+            pairs.append(f'{extra[0]}="{extra[1]}"')
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def _header(self) -> List[str]:
+        return [f'# HELP {self.name} {_escape(self.documentation)}', f'# TYPE {self.name} {self.kind}']
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for labels, value in sorted(self._series.items()):
+            lines.append(f'{self.name}{self._labels(labels)} {_format_value(value)}')
+        return lines
+
+
+class Counter(_Metric):
+    """شمارنده فقط افزایشی"""
+
+    kind = 'counter'
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._series[labels] = self._series.get(labels, 0) + amount
+
+    def total(self) -> float:
+        return sum(self._series.values())
+
+
+class Gauge(_Metric):
+    """مقدار لحظه‌ای؛ با set_function مقدار فقط هنگام ساخت خروجی خوانده می‌شود"""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, *labels: str):
+        self._series[labels] = value
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._series[labels] = self._series.get(labels, 0) + amount
+
+    def set_function(self, function: Callable[[], float]):
+        """گیج بدون label که مقدارش از function خوانده می‌شود (مثلا عمق صف)"""
+        self._function = function
+
+    def render(self) -> List[str]:
+        if self._function is not None:
+            try:
+                self._series[()] = self._function()
+            except Exception:
+                self._series.pop((), None)
+        return super().render()
+
+
+class Histogram(_Metric):
+    """
+    هیستوگرام با باکت‌های ثابت: برای هر سری تعداد هر باکت (غیر تجمعی) + مجموع نگه داشته می‌شود
+    و تجمعی کردن باکت‌ها فقط هنگام ساخت خروجی انجام می‌شود.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str):
+        series = self._series.get(labels)
+        if series is None:
+            # len(buckets) باکت + باکت +Inf + مجموع
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def time(self, *labels: str) -> '_Timer':
+        """context manager برای ثبت زمان اجرای یک بلوک"""
+        return _Timer(self, labels)
+
+    def total_count(self) -> int:
+        return sum(sum(series[:-1]) for series in self._series.values())
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        bounds = [_format_value(float(bound)) for bound in self.buckets] + ['+Inf']
+        for labels, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{self._labels(labels, ("le", bound))} {cumulative}')
+            lines.append(f'{self.name}_sum{self._labels(labels)} {_format_value(series[-1])}')
+            lines.append(f'{self.name}_count{self._labels(labels)} {cumulative}')
+        return lines
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram: Histogram, labels: tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class MetricsRegistry:
+    """مجموعه متریک‌های پروسه و ساخت متن /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"متریک {metric.name} قبلاً ثبت شده است")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# ایجاد instance اصلی
+registry = MetricsRegistry()
+
+# --- متریک‌های ربات ---
+
+UPDATE_SECONDS = registry.histogram(
+    'bot_update_handler_seconds', 'Update handling latency per handler', ('handler',)
+)
+UPDATE_ERRORS = registry.counter(
+    'bot_update_handler_errors_total', 'Updates whose handler raised', ('handler',)
+)
+SEND_SECONDS = registry.histogram(
+    'reminder_send_seconds', 'Reminder delivery time from outbox batch start', ('reminder_type',),
+    buckets=SEND_BUCKETS
+)
+SEND_TOTAL = registry.counter(
+    'reminder_send_total', 'Reminder outbox rows by outcome', ('reminder_type', 'outcome')
+)
+SCHEDULER_TICK_SECONDS = registry.histogram(
+    'scheduler_tick_seconds', 'Time spent firing due reminders in one timer engine tick'
+)
+SCHEDULER_LAG_SECONDS = registry.histogram(
+    'scheduler_fire_lag_seconds', 'Delay between scheduled and actual fire time', ('kind',)
+)
+SCHEDULER_FIRE_SECONDS = registry.histogram(
+    'scheduler_fire_seconds', 'Duration of a reminder source fire (building and enqueueing)', ('kind',)
+)
+DB_CALL_SECONDS = registry.histogram(
+    'db_call_seconds', 'Database call time seen by the event loop, including executor wait', ('method',)
+)
+BROADCAST_QUEUE_DEPTH = registry.gauge(
+    'broadcast_queue_depth', 'Messages waiting in the broadcast engine queue'
+)
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    """هندلر HTTP برای /metrics"""
+    return web.Response(body=registry.render().encode(), headers={'Content-Type': CONTENT_TYPE})
+
+
+if __name__ == "__main__":
+    bench = MetricsRegistry()
+    histogram = bench.histogram('bench_seconds', 'benchmark', ('handler',))
+    counter = bench.counter('bench_total', 'benchmark', ('type', 'outcome'))
+    handlers = [f"handler_{i}" for i in range(50)]
+    iterations = 200_000
+
+    started = time.perf_counter()
+    for i in range(iterations):
+        histogram.observe((i % 1000) / 1000, handlers[i % 50])
+    observe_ns = (time.perf_counter() - started) / iterations * 1e9
+
+    started = time.perf_counter()
+    for i in range(iterations):
+        counter.inc('exam', 'sent')
+    inc_ns = (time.perf_counter() - started) / iterations * 1e9
+
+    started = time.perf_counter()
+    text = bench.render()
+    render_ms = (time.perf_counter() - started) * 1000
+
+    print(f"observe: {observe_ns:.0f} ns   inc: {inc_ns:.0f} ns   "
+          f"render ({len(handlers)} سری، {len(text.splitlines())} خط): {render_ms:.2f} ms")
@@ -0,0 +1,75 @@
+"""
+کش پیام‌های رندرشده - متن و کیبورد صفحه‌هایی که برای همه کاربران در یک دقیقه یکسان هستند
+(مثل صفحه «همه کنکورها») فقط یک‌بار در هر دقیقه ساخته می‌شوند
+"""
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from aiogram.types import InlineKeyboardMarkup
+
+logger = logging.getLogger(__name__)
+
+Rendered = Tuple[str, Optional[InlineKeyboardMarkup]]
+
+
+class RenderCache:
+    """
+    کلید کش (screen, exam_key, شماره دقیقه) است؛ با شروع دقیقه جدید کلید عوض می‌شود
+    و نسخه قبلی با سیاست LRU کنار می‌رود. بخش‌های تصادفی پیام (جمله انگیزشی)
+    نباید داخل render باشند و بعد از گرفتن متن از کش اضافه می‌شوند.
+    """
+
+    def __init__(self, max_entries: int = 256, bucket_seconds: int = 60):
+        self.max_entries = max_entries
+        self.bucket_seconds = bucket_seconds
+        self._entries: "OrderedDict[Tuple[str, Hashable, int], Rendered]" = OrderedDict()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0
+        }
+
+    def _bucket(self) -> int:
+        return int(time.time() // self.bucket_seconds)
+
+    def get_or_render(self, screen: str, exam_key: Hashable,
+                      render: Callable[[], Rendered]) -> Rendered:
+        """متن و کیبورد صفحه از کش، یا ساختن با render() در اولین درخواست این دقیقه"""
+        key = (screen, exam_key, self._bucket())
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry
+
+        self.stats['misses'] += 1
+        entry = render()
+        self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+        return entry
+
+    def invalidate(self, screen: Optional[str] = None):
+        """پاک کردن کش یک صفحه (یا کل کش)"""
+        if screen is None:
+            self._entries.clear()
+        else:
+            for key in [key for key in self._entries if key[0] == screen]:
+                del self._entries[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار کش"""
+        stats = dict(self.stats)
+        lookups = stats['hits'] + stats['misses']
+        stats.update({
+            'entries': len(self._entries),
+            'hit_rate': round(stats['hits'] / lookups * 100, 1) if lookups else 0.0
+        })
+        return stats
+
+
+# ایجاد instance اصلی
+render_cache = RenderCache()
@@ -0,0 +1,320 @@
+"""
+مسیریابی ایندکس‌شده آپدیت‌ها - به جای ده‌ها فیلتر F.text == ... و F.data.startswith(...)
+که aiogram برای هر آپدیت یکی‌یکی امتحان می‌کند، هر Router یک دیکشنری متن‌های دقیق،
+یک دیکشنری state و یک trie پیشوندهای callback دارد.
+
+اولویت همان ترتیب ثبت است (اولین هندلر ثبت‌شده‌ای که می‌خورد برنده است)، پس رفتار
+با ثبت مستقیم روی dp یکسان می‌ماند؛ فقط هزینه انتخاب هندلر دیگر به تعداد دکمه‌ها بستگی ندارد.
+
+بنچمارک (آپدیت بر ثانیه، قبل/بعد):
+    python -m utils.routing
+"""
+import asyncio
+import itertools
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.dispatcher.event.handler import CallableObject
+from aiogram.filters import CommandObject
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import CallbackQuery, Message, Update
+
+from utils.metrics import UPDATE_ERRORS, UPDATE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# (ترتیب ثبت، هندلر)
+Route = Tuple[int, CallableObject]
+
+
+class PrefixTrie:
+    """trie کاراکتری پیشوندهای callback_data؛ جستجو O(طول داده) است نه O(تعداد پیشوندها)"""
+
+    _END = ''
+
+    def __init__(self):
+        self._root: Dict[str, Any] = {}
+        self.size = 0
+
+    def insert(self, prefix: str, route: Route):
+        node = self._root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        # برای پیشوند تکراری اولین ثبت حفظ می‌شود
+        if self._END not in node:
+            node[self._END] = route
+            self.size += 1
+
+    def first_match(self, data: str) -> Optional[Route]:
+        """زودترین route ثبت‌شده بین همه پیشوندهایی که data با آن‌ها شروع می‌شود"""
+        best = None
+        node = self._root
+        for char in data:
+            route = node.get(self._END)
+            if route is not None and (best is None or route[0] < best[0]):
+                best = route
+            node = node.get(char)
+            if node is None:
+                return best
+        route = node.get(self._END)
+        if route is not None and (best is None or route[0] < best[0]):
+            best = route
+        return best
+
+
+def _earliest(*routes: Optional[Route]) -> Optional[Route]:
+    best = None
+    for route in routes:
+        if route is not None and (best is None or route[0] < best[0]):
+            best = route
+    return best
+
+
+class IndexedRouter(Router):
+    """
+    Router با ایندکس: روی خودش فقط یک هندلر message و یک هندلر callback_query ثبت می‌کند
+    که با lookup در دیکشنری/trie هندلر مقصد را پیدا و اجرا می‌کند.
+    هندلرهای مقصد مثل هندلرهای عادی aiogram فقط آرگومان‌هایی را می‌گیرند که در امضایشان هست.
+    """
+
+    def __init__(self, name: Optional[str] = None):
+        super().__init__(name=name)
+        self._order = itertools.count()
+        self._texts: Dict[str, Route] = {}
+        self._commands: Dict[str, Route] = {}
+        self._states: Dict[str, Route] = {}
+        self._fallback: Optional[Route] = None
+        self._callbacks: Dict[str, Route] = {}
+        self._prefixes = PrefixTrie()
+        self.stats = {
+            'routed_messages': 0,
+            'routed_callbacks': 0,
+            'unmatched': 0
+        }
+        self.message.register(self._dispatch, self._match_message)
+        self.callback_query.register(self._dispatch, self._match_callback)
+
+    # --- ثبت ---
+
+    def _add(self, index: Dict[str, Route], key: str) -> Callable:
+        def decorator(callback: Callable) -> Callable:
+            # کلید تکراری: مثل aiogram اولین هندلر ثبت‌شده برنده است
+            index.setdefault(key, (next(self._order), CallableObject(callback)))
+            return callback
+        return decorator
+
+    def text(self, text: str) -> Callable:
+        """معادل F.text == text"""
+        return self._add(self._texts, text)
+
+    def command(self, command: str) -> Callable:
+        """معادل Command(command) (و CommandStart برای "start")"""
+        return self._add(self._commands, command)
+
+    def state(self, state: State) -> Callable:
+        """هر پیامی در این state"""
+        return self._add(self._states, state.state)
+
+    def callback(self, data: str) -> Callable:
+        """معادل F.data == data"""
+        return self._add(self._callbacks, data)
+
+    def callback_prefix(self, prefix: str) -> Callable:
+        """معادل F.data.startswith(prefix)"""
+        def decorator(callback: Callable) -> Callable:
+            self._prefixes.insert(prefix, (next(self._order), CallableObject(callback)))
+            return callback
+        return decorator
+
+    def fallback(self) -> Callable:
+        """هر پیامی که هندلر قبلی نداشته باشد (معادل ()message@)"""
+        def decorator(callback: Callable) -> Callable:
+            if self._fallback is None:
+                self._fallback = (next(self._order), CallableObject(callback))
+            return callback
+        return decorator
+
+    # --- انتخاب هندلر ---
+
+    async def _command_route(self, text: str, bot: Bot) -> Tuple[Optional[Route], Optional[CommandObject]]:
+        full_command, _, args = text.partition(' ')
+        name, _, mention = full_command[1:].partition('@')
+        route = self._commands.get(name)
+        if route is None:
+            return None, None
+        if mention and mention.lower() != ((await bot.me()).username or '').lower():
+            # دستور برای ربات دیگری در گروه است
+            return None, None
+        return route, CommandObject(prefix='/', command=name, mention=mention or None,
+                                    args=args.strip() or None)
+
+    async def _match_message(self, message: Message, bot: Bot,
+                             raw_state: Optional[str] = None) -> Any:
+        text = message.text
+        command_route = command = None
+        if text:
+            text_route = self._texts.get(text)
+            if self._commands and text[0] == '/':
+                command_route, command = await self._command_route(text, bot)
+        else:
+            text_route = None
+        state_route = self._states.get(raw_state) if raw_state else None
+
+        route = _earliest(text_route, command_route, state_route, self._fallback)
+        if route is None:
+            self.stats['unmatched'] += 1
+            return False
+        self.stats['routed_messages'] += 1
+        result = {'route': route[1]}
+        if route is command_route:
+            result['command'] = command
+        return result
+
+    async def _match_callback(self, callback: CallbackQuery) -> Any:
+        data = callback.data
+        if data is None:
+            return False
+        route = _earliest(self._callbacks.get(data), self._prefixes.first_match(data))
+        if route is None:
+            self.stats['unmatched'] += 1
+            return False
+        self.stats['routed_callbacks'] += 1
+        return {'route': route[1]}
+
+    @staticmethod
+    async def _dispatch(event: Any, route: CallableObject, **kwargs: Any) -> Any:
+        handler = route.callback.__name__
+        started = time.perf_counter()
+        try:
+            return await route.call(event, **kwargs)
+        except Exception:
+            UPDATE_ERRORS.inc(handler)
+            raise
+        finally:
+            UPDATE_SECONDS.observe(time.perf_counter() - started, handler)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار و اندازه ایندکس‌های این Router"""
+        stats = dict(self.stats)
+        stats.update({
+            'name': self.name,
+            'texts': len(self._texts),
+            'commands': len(self._commands),
+            'states': len(self._states),
+            'callbacks': len(self._callbacks),
+            'callback_prefixes': self._prefixes.size
+        })
+        return stats
+
+
+# --- بنچمارک ---
+
+def _fake_message_update(update_id: int, text: str) -> Update:
+    return Update.model_validate({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 0,
+            'chat': {'id': 1, 'type': 'private'},
+            'from': {'id': 1, 'is_bot': False, 'first_name': 'Bench'},
+            'text': text
+        }
+    })
+
+
+def _fake_callback_update(update_id: int, data: str) -> Update:
+    return Update.model_validate({
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'chat_instance': '1',
+            'from': {'id': 1, 'is_bot': False, 'first_name': 'Bench'},
+            'data': data
+        }
+    })
+
+
+def _build_linear(buttons: List[str], prefixes: List[str]) -> Dispatcher:
+    """چیدمان قبلی: هر دکمه یک فیلتر جدا روی dp"""
+    dp = Dispatcher(storage=MemoryStorage())
+
+    async def noop(event: Any):
+        return None
+
+    for text in buttons:
+        dp.message.register(noop, F.text == text)
+    dp.message.register(noop)
+    for prefix in prefixes:
+        dp.callback_query.register(noop, F.data.startswith(prefix))
+    return dp
+
+
+def _build_indexed(buttons: List[str], prefixes: List[str]) -> Dispatcher:
+    dp = Dispatcher(storage=MemoryStorage())
+    router = IndexedRouter(name='bench')
+
+    async def noop(event: Any):
+        return None
+
+    for text in buttons:
+        router.text(text)(noop)
+    router.fallback()(noop)
+    for prefix in prefixes:
+        router.callback_prefix(prefix)(noop)
+    dp.include_router(router)
+    return dp
+
+
+def benchmark_routing(buttons: int = 100, prefixes: int = 20,
+                      iterations: int = 300) -> List[Dict[str, Any]]:
+    """
+    آپدیت بر ثانیه از dp.feed_update (بدون شبکه) برای بدترین حالت چیدمان خطی:
+    آخرین دکمه، پیام متنی آزاد (catch-all) و آخرین پیشوند callback
+    """
+    texts = [f"دکمه {i}" for i in range(buttons)]
+    prefix_list = [f"feature{i}:" for i in range(prefixes)]
+    # توکن ساختگی - هندلرها چیزی ارسال نمی‌کنند
+    bot = Bot(token="42:BENCHMARK")
+    cases = [
+        ('last_button', lambda i: _fake_message_update(i, texts[-1])),
+        ('catch_all', lambda i: _fake_message_update(i, "متن آزاد")),
+        ('last_callback', lambda i: _fake_callback_update(i, f"{prefix_list[-1]}42")),
+    ]
+
+    async def run(dp: Dispatcher, make_update: Callable[[int], Update]) -> float:
+        updates = [make_update(i) for i in range(iterations)]
+        for update in updates[:100]:
+            await dp.feed_update(bot, update)
+        started = time.perf_counter()
+        for update in updates:
+            await dp.feed_update(bot, update)
+        return iterations / (time.perf_counter() - started)
+
+    async def run_all() -> List[Dict[str, Any]]:
+        linear = _build_linear(texts, prefix_list)
+        indexed = _build_indexed(texts, prefix_list)
+        results = []
+        for case, make_update in cases:
+            before = await run(linear, make_update)
+            after = await run(indexed, make_update)
+            results.append({
+                'case': case,
+                'linear_ups': round(before),
+                'indexed_ups': round(after),
+                'speedup': round(after / before, 2)
+            })
+        await bot.session.close()
+        return results
+
+    return asyncio.run(run_all())
+
+
+if __name__ == "__main__":
+    for buttons in (10, 100, 300):
+        print(f"--- {buttons} دکمه ---")
+        for row in benchmark_routing(buttons=buttons):
+            print(f"{row['case']:<14} قبل: {row['linear_ups']:>7} آپدیت/ثانیه   "
+                  f"بعد: {row['indexed_ups']:>7} آپدیت/ثانیه   x{row['speedup']}")
@@ -2,7 +2,7 @@
 ابزارهای مربوط به مطالعه و برنامه‌ریزی
 """
 import random
-from datetime import datetime
+from datetime import date
 from typing import List, Dict, Any
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
@@ -76,8 +76,8 @@ def calculate_streak(study_days: List[str]) -> int:
     if not study_days:
         return 0
     
-    # تبدیل تاریخ‌ها به datetime و مرتب‌سازی
-    dates = sorted([datetime.strptime(day, '%Y-%m-%d').date() for day in study_days])
+    # تبدیل تاریخ‌ها به date و مرتب‌سازی (fromisoformat چند برابر سریع‌تر از strptime است)
+    dates = sorted(date.fromisoformat(day) for day in study_days)
     
     streak = 1
     current_date = dates[-1]
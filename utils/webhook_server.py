@@ -0,0 +1,151 @@
+"""
+حالت وب‌هوک - سرور aiohttp که آپدیت‌های تلگرام را روی WEBHOOK_PATH دریافت می‌کند
+و /health، /ready و /metrics را روی همان PORT سرو می‌کند
+
+تست محلی بدون تلگرام (WEBHOOK_BASE_URL خالی است و وب‌هوک ثبت نمی‌شود):
+    BOT_MODE=webhook python main.py
+    python -m utils.webhook_server --text "/start" --count 20
+"""
+import argparse
+import asyncio
+import logging
+import signal
+import time
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+
+from config import PORT, WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_SECRET
+from utils.health_monitor import health_check_handler, readiness_check_handler
+from utils.metrics import metrics_handler
+
+logger = logging.getLogger(__name__)
+
+
+def create_webhook_app(dp: Dispatcher, bot: Bot, path: str = WEBHOOK_PATH,
+                       secret_token: Optional[str] = WEBHOOK_SECRET) -> web.Application:
+    """
+    اپلیکیشن aiohttp با مسیر وب‌هوک aiogram و مسیرهای سلامت.
+    آپدیت‌ها در پس‌زمینه پردازش می‌شوند و پاسخ 200 بلافاصله به تلگرام برمی‌گردد.
+    """
+    app = create_status_app()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=secret_token or None
+    ).register(app, path=path)
+    return app
+
+
+def create_status_app() -> web.Application:
+    """اپلیکیشن aiohttp فقط با مسیرهای سلامت و متریک‌ها"""
+    app = web.Application()
+    app.router.add_get('/health', health_check_handler)
+    app.router.add_get('/ready', readiness_check_handler)
+    app.router.add_get('/metrics', metrics_handler)
+    return app
+
+
+async def start_status_server(host: str = '0.0.0.0', port: int = PORT) -> web.AppRunner:
+    """اجرای سرور وضعیت در حالت polling؛ runner برگردانده می‌شود تا هنگام خاموشی cleanup شود"""
+    runner = web.AppRunner(create_status_app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"📊 سرور وضعیت روی پورت {port} اجرا شد (/health، /ready، /metrics)")
+    return runner
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, host: str = '0.0.0.0', port: int = PORT):
+    """اجرای سرور وب‌هوک تا دریافت SIGINT/SIGTERM یا cancel شدن"""
+    app = create_webhook_app(dp, bot)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    logger.info(f"🌐 سرور وب‌هوک روی پورت {port} اجرا شد ({WEBHOOK_PATH}، /health، /ready، /metrics)")
+
+    if WEBHOOK_BASE_URL:
+        url = WEBHOOK_BASE_URL.rstrip('/') + WEBHOOK_PATH
+        await bot.set_webhook(
+            url,
+            secret_token=WEBHOOK_SECRET or None,
+            allowed_updates=dp.resolve_used_update_types(),
+            # آپدیت‌های صف‌شده در زمان ری‌استارت یا استقرار باید پردازش شوند
+            drop_pending_updates=False
+        )
+        logger.info(f"🔗 وب‌هوک روی {url} ثبت شد")
+    else:
+        logger.warning("⚠️ WEBHOOK_BASE_URL تنظیم نشده - وب‌هوک در تلگرام ثبت نشد (حالت تست محلی)")
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            # ویندوز یا thread غیر اصلی
+            pass
+
+    try:
+        await dp.emit_startup(bot=bot)
+        await stop_event.wait()
+    finally:
+        # وب‌هوک حذف نمی‌شود تا آپدیت‌های زمان ری‌استارت در تلگرام منتظر بمانند
+        await dp.emit_shutdown(bot=bot)
+        await runner.cleanup()
+        logger.info("🛑 سرور وب‌هوک متوقف شد")
+
+
+# --- ارسال آپدیت آزمایشی (جای تلگرام) ---
+
+def build_fake_update(update_id: int, text: str, user_id: int) -> Dict[str, Any]:
+    """یک آپدیت پیام متنی با همان ساختار JSON تلگرام"""
+    now = int(time.time())
+    user = {'id': user_id, 'is_bot': False, 'first_name': 'Test', 'username': f'test_{user_id}'}
+    message = {
+        'message_id': update_id,
+        'date': now,
+        'chat': {'id': user_id, 'type': 'private', 'first_name': 'Test'},
+        'from': user,
+        'text': text
+    }
+    if text.startswith('/'):
+        command = text.split()[0]
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+    return {'update_id': update_id, 'message': message}
+
+
+async def post_fake_updates(url: str, text: str, user_id: int, count: int = 1,
+                            secret_token: Optional[str] = WEBHOOK_SECRET) -> List[Dict[str, Any]]:
+    """ارسال count آپدیت به سرور وب‌هوک؛ خروجی: وضعیت HTTP و زمان پاسخ هر درخواست"""
+    headers = {'X-Telegram-Bot-Api-Secret-Token': secret_token} if secret_token else {}
+    base_id = int(time.time() * 1000) % 1_000_000_000
+    results = []
+    async with aiohttp.ClientSession(headers=headers) as session:
+        for i in range(count):
+            started = time.perf_counter()
+            async with session.post(url, json=build_fake_update(base_id + i, text, user_id)) as response:
+                await response.read()
+                results.append({
+                    'status': response.status,
+                    'ms': round((time.perf_counter() - started) * 1000, 2)
+                })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ارسال آپدیت آزمایشی به سرور وب‌هوک محلی")
+    parser.add_argument('--url', default=f"http://127.0.0.1:{PORT}{WEBHOOK_PATH}")
+    parser.add_argument('--text', default="/start")
+    parser.add_argument('--user-id', type=int, default=1)
+    parser.add_argument('--count', type=int, default=1)
+    args = parser.parse_args()
+
+    results = asyncio.run(post_fake_updates(args.url, args.text, args.user_id, args.count))
+    statuses = sorted({result['status'] for result in results})
+    latencies = sorted(result['ms'] for result in results)
+    print(f"{len(results)} آپدیت ارسال شد - وضعیت‌ها: {statuses}")
+    print(f"زمان پاسخ: min={latencies[0]}ms median={latencies[len(latencies) // 2]}ms max={latencies[-1]}ms")
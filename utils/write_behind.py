@@ -0,0 +1,220 @@
+"""
+بافر write-behind - جمع کردن نوشتن‌های پرتکرار و کم‌اهمیت (ثبت کاربر با /start و زمان
+فعالیت کاربر در هر آپدیت) و ثبت آن‌ها به صورت دسته‌ای در یک تراکنش executemany
+"""
+import asyncio
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Hashable, List, Optional
+
+from utils.db_connection import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindChannel:
+    """
+    یک نوع نوشتن در بافر:
+    - keyed: برای هر کلید فقط آخرین مقدار نگه داشته می‌شود (last-writer-wins)
+    - غیر keyed: ردیف‌ها به ترتیب اضافه و یکجا درج می‌شوند
+    """
+
+    def __init__(self, name: str, sql: str, keyed: bool = False):
+        self.name = name
+        self.sql = sql
+        self.keyed = keyed
+        self.pending: Any = {} if keyed else []
+
+    def take(self) -> List[tuple]:
+        """برداشتن ردیف‌های منتظر و خالی کردن کانال"""
+        rows = list(self.pending.values()) if self.keyed else self.pending
+        self.pending = {} if self.keyed else []
+        return rows
+
+    def restore(self, rows: List[tuple], keys: Optional[List[Hashable]] = None):
+        """برگرداندن ردیف‌ها بعد از خطای ثبت (مقدارهای جدیدتر همان کلید حفظ می‌شوند)"""
+        if self.keyed:
+            for key, row in zip(keys, rows):
+                self.pending.setdefault(key, row)
+        else:
+            self.pending[:0] = rows
+
+    def __len__(self):
+        return len(self.pending)
+
+
+class WriteBehindBuffer:
+    """
+    بافر مشترک برای هر فایل دیتابیس. نوشتن‌ها در حافظه جمع می‌شوند و وقتی
+    تعدادشان به max_pending برسد یا flush_interval بگذرد، همه کانال‌ها
+    (به ترتیب ثبت) در یک تراکنش روی اتصال نوشتن ثبت می‌شوند.
+    """
+
+    def __init__(self, connections: ConnectionManager, max_pending: int = 500,
+                 flush_interval: float = 2.0, max_batch_failures: int = 3):
+        self.connections = connections
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        # بعد از این تعداد خطای پشت سر هم، ردیف‌ها تک‌تک ثبت و ردیف‌های خراب کنار گذاشته می‌شوند
+        self.max_batch_failures = max_batch_failures
+        self._batch_failures = 0
+        self._channels: Dict[str, WriteBehindChannel] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.stats = {
+            'queued': 0,
+            'coalesced': 0,
+            'flushed_rows': 0,
+            'flushes': 0,
+            'errors': 0,
+            'dropped_rows': 0,
+            'last_flush_ms': None
+        }
+
+    # --- ثبت کانال‌ها ---
+
+    def register(self, name: str, sql: str, keyed: bool = False):
+        """ثبت یک کانال (ثبت دوباره با همان نام بی‌اثر است)"""
+        with self._lock:
+            if name not in self._channels:
+                self._channels[name] = WriteBehindChannel(name, sql, keyed)
+
+    # --- افزودن نوشتن‌ها ---
+
+    def put(self, name: str, key: Hashable, params: tuple):
+        """نوشتن keyed - مقدار قبلی همان کلید جایگزین می‌شود"""
+        with self._lock:
+            channel = self._channels[name]
+            if key in channel.pending:
+                self.stats['coalesced'] += 1
+            channel.pending[key] = params
+            self.stats['queued'] += 1
+            full = self.pending_count() >= self.max_pending
+        if full:
+            self.flush()
+
+    def append(self, name: str, params: tuple):
+        """افزودن یک ردیف به کانال append"""
+        with self._lock:
+            self._channels[name].pending.append(params)
+            self.stats['queued'] += 1
+            full = self.pending_count() >= self.max_pending
+        if full:
+            self.flush()
+
+    def pending_count(self) -> int:
+        return sum(len(channel) for channel in self._channels.values())
+
+    # --- ثبت در دیتابیس ---
+
+    def flush(self, names: Optional[List[str]] = None) -> int:
+        """ثبت نوشتن‌های منتظر (همه کانال‌ها یا فقط names) در یک تراکنش"""
+        with self._flush_lock:
+            with self._lock:
+                batch = []
+                for channel in self._channels.values():
+                    if names is not None and channel.name not in names:
+                        continue
+                    if not len(channel):
+                        continue
+                    keys = list(channel.pending.keys()) if channel.keyed else None
+                    batch.append((channel, keys, channel.take()))
+
+            if not batch:
+                return 0
+
+            started = time.monotonic()
+            try:
+                with self.connections.write() as conn:
+                    cursor = conn.cursor()
+                    if self._batch_failures >= self.max_batch_failures:
+                        count = self._write_rows_one_by_one(cursor, batch)
+                    else:
+                        for channel, _, rows in batch:
+                            cursor.executemany(channel.sql, rows)
+                        count = sum(len(rows) for _, _, rows in batch)
+            except Exception as e:
+                self.stats['errors'] += 1
+                self._batch_failures += 1
+                logger.error(f"❌ خطا در ثبت بافر write-behind (تلاش {self._batch_failures}): {e}")
+                with self._lock:
+                    for channel, keys, rows in batch:
+                        channel.restore(rows, keys)
+                return 0
+
+            self._batch_failures = 0
+            self.stats['flushes'] += 1
+            self.stats['flushed_rows'] += count
+            self.stats['last_flush_ms'] = round((time.monotonic() - started) * 1000, 2)
+            return count
+
+    def _write_rows_one_by_one(self, cursor, batch: List[tuple]) -> int:
+        """
+        ثبت تک‌تک ردیف‌ها بعد از خطاهای پشت سر هم دسته؛ ردیفی که خطای داده دارد لاگ و حذف می‌شود
+        تا یک ردیف خراب کل بافر را برای همیشه نگه ندارد (خطای قفل/اتصال دوباره بالا می‌رود)
+        """
+        count = 0
+        for channel, _, rows in batch:
+            for row in rows:
+                try:
+                    cursor.execute(channel.sql, row)
+                    count += 1
+                except sqlite3.OperationalError:
+                    raise
+                except sqlite3.Error as e:
+                    self.stats['dropped_rows'] += 1
+                    logger.error(f"🗑️ ردیف خراب کانال {channel.name} کنار گذاشته شد: {row} ({e})")
+        return count
+
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار بافر"""
+        stats = dict(self.stats)
+        with self._lock:
+            stats['pending'] = {name: len(channel) for name, channel in self._channels.items()}
+        return stats
+
+
+_buffers: Dict[str, WriteBehindBuffer] = {}
+_buffers_lock = threading.Lock()
+
+
+def get_write_behind(connections: ConnectionManager) -> WriteBehindBuffer:
+    """بافر مشترک برای هر فایل دیتابیس (همه کلاس‌ها در یک تراکنش ثبت می‌شوند)"""
+    key = os.path.abspath(connections.db_path)
+    with _buffers_lock:
+        buffer = _buffers.get(key)
+        if buffer is None:
+            buffer = WriteBehindBuffer(connections)
+            _buffers[key] = buffer
+        return buffer
+
+
+def flush_all_write_behind() -> int:
+    """ثبت همه بافرها (sync - برای خاموش شدن و atexit)"""
+    with _buffers_lock:
+        buffers = list(_buffers.values())
+    return sum(buffer.flush() for buffer in buffers)
+
+
+async def run_write_behind_flusher(interval: Optional[float] = None):
+    """ثبت دوره‌ای بافرها روی thread دیتابیس تا زمان cancel شدن"""
+    from utils.async_db import run_in_db_thread
+
+    while True:
+        with _buffers_lock:
+            buffers = list(_buffers.values())
+        delay = interval or min((buffer.flush_interval for buffer in buffers), default=2.0)
+        await asyncio.sleep(delay)
+        for buffer in buffers:
+            try:
+                await run_in_db_thread(buffer.flush)
+            except Exception as e:
+                logger.error(f"❌ خطا در ثبت دوره‌ای بافر write-behind: {e}")
+
+
+# ثبت نهایی اگر برنامه بدون خاموش شدن مرتب بسته شود
+atexit.register(flush_all_write_behind)
@@ -0,0 +1,263 @@
+"""
+سیم‌کشی زمان راه‌اندازی - همه هندلرها و singletonهای مشترکی که wrapperهای main.py
+لازم دارند یک‌بار هنگام شروع ربات resolve می‌شوند (نه با import داخل هر wrapper در هر آپدیت).
+اگر هندلری تغییر نام داده یا حذف شده باشد، ربات همان لحظه شروع خطا می‌دهد نه وسط کار.
+
+پروفایل زمان import و بودجه شروع سرد:
+    python -m wiring                  # کندترین ماژول‌ها و زمان کل import main
+    python -m wiring --budget 4.0     # خروج با کد ۱ اگر شروع سرد بیشتر از ۴ ثانیه شود
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+# --- singletonها و تنظیمات ---
+from config import ADMIN_ID
+from keyboards import reminders_submenu
+from utils.async_db import async_db
+
+# --- هندلرهای اصلی ---
+from handlers.main_handlers import (
+    start_handler,
+    test_handler,
+    stats_command_handler,
+    handle_admin_panel,
+    handle_reminder_management,
+    handle_auto_reminders,
+    handle_back_to_main
+)
+from handlers.menu_handlers import exams_menu_handler, study_plan_handler, stats_handler
+from handlers.exam_handlers import (
+    exam_callback_handler,
+    all_exams_handler,
+    refresh_exam_handler,
+    refresh_all_exams_handler,
+    next_exam_handler,
+    exam_details_handler
+)
+from handlers.back_handlers import back_to_main_handler
+from handlers.study_handlers import study_callback_handler
+from handlers.stats_handlers import stats_callback_handler
+from handlers.admin_handlers import admin_callback_handler
+
+# --- هندلرهای ریمایندر ---
+from reminder.reminder_handlers import (
+    start_exam_reminder,
+    start_personal_reminder,
+    manage_reminders_handler,
+    view_all_reminders,
+    toggle_reminder_status,
+    edit_reminder_handler,
+    delete_reminder_handler,
+    handle_reminder_management_callback,
+    process_exam_selection,
+    process_days_selection,
+    process_time_input,
+    process_start_date,
+    process_end_date,
+    process_confirmation,
+    process_personal_title,
+    process_personal_message,
+    process_repetition_selection,
+    process_personal_days_selection,
+    process_personal_time_input,
+    process_personal_start_date,
+    process_personal_confirmation,
+    process_personal_custom_interval
+)
+from reminder.auto_reminder_handlers import (
+    user_auto_reminders_list,
+    toggle_user_auto_reminder,
+    handle_auto_reminder_user_callback
+)
+from reminder.auto_reminder_admin import (
+    list_auto_reminders_admin,
+    start_add_auto_reminder,
+    delete_auto_reminder_handler,
+    toggle_auto_reminder_status,
+    process_add_title,
+    process_add_message,
+    process_add_days,
+    process_admin_exam_selection,
+    process_admin_confirmation,
+    handle_auto_reminder_admin_callback
+)
+
+# --- هندلرهای ریمایندر پیشرفته ---
+# process_start_date/process_end_date هم‌نام هندلرهای ریمایندر کنکور هستند
+from reminder.advanced_reminder_handlers import (
+    advanced_reminders_admin_handler,
+    start_add_advanced_reminder,
+    list_advanced_reminders_admin,
+    edit_advanced_reminder_handler,
+    delete_advanced_reminder_handler,
+    toggle_advanced_reminder_handler,
+    handle_advanced_reminder_callback,
+    process_advanced_title,
+    process_advanced_message,
+    process_start_time as process_advanced_start_time,
+    process_start_date as process_advanced_start_date,
+    process_end_time as process_advanced_end_time,
+    process_end_date as process_advanced_end_date,
+    process_days_of_week as process_advanced_days_of_week,
+    process_repeat_count as process_advanced_repeat_count,
+    process_repeat_interval as process_advanced_repeat_interval,
+    process_advanced_confirmation
+)
+
+
+__all__ = [
+    # singletonها و تنظیمات
+    'ADMIN_ID',
+    'reminders_submenu',
+    'async_db',
+
+    # هندلرهای اصلی
+    'start_handler',
+    'test_handler',
+    'stats_command_handler',
+    'handle_admin_panel',
+    'handle_reminder_management',
+    'handle_auto_reminders',
+    'handle_back_to_main',
+    'exams_menu_handler',
+    'study_plan_handler',
+    'stats_handler',
+    'exam_callback_handler',
+    'all_exams_handler',
+    'refresh_exam_handler',
+    'refresh_all_exams_handler',
+    'next_exam_handler',
+    'exam_details_handler',
+    'back_to_main_handler',
+    'study_callback_handler',
+    'stats_callback_handler',
+    'admin_callback_handler',
+
+    # هندلرهای ریمایندر
+    'start_exam_reminder',
+    'start_personal_reminder',
+    'manage_reminders_handler',
+    'view_all_reminders',
+    'toggle_reminder_status',
+    'edit_reminder_handler',
+    'delete_reminder_handler',
+    'handle_reminder_management_callback',
+    'process_exam_selection',
+    'process_days_selection',
+    'process_time_input',
+    'process_start_date',
+    'process_end_date',
+    'process_confirmation',
+    'process_personal_title',
+    'process_personal_message',
+    'process_repetition_selection',
+    'process_personal_days_selection',
+    'process_personal_time_input',
+    'process_personal_start_date',
+    'process_personal_confirmation',
+    'process_personal_custom_interval',
+    'user_auto_reminders_list',
+    'toggle_user_auto_reminder',
+    'handle_auto_reminder_user_callback',
+    'list_auto_reminders_admin',
+    'start_add_auto_reminder',
+    'delete_auto_reminder_handler',
+    'toggle_auto_reminder_status',
+    'process_add_title',
+    'process_add_message',
+    'process_add_days',
+    'process_admin_exam_selection',
+    'process_admin_confirmation',
+    'handle_auto_reminder_admin_callback',
+
+    # هندلرهای ریمایندر پیشرفته
+    'advanced_reminders_admin_handler',
+    'start_add_advanced_reminder',
+    'list_advanced_reminders_admin',
+    'edit_advanced_reminder_handler',
+    'delete_advanced_reminder_handler',
+    'toggle_advanced_reminder_handler',
+    'handle_advanced_reminder_callback',
+    'process_advanced_title',
+    'process_advanced_message',
+    'process_advanced_start_time',
+    'process_advanced_start_date',
+    'process_advanced_end_time',
+    'process_advanced_end_date',
+    'process_advanced_days_of_week',
+    'process_advanced_repeat_count',
+    'process_advanced_repeat_interval',
+    'process_advanced_confirmation',
+
+    # پروفایل زمان import
+    'profile_imports',
+]
+
+
+# --- پروفایل زمان import ---
+
+def profile_imports(module: str = 'main') -> Dict[str, Any]:
+    """
+    اجرای `python -X importtime -c "import <module>"` در یک پروسه تازه (شروع سرد واقعی)
+    خروجی: زمان کل پروسه و زمان import هر ماژول (میکروثانیه، self و تجمعی)
+    """
+    root = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [root, env.get('PYTHONPATH')]))
+
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        env=env, capture_output=True, text=True
+    )
+    wall_seconds = time.perf_counter() - started
+
+    modules: List[Dict[str, Any]] = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append({
+            'module': name.strip(),
+            'depth': (len(name) - len(name.lstrip())) // 2,
+            'self_us': int(self_us),
+            'cumulative_us': int(cumulative_us)
+        })
+
+    top = next((m for m in modules if m['module'] == module), None)
+    return {
+        'ok': result.returncode == 0,
+        'error': result.stderr.strip().splitlines()[-1] if result.returncode else None,
+        'wall_seconds': wall_seconds,
+        'import_seconds': top['cumulative_us'] / 1e6 if top else None,
+        'modules': modules
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="پروفایل زمان import و بودجه شروع سرد ربات")
+    parser.add_argument('--module', default='main')
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--budget', type=float, default=None, help="حداکثر مجاز شروع سرد (ثانیه)")
+    args = parser.parse_args()
+
+    profile = profile_imports(args.module)
+    if not profile['ok']:
+        print(f"❌ import {args.module} ناموفق بود: {profile['error']}")
+        sys.exit(1)
+
+    print(f"{'self ms':>9} {'cum ms':>9}  ماژول")
+    for entry in sorted(profile['modules'], key=lambda m: m['self_us'], reverse=True)[:args.top]:
+        print(f"{entry['self_us'] / 1000:>9.1f} {entry['cumulative_us'] / 1000:>9.1f}  {entry['module']}")
+    print(f"\nimport {args.module}: {profile['import_seconds']:.2f}s - "
+          f"شروع سرد پروسه: {profile['wall_seconds']:.2f}s")
+
+    if args.budget is not None:
+        if profile['wall_seconds'] > args.budget:
+            print(f"❌ شروع سرد از بودجه {args.budget:.2f}s بیشتر است")
+            sys.exit(1)
+        print(f"✅ شروع سرد در بودجه {args.budget:.2f}s است")